@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# 批量预测页面共用的结果文件写出：每个数据块预测完就追加写入临时文件，
+# 内存中只保留当前数据块，与上传文件的总行数无关
+# 会话关闭后不会再删除它的结果文件，所以每次写出新的结果文件前，先删除同一前缀下超过RESULT_MAX_AGE秒的旧文件
+
+MIME_TYPES = {'csv': 'text/csv', 'parquet': 'application/octet-stream'}
+RESULT_MAX_AGE = 24 * 60 * 60
+
+
+def write_chunks(chunks, output_format='csv', prefix='batch_', on_chunk=None):
+    """把数据块依次写入同一个CSV或Parquet临时文件
+
+    chunks是逐个产生DataFrame的可迭代对象；on_chunk(数据块, 已写入行数)在每块写入后调用。
+    返回(结果文件路径, 总行数)，调用方负责在下载后删除结果文件。
+    """
+    suffix = '.parquet' if output_format == 'parquet' else '.csv'
+    remove_stale_results(prefix)
+    fd, out_path = tempfile.mkstemp(prefix=prefix, suffix=suffix)
+    os.close(fd)
+
+    rows = 0
+    parquet_writer = None
+    try:
+        with open(out_path, 'wb') as out:
+            for chunk in chunks:
+                if output_format == 'parquet':
+                    # 后续数据块沿用第一个数据块的schema，保证写入同一个Parquet文件
+                    schema = parquet_writer.schema if parquet_writer is not None else None
+                    table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                    if parquet_writer is None:
+                        parquet_writer = pq.ParquetWriter(out, table.schema)
+                    parquet_writer.write_table(table)
+                else:
+                    # utf-8-sig让Excel能正确识别中文
+                    chunk.to_csv(out, index=False, header=rows == 0,
+                                 encoding='utf-8-sig' if rows == 0 else 'utf-8')
+                rows += len(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk, rows)
+            if parquet_writer is not None:
+                parquet_writer.close()
+    except Exception:
+        os.remove(out_path)
+        raise
+    return out_path, rows
+
+
+def read_result(path):
+    """读取结果文件的全部内容，供st.download_button在点击下载时调用"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def remove_stale_results(prefix, max_age=RESULT_MAX_AGE):
+    """删除临时目录中以prefix开头、超过max_age秒未修改的结果文件"""
+    cutoff = time.time() - max_age
+    with os.scandir(tempfile.gettempdir()) as entries:
+        for entry in entries:
+            if not entry.name.startswith(prefix):
+                continue
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                # 其他进程刚刚删除，或没有权限删除
+                pass
@@ -0,0 +1,89 @@
+# bench_dataset_cache.py
+# 比较pd.read_csv与列式缓存（dataset_cache.py）的读取耗时和内存占用
+#
+# 用法：python bench_dataset_cache.py [--rows 1000000] [--repeats 5]
+#
+# 除了两个原始数据集，还会把它们有放回地抽样放大到--rows行，写成GBK编码的临时CSV再比较。
+# 内存列：
+# - DataFrame内存：memory_usage(deep=True)，文字列按Python字符串对象计算
+# - 新分配的Arrow内存：读取缓存时Arrow额外分配的字节数，数值列直接引用内存映射的文件，不计入
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import dataset_cache
+
+
+def median_seconds(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 / 1024
+
+
+def measure(path, repeats):
+    read_csv = lambda: pd.read_csv(path, encoding='gbk')
+    csv_seconds = median_seconds(read_csv, repeats)
+    csv_df = read_csv()
+
+    start = time.perf_counter()
+    dataset_cache.load_dataset(path)
+    first_seconds = time.perf_counter() - start
+
+    cached_seconds = median_seconds(lambda: dataset_cache.load_dataset(path), repeats)
+    allocated = pa.total_allocated_bytes()
+    cached_df = dataset_cache.load_dataset(path)
+    arrow_mb = (pa.total_allocated_bytes() - allocated) / 1024 / 1024
+    return {
+        '数据集': os.path.basename(path),
+        '行数': len(csv_df),
+        'read_csv(毫秒)': round(csv_seconds * 1000, 2),
+        '首次转换(毫秒)': round(first_seconds * 1000, 2),
+        '缓存读取(毫秒)': round(cached_seconds * 1000, 2),
+        '加速倍数': round(csv_seconds / cached_seconds, 1),
+        'read_csv内存(MB)': round(memory_mb(csv_df), 2),
+        '缓存DataFrame内存(MB)': round(memory_mb(cached_df), 2),
+        '新分配的Arrow内存(MB)': round(arrow_mb, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列式缓存与pd.read_csv的对比")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="放大后的行数，0表示只测原始数据集")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_dataset_cache_')
+    # 缓存写到临时目录，第一次读取一定是转换，也不影响正式的缓存目录
+    dataset_cache.CACHE_DIR = os.path.join(tmp_dir, 'cache')
+    try:
+        paths = list(dataset_cache.CATEGORICAL_COLUMNS)
+        if args.rows:
+            for path in list(paths):
+                df = pd.read_csv(path, encoding='gbk').sample(args.rows, replace=True, random_state=0)
+                # 文件名与原始数据集一致，使用同样的分类列设置
+                large_path = os.path.join(tmp_dir, os.path.basename(path))
+                df.to_csv(large_path, index=False, encoding='gbk')
+                paths.append(large_path)
+        rows = [measure(path, args.repeats) for path in paths]
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    pd.set_option('display.width', 250)
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# bench_forest_engine.py
+# 比较sklearn随机森林和FlatForest扁平数组引擎在1、10、1000行输入下的预测延迟
+#
+# 用法：python bench_forest_engine.py [--repeats 300]
+#
+# 输入与应用中的调用方式一致（带列名的DataFrame），每个场景先校验两者输出逐位一致再计时。
+import argparse
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from forest_engine import FlatForest
+from insurance_features import FEATURE_NAMES as INSURANCE_FEATURE_NAMES, TARGET_COLUMN, encode_insurance
+from penguin_features import FEATURE_NAMES, complete_rows, encode_penguins
+
+ROW_COUNTS = [1, 10, 1000]
+
+
+def penguin_data():
+    df = pd.read_csv('（企鹅识别数据）penguins-chinese.csv', encoding='gbk')
+    X = encode_penguins(df, FEATURE_NAMES)
+    mask = complete_rows(X)
+    return pd.DataFrame(X[mask], columns=FEATURE_NAMES), df['企鹅的种类'][mask].to_numpy()
+
+
+def insurance_data():
+    df = pd.read_csv('insurance-chinese.csv', encoding='gbk')
+    X = pd.DataFrame(encode_insurance(df), columns=INSURANCE_FEATURE_NAMES)
+    return X, df[TARGET_COLUMN].to_numpy()
+
+
+def latency_ms(predict, X, repeats):
+    predict(X)  # 预热
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        timings[i] = time.perf_counter() - start
+    return np.percentile(timings, 50) * 1000, np.percentile(timings, 99) * 1000
+
+
+def sample_rows(X, n_rows, rng):
+    return X.iloc[rng.integers(0, len(X), n_rows)].reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="随机森林推理引擎延迟基准")
+    parser.add_argument('--repeats', type=int, default=300, help="每个场景的计时次数")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    X_penguin, y_penguin = penguin_data()
+    X_insurance, y_insurance = insurance_data()
+
+    with open('rfc_model.pkl', 'rb') as f:
+        deployed = pickle.load(f)
+    scenarios = [
+        ('企鹅分类（rfc_model.pkl）', deployed, X_penguin),
+        ('企鹅分类（100棵树）', RandomForestClassifier(n_estimators=100, random_state=42)
+         .fit(X_penguin, y_penguin), X_penguin),
+        ('医疗费用回归（100棵树）', RandomForestRegressor(n_estimators=100, random_state=42)
+         .fit(X_insurance, y_insurance), X_insurance),
+    ]
+
+    rows = []
+    for name, model, X in scenarios:
+        flat = FlatForest.from_model(model)
+        for n_rows in ROW_COUNTS:
+            X_batch = sample_rows(X, n_rows, rng)
+            if not np.array_equal(model.predict(X_batch), flat.predict(X_batch)):
+                raise SystemExit(f"{name}：FlatForest的输出与sklearn不一致")
+            sk_p50, sk_p99 = latency_ms(model.predict, X_batch, args.repeats)
+            flat_p50, flat_p99 = latency_ms(flat.predict, X_batch, args.repeats)
+            rows.append({
+                '模型': name,
+                '行数': n_rows,
+                'sklearn p50(毫秒)': round(sk_p50, 3),
+                'sklearn p99(毫秒)': round(sk_p99, 3),
+                'FlatForest p50(毫秒)': round(flat_p50, 3),
+                'FlatForest p99(毫秒)': round(flat_p99, 3),
+                'p50加速比': round(sk_p50 / flat_p50, 1),
+            })
+
+    pd.set_option('display.width', 200)
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
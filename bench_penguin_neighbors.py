@@ -0,0 +1,89 @@
+# bench_penguin_neighbors.py
+# 在数百万条合成企鹅观测上测量相似企鹅索引的构建时间和单次查询延迟
+#
+# 用法：python bench_penguin_neighbors.py [--sizes 100000 1000000 5000000] [--queries 500]
+#
+# 合成数据按真实数据中每个物种、每个岛屿的测量值均值和协方差生成，
+# 同时给出线性扫描的延迟作为对照。
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from penguin_features import ISLAND_COLUMN, SPECIES_COLUMN
+from penguin_neighbors import MEASUREMENT_COLUMNS, PenguinNeighborIndex
+
+
+def synthetic_penguins(n_rows, rng):
+    """按真实数据的分组统计量生成n_rows条合成观测"""
+    real = pd.read_csv('（企鹅识别数据）penguins-chinese.csv', encoding='gbk').dropna()
+    groups = list(real.groupby([SPECIES_COLUMN, ISLAND_COLUMN]))
+    weights = np.array([len(g) for _, g in groups], dtype=np.float64)
+    counts = rng.multinomial(n_rows, weights / weights.sum())
+
+    parts = []
+    for ((species, island), group), count in zip(groups, counts):
+        values = group[MEASUREMENT_COLUMNS].to_numpy(dtype=np.float64)
+        samples = rng.multivariate_normal(values.mean(axis=0), np.cov(values, rowvar=False), size=count)
+        part = pd.DataFrame(samples.round(1), columns=MEASUREMENT_COLUMNS)
+        part.insert(0, SPECIES_COLUMN, species)
+        part.insert(1, ISLAND_COLUMN, island)
+        part['性别'] = rng.choice(['雄性', '雌性'], size=count)
+        part['观测年份'] = rng.integers(2007, 2010, size=count)
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def percentiles_ms(timings):
+    return np.percentile(timings, 50) * 1000, np.percentile(timings, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="相似企鹅索引基准")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--queries', type=int, default=500, help="每种规模的查询次数")
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = []
+    for size in args.sizes:
+        reference = synthetic_penguins(size, rng)
+        start = time.perf_counter()
+        index = PenguinNeighborIndex(reference)
+        build_seconds = time.perf_counter() - start
+
+        points = reference[MEASUREMENT_COLUMNS].sample(args.queries, random_state=0).to_numpy() \
+            + rng.normal(0, 0.5, size=(args.queries, len(MEASUREMENT_COLUMNS)))
+        kd_timings = np.empty(args.queries)
+        for i, point in enumerate(points):
+            start = time.perf_counter()
+            index.query(point, k=args.k)
+            kd_timings[i] = time.perf_counter() - start
+
+        # 对照：在同样标准化后的数据上做线性扫描
+        standardized = (reference[MEASUREMENT_COLUMNS].to_numpy() - index.mean) / index.std
+        scan_timings = np.empty(min(args.queries, 20))
+        for i, point in enumerate(points[:len(scan_timings)]):
+            start = time.perf_counter()
+            distances = ((standardized - (point - index.mean) / index.std) ** 2).sum(axis=1)
+            np.argpartition(distances, args.k)[:args.k]
+            scan_timings[i] = time.perf_counter() - start
+
+        kd_p50, kd_p99 = percentiles_ms(kd_timings)
+        scan_p50, _ = percentiles_ms(scan_timings)
+        rows.append({
+            '参考数据行数': size,
+            '构建索引(秒)': round(build_seconds, 2),
+            'KD树查询p50(毫秒)': round(kd_p50, 3),
+            'KD树查询p99(毫秒)': round(kd_p99, 3),
+            '线性扫描p50(毫秒)': round(scan_p50, 1),
+        })
+
+    pd.set_option('display.width', 200)
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+# bench_sales_dashboard.py
+# 用sales_generator.py生成的大规模模拟数据测量final.py各环节的耗时和内存，输出可以比较的JSON报告
+#
+# 用法：python bench_sales_dashboard.py [--sizes 10000 100000 1000000] [--format parquet]
+#                                       [--report report.json] [--compare 上一版本的report.json]
+#
+# 每个数据规模生成一个数据文件（--data-dir指定时保留并复用，否则放在临时目录），
+# 让final.py读取它（与设置环境变量SALES_DATA_PATH相同），然后测量：
+# - get_dataframe_from_excel：解析数据文件（冷启动）、读取Parquet缓存文件（服务器重启）、进程内缓存（每次rerun）
+# - 位图索引和预聚合立方体的构建（每个数据版本一次）
+# - add_sidebar_func、hour_chart、product_line_chart
+# - main_page_demo中的关键指标计算，以及整个main_page_demo
+# - 勾选“显示筛选后的明细数据”时的位图筛选
+# 筛选条件固定为：2个城市、会员用户、3种产品类型、30天，相当于一次典型的筛选。
+#
+# 计时方式与pytest-benchmark相同：每项至少--min-rounds轮，且总耗时至少--max-time秒，
+# 统计min/max/mean/stddev/median；同时用后台线程每毫秒读取/proc/self/statm，记录每项运行期间的峰值内存
+# （相对运行前的增量；分配器会复用已释放的内存，所以只反映需要新向系统申请的部分）。
+# 报告的格式参照pytest-benchmark的--benchmark-json；--compare时逐项比较最短耗时（比平均值受干扰小），
+# 超过--threshold倍的项目视为性能回退，以退出码1结束。
+# 在Streamlit之外运行，st.*调用只构建元素、不发送到浏览器，侧边栏控件返回默认值。
+# Excel工作表最多约104万行，更大的规模请使用.csv或.parquet；5000万行需要约10 GB内存。
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import final
+import model_registry
+import sales_data
+import sales_generator
+from streamlit import config as streamlit_config
+from streamlit import logger as streamlit_logger
+
+REPORT_VERSION = 1
+SAMPLE_SECONDS = 0.001
+# 单项最多运行的轮数和秒数（慢的项目只运行到最少轮数为止）
+MAX_ROUNDS = 1000
+MAX_SECONDS = 30
+
+
+def _rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class PeakMemory:
+    """在with块运行期间每毫秒采样一次常驻内存，记录峰值"""
+
+    def __enter__(self):
+        self.baseline = self.peak = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_SECONDS):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+    @property
+    def delta_mb(self):
+        return (self.peak - self.baseline) / 1024 / 1024
+
+
+def run_benchmark(func, setup=None, min_rounds=5, max_time=1.0):
+    """返回(每轮耗时的列表, 峰值内存)，setup在每轮之前运行，不计入耗时"""
+    timings = []
+    with PeakMemory() as memory:
+        while True:
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+            total = sum(timings)
+            if len(timings) >= MAX_ROUNDS or total >= MAX_SECONDS:
+                break
+            if len(timings) >= min_rounds and total >= max_time:
+                break
+    return timings, memory
+
+
+def stats(timings):
+    mean = statistics.fmean(timings)
+    return {
+        'min': min(timings),
+        'max': max(timings),
+        'mean': mean,
+        'stddev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'median': statistics.median(timings),
+        'rounds': len(timings),
+        'ops': 1 / mean if mean else 0.0,
+    }
+
+
+def data_file(data_dir, n_rows, fmt):
+    """生成（或复用）n_rows行的数据文件"""
+    path = os.path.join(data_dir, f'sales_{n_rows}.{fmt}')
+    if not os.path.exists(path):
+        sales_generator.write_sales(path, n_rows, include_payment=True)
+    return path
+
+
+def typical_selections(filter_index):
+    """2个城市、会员用户、3种产品类型、数据中前30天；其他维度全选"""
+    selections = {dimension: list(options) for dimension, options in filter_index.options.items()}
+    selections['城市'] = selections['城市'][:2]
+    selections['顾客类型'] = selections['顾客类型'][:1]
+    selections['产品类型'] = selections['产品类型'][:3]
+    first, last = filter_index.date_range()
+    return selections, (first, min(last, first + datetime.timedelta(days=29)))
+
+
+def benchmarks(path):
+    """(名称, 分组, 函数, setup)，按依赖顺序排列"""
+
+    def cold():
+        model_registry.invalidate(path)
+        if os.path.exists(sales_data.sidecar_path(path)):
+            os.remove(sales_data.sidecar_path(path))
+
+    def restart():
+        model_registry.invalidate(path)
+
+    df = sales_data.load_sales(path)
+    filter_index = sales_data.load_filter_index(path)
+    cube = sales_data.load_sales_cube(path)
+    selections, date_range = typical_selections(filter_index)
+    selected = cube.select(selections, date_range)
+
+    def aggregations():
+        selected = cube.select(selections, date_range)
+        selected.totals()
+        selected.by('小时')
+        selected.by('产品类型')
+
+    return [
+        ('get_dataframe_from_excel[cold]', '加载', final.get_dataframe_from_excel, cold),
+        ('get_dataframe_from_excel[parquet]', '加载', final.get_dataframe_from_excel, restart),
+        ('get_dataframe_from_excel[warm]', '加载', final.get_dataframe_from_excel, None),
+        ('build_filter_index', '构建', lambda: sales_data.sales_index.build_filter_index(df), None),
+        ('build_sales_cube', '构建', lambda: sales_data.sales_cube.build_sales_cube(df), None),
+        ('add_sidebar_func', 'rerun', lambda: final.add_sidebar_func(filter_index), None),
+        ('main_page_demo[aggregations]', 'rerun', aggregations, None),
+        ('hour_chart', 'rerun', lambda: final.hour_chart(selected), None),
+        ('product_line_chart', 'rerun', lambda: final.product_line_chart(selected), None),
+        ('main_page_demo', 'rerun', lambda: final.main_page_demo(cube, selections, date_range), None),
+        ('detail_table[select]', 'rerun', lambda: filter_index.select(df, selections, date_range), None),
+    ]
+
+
+def measure(path, n_rows, fmt, min_rounds, max_time):
+    # final.py通过sales_data.DATA_PATH找到数据文件
+    sales_data.DATA_PATH = path
+    results = []
+    for name, group, func, setup in benchmarks(path):
+        timings, memory = run_benchmark(func, setup, min_rounds, max_time)
+        result = {
+            'group': group,
+            'name': name,
+            'fullname': f'{name}[{fmt}-{n_rows}]',
+            'params': {'rows': n_rows, 'format': fmt},
+            'stats': stats(timings),
+            'extra_info': {'peak_rss_delta_mb': round(memory.delta_mb, 1)},
+        }
+        results.append(result)
+        print(f"  {name:<36}{result['stats']['mean'] * 1000:>12.3f} 毫秒  "
+              f"{result['stats']['rounds']:>5} 轮  峰值内存 +{memory.delta_mb:.1f} MB", flush=True)
+
+    df = sales_data.load_sales(path)
+    dataset = {
+        'rows': n_rows,
+        'format': fmt,
+        'file_mb': round(os.path.getsize(path) / 1024 / 1024, 1),
+        'dataframe_mb': round(df.memory_usage(deep=False).sum() / 1024 / 1024, 1),
+        'filter_index_mb': round(sales_data.load_filter_index(path).nbytes / 1024 / 1024, 1),
+        'sales_cube_mb': round(sales_data.load_sales_cube(path).nbytes / 1024 / 1024, 1),
+    }
+    model_registry.invalidate(path)
+    return results, dataset
+
+
+def machine_info():
+    return {
+        'node': platform.node(),
+        'processor': platform.processor(),
+        'machine': platform.machine(),
+        'python_version': platform.python_version(),
+        'system': platform.system(),
+        'release': platform.release(),
+        'cpu_count': os.cpu_count(),
+        'numpy_version': np.__version__,
+        'pandas_version': pd.__version__,
+    }
+
+
+def commit_info():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        'id': git('rev-parse', 'HEAD'),
+        'branch': git('rev-parse', '--abbrev-ref', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+    }
+
+
+def compare(report, baseline, threshold):
+    """逐项比较最短耗时，返回是否有项目变慢超过threshold倍"""
+    previous = {b['fullname']: b for b in baseline['benchmarks']}
+    rows = []
+    for bench in report['benchmarks']:
+        old = previous.get(bench['fullname'])
+        if old is None:
+            continue
+        ratio = bench['stats']['min'] / old['stats']['min']
+        rows.append({
+            '项目': bench['fullname'],
+            '之前(毫秒)': round(old['stats']['min'] * 1000, 3),
+            '现在(毫秒)': round(bench['stats']['min'] * 1000, 3),
+            '倍数': round(ratio, 2),
+            '回退': '是' if ratio > threshold else '',
+        })
+    if not rows:
+        print("基准报告中没有相同的项目")
+        return False
+    result = pd.DataFrame(rows)
+    print(f"\n与 {baseline['commit_info'].get('id') or '基准报告'} 比较（超过{threshold}倍视为回退）：")
+    print(result.to_string(index=False))
+    return bool((result['倍数'] > threshold).any())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="final.py销售仪表板的容量测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--format', choices=['parquet', 'csv', 'xlsx'], default='parquet')
+    parser.add_argument('--data-dir', help="保留并复用生成的数据文件的目录，默认使用临时目录")
+    parser.add_argument('--min-rounds', type=int, default=5)
+    parser.add_argument('--max-time', type=float, default=1.0, help="每项至少运行的秒数")
+    parser.add_argument('--report', default='bench_sales_dashboard.json')
+    parser.add_argument('--compare', help="之前的报告，用于比较")
+    parser.add_argument('--threshold', type=float, default=1.2)
+    args = parser.parse_args()
+
+    if args.format == 'xlsx' and max(args.sizes) > sales_generator.EXCEL_MAX_ROWS:
+        parser.error(f"Excel工作表最多{sales_generator.EXCEL_MAX_ROWS:,}行，请使用--format csv或parquet")
+    # 在Streamlit之外调用st.*会为每个元素打印警告；第一次调用st.*时会按配置重设日志级别，所以同时修改配置
+    streamlit_config.set_option('logger.level', 'error')
+    streamlit_logger.set_log_level('error')
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='bench_sales_dashboard_')
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    datasets = []
+    try:
+        for n_rows in args.sizes:
+            start = time.perf_counter()
+            path = data_file(data_dir, n_rows, args.format)
+            print(f"{n_rows:,}行（{args.format}，准备数据{time.perf_counter() - start:.1f}秒）", flush=True)
+            benchmark_results, dataset = measure(path, n_rows, args.format, args.min_rounds, args.max_time)
+            results.extend(benchmark_results)
+            datasets.append(dataset)
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        'version': REPORT_VERSION,
+        'datetime': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'machine_info': machine_info(),
+        'commit_info': commit_info(),
+        'datasets': datasets,
+        'benchmarks': results,
+    }
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n报告已写入 {args.report}")
+    print(pd.DataFrame(datasets).to_string(index=False))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
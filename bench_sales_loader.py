@@ -0,0 +1,99 @@
+# bench_sales_loader.py
+# 比较final.py原来每次rerun都解析Excel的读取方式与sales_data.load_sales()的各级缓存
+#
+# 用法：python bench_sales_loader.py [--rows 1000000] [--repeats 3]
+#
+# 除了随项目提供的supermarket_sales.xlsx，还会把它有放回地抽样放大到--rows行，写成格式相同的临时工作簿。
+# 每个工作簿测量：
+# - 解析Excel：原get_dataframe_from_excel的做法，read_excel加上对“时间”列的to_datetime
+# - 首次加载：解析Excel并写入Parquet文件
+# - 读取Parquet：进程内缓存为空（例如服务器重启）时的加载
+# - 进程内缓存：之后每次rerun的加载，只有一次os.stat()
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+import model_registry
+import sales_data
+
+
+def legacy_load(path):
+    df = pd.read_excel(path, sheet_name=sales_data.SHEET_NAME, skiprows=1, index_col=sales_data.INDEX_COLUMN)
+    df["小时"] = pd.to_datetime(df["时间"], format="%H:%M:%S").dt.hour
+    return df
+
+
+def write_workbook(df, path):
+    """与supermarket_sales.xlsx格式相同：第1行是标题，第2行是列名"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sales_data.SHEET_NAME)
+    sheet.append(['超市销售数据'])
+    sheet.append([sales_data.INDEX_COLUMN] + list(df.columns))
+    columns = [df.index.tolist()] + [df[column].tolist() for column in df.columns]
+    for row in zip(*columns):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def measure(path, repeats):
+    parse_seconds = timed(lambda: legacy_load(path))
+    model_registry.invalidate(path)
+    first_seconds = timed(lambda: sales_data.load_sales(path))
+
+    sidecar_timings = []
+    for _ in range(repeats):
+        model_registry.invalidate(path)
+        sidecar_timings.append(timed(lambda: sales_data.load_sales(path)))
+    cached_seconds = float(np.median([timed(lambda: sales_data.load_sales(path)) for _ in range(repeats * 100)]))
+    sidecar_seconds = float(np.median(sidecar_timings))
+    return {
+        '工作簿': os.path.basename(path),
+        '行数': len(sales_data.load_sales(path)),
+        'Excel(MB)': round(os.path.getsize(path) / 1024 / 1024, 1),
+        '解析Excel(毫秒)': round(parse_seconds * 1000, 1),
+        '首次加载(毫秒)': round(first_seconds * 1000, 1),
+        '读取Parquet(毫秒)': round(sidecar_seconds * 1000, 2),
+        '进程内缓存(微秒)': round(cached_seconds * 1e6, 1),
+        '解析/Parquet': round(parse_seconds / sidecar_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="销售数据加载方式对比")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="放大后的行数，0表示只测随项目提供的工作簿")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_sales_loader_')
+    try:
+        # 随项目提供的工作簿也复制到临时目录，Parquet文件不写到项目目录
+        shipped = os.path.join(tmp_dir, os.path.basename(sales_data.XLSX_PATH))
+        shutil.copyfile(sales_data.XLSX_PATH, shipped)
+        paths = [shipped]
+        if args.rows:
+            df = legacy_load(shipped).drop(columns='小时').sample(args.rows, replace=True, random_state=0)
+            large_path = os.path.join(tmp_dir, f'supermarket_sales_{args.rows}.xlsx')
+            write_workbook(df, large_path)
+            paths.append(large_path)
+        rows = [measure(path, args.repeats) for path in paths]
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    pd.set_option('display.width', 250)
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# bench_student_data.py
+# 测量student_data.generate_students在不同学生人数下的生成时间和内存占用
+#
+# 用法：python bench_student_data.py [--sizes 1000000 5000000 10000000] [--legacy-rows 1000000]
+#
+# 同时给出原来逐个拼接字符串、以object字符串和float64保存的生成方式作为对照（只测--legacy-rows行）。
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import student_data
+
+
+def legacy_generate(n_students, seed=42):
+    """student.py原来的生成方式"""
+    np.random.seed(seed)
+    data = {
+        '学号': [f'2023{str(i).zfill(6)}' for i in range(1, n_students + 1)],
+        '姓名': [f'学生{i}' for i in range(1, n_students + 1)],
+        '性别': np.random.choice(student_data.GENDERS, n_students, p=student_data.GENDER_WEIGHTS),
+        '专业': np.random.choice(student_data.MAJORS, n_students, p=student_data.MAJOR_WEIGHTS),
+        '平时成绩': np.random.normal(75, 10, n_students).clip(40, 100),
+        '作业完成率': np.random.uniform(60, 100, n_students).round(1),
+        '上课出勤率': np.random.uniform(70, 100, n_students).round(1),
+        '每周学习时长': np.random.uniform(10, 40, n_students).round(1),
+        '期中考试分数': np.random.normal(70, 15, n_students).clip(40, 100).round(1),
+        '期末成绩': np.random.normal(70, 15, n_students).clip(40, 100).round(1)
+    }
+    df = pd.DataFrame(data)
+    df['总评成绩'] = (df['平时成绩'] * 0.3 + df['期中考试分数'] * 0.3 + df['期末成绩'] * 0.4).round(1)
+    return df
+
+
+def measure(name, generate, n_students):
+    start = time.perf_counter()
+    df = generate(n_students)
+    seconds = time.perf_counter() - start
+    memory_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
+    millions = n_students / 1_000_000
+    return {
+        '生成方式': name,
+        '学生人数': n_students,
+        '生成耗时(秒)': round(seconds, 2),
+        '每百万行耗时(秒)': round(seconds / millions, 2),
+        '内存(MB)': round(memory_mb, 1),
+        '每百万行内存(MB)': round(memory_mb / millions, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟学生数据生成基准")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 5_000_000, 10_000_000])
+    parser.add_argument('--legacy-rows', type=int, default=1_000_000, help="原生成方式的对照行数，0表示不测")
+    args = parser.parse_args()
+
+    rows = []
+    if args.legacy_rows:
+        rows.append(measure('原方式（逐个拼接）', legacy_generate, args.legacy_rows))
+    for size in args.sizes:
+        rows.append(measure('向量化', student_data.generate_students, size))
+
+    pd.set_option('display.width', 200)
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# bench_student_histogram.py
+# 比较student.py专项分析中两张成绩图表的两种画法：原始行直接交给Plotly，与服务器端分箱后只交人数
+#
+# 用法：python bench_student_histogram.py [--sizes 10000 1000000 10000000] [--major 大数据管理] [--repeats 3]
+#
+# 每种画法测量：
+# - 生成图表并序列化为JSON的耗时（st.plotly_chart发送前做的就是这两步）
+# - JSON的大小，即发送到浏览器的图表数据量；浏览器端的绘制耗时大致与它成正比，这里无法直接测量
+# 原画法：px.histogram(major_df)加上对原始行pd.cut的成绩分段；
+# 新画法：student_stats.score_histogram/score_segments分箱后用go.Bar画。
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+import student_data
+import student_stats
+
+
+def raw_figures(df, major):
+    major_df = df[df['专业'] == major].copy()
+    histogram = px.histogram(major_df, x='期末成绩', nbins=student_stats.HISTOGRAM_BINS)
+    segments = pd.cut(major_df['期末成绩'], bins=[0] + student_stats.SCORE_SEGMENT_EDGES + [100],
+                      labels=student_stats.SCORE_SEGMENT_LABELS, right=False)
+    counts = segments.value_counts().reindex(student_stats.SCORE_SEGMENT_LABELS).fillna(0)
+    segment_bar = go.Figure(go.Bar(x=counts.index, y=counts.values))
+    return histogram, segment_bar
+
+
+def binned_figures(df, major):
+    values = df['期末成绩'].to_numpy()[(df['专业'] == major).to_numpy()]
+    counts, edges = student_stats.score_histogram(values)
+    histogram = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges)))
+    segment_bar = go.Figure(go.Bar(x=student_stats.SCORE_SEGMENT_LABELS, y=student_stats.score_segments(values)))
+    return histogram, segment_bar
+
+
+def measure(build, df, major, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        payload = sum(len(pio.to_json(fig, validate=False)) for fig in build(df, major))
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)), payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="成绩图表服务器端分箱基准")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--major', default='大数据管理')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        df = student_data.generate_students(size)
+        n_major = int((df['专业'] == args.major).sum())
+        for name, build in [('原始行', raw_figures), ('服务器端分箱', binned_figures)]:
+            seconds, payload = measure(build, df, args.major, args.repeats)
+            rows.append({
+                '学生人数': size,
+                '专业人数': n_major,
+                '画法': name,
+                '生成+序列化(毫秒)': round(seconds * 1000, 1),
+                '图表JSON(KB)': round(payload / 1024, 1),
+            })
+        del df
+
+    pd.set_option('display.width', 200)
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# bench_student_rerun.py
+# 测量student.py在大规模模拟数据下每次rerun的耗时
+#
+# 用法：python bench_student_rerun.py [--students 1000000] [--reruns 10]
+#
+# 用Streamlit的AppTest在进程内运行student.py：第一次运行生成数据，并在后台线程中读取或训练模型，
+# 之后切换页面、修改选择框等操作触发的rerun只应付出页面本身的开销。
+# 输出之后每次rerun的总耗时和“生成数据”“训练模型”两个阶段的耗时（来自perf_timing），
+# 后者只是检查和启动后台准备，不包含训练本身。
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def main():
+    parser = argparse.ArgumentParser(description="student.py的rerun耗时")
+    parser.add_argument('--students', type=int, default=1_000_000)
+    parser.add_argument('--reruns', type=int, default=10)
+    args = parser.parse_args()
+
+    # student.py在导入时读取学生人数，必须在运行脚本之前设置
+    os.environ['STUDENT_COUNT'] = str(args.students)
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file('student.py', default_timeout=1800)
+    start = time.perf_counter()
+    at.run()
+    first_seconds = time.perf_counter() - start
+
+    rows = []
+    pages = ['项目介绍', '成绩预测']
+    for i in range(args.reruns):
+        start = time.perf_counter()
+        at.sidebar.radio[0].set_value(pages[i % len(pages)]).run()
+        seconds = time.perf_counter() - start
+        phases = {p['name']: p['ms'] for p in at.session_state['_perf_timing']['last']['phases']}
+        rows.append({
+            'rerun(毫秒)': seconds * 1000,
+            '生成数据(毫秒)': phases.get('生成数据', np.nan),
+            '训练模型(毫秒)': phases.get('训练模型', np.nan),
+        })
+
+    result = pd.DataFrame(rows)
+    print(f"学生人数 {args.students:,}，第一次运行 {first_seconds:.1f} 秒")
+    print(f"之后{args.reruns}次rerun的中位数：")
+    print(result.median().round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import insurance_features
+import model_registry
+import penguin_features
+
+
+# GBK编码CSV数据集的列式缓存
+#
+# insurance-chinese.csv、（企鹅识别数据）penguins-chinese.csv每次用pd.read_csv读取都要重新解码GBK、
+# 重新推断每列的类型。这里第一次读取时把它转换为Arrow IPC（Feather v2，不压缩）文件：
+# - 低基数的文字列（性别、区域、岛屿、物种等）保存为字典编码，读取后是pandas的category类型
+# - 数值列按读取时推断出的类型保存，之后不再推断
+# - 缓存文件名包含源文件内容的sha256（以及编码和分类列的设置），源文件变化后自动重新生成
+# 之后的读取用内存映射打开缓存文件，数值列是直接引用映射内存的Arrow类型列（double[pyarrow]等），
+# 不需要解析和复制；多个进程读取同一个文件时共享操作系统的页缓存。
+# 与pd.read_csv的耗时和内存对比见bench_dataset_cache.py。
+
+CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', '.dataset_cache')
+
+# 缓存格式变化时加1，旧的缓存文件自动失效
+FORMAT_VERSION = 1
+
+# 没有指定分类列时，不同取值不超过这个数量的文字列自动作为分类列
+CATEGORY_MAX_UNIQUE = 256
+
+# 已知数据集的分类列
+CATEGORICAL_COLUMNS = {
+    'insurance-chinese.csv': [
+        insurance_features.SEX_COLUMN, insurance_features.SMOKE_COLUMN, insurance_features.REGION_COLUMN,
+    ],
+    '（企鹅识别数据）penguins-chinese.csv': [
+        penguin_features.SPECIES_COLUMN, penguin_features.ISLAND_COLUMN, penguin_features.SEX_COLUMN,
+    ],
+}
+
+# 源文件的(修改时间, 大小) → sha256，同一个进程中文件没变时不必重复计算哈希
+_source_hashes = {}
+_lock = threading.Lock()
+
+
+def _source_sha256(path):
+    abspath = os.path.abspath(path)
+    stat = os.stat(abspath)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _source_hashes.get(abspath)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    sha256 = model_registry.artifact_sha256(abspath)
+    _source_hashes[abspath] = (signature, sha256)
+    return sha256
+
+
+def _categorical_columns(df, path, categorical):
+    if categorical is None:
+        categorical = CATEGORICAL_COLUMNS.get(os.path.basename(path))
+    if categorical is None:
+        categorical = [column for column in df.columns
+                       if df[column].dtype == object and df[column].nunique() <= CATEGORY_MAX_UNIQUE]
+    return [column for column in categorical if column in df.columns]
+
+
+def _cache_prefix(path):
+    """同一个源文件的缓存文件共用的前缀：文件名 + 绝对路径的哈希（区分不同目录下的同名文件）"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    path_digest = hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]
+    return f'{stem}.{path_digest}.'
+
+
+def cache_path(path, encoding='gbk', categorical=None):
+    """返回源文件当前内容对应的缓存文件路径"""
+    key = json.dumps([FORMAT_VERSION, _source_sha256(path), encoding, categorical], ensure_ascii=False)
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f'{_cache_prefix(path)}{digest}.arrow')
+
+
+def convert(path, encoding='gbk', categorical=None):
+    """用pd.read_csv读取源文件，转换为带分类列的Arrow表"""
+    df = pd.read_csv(path, encoding=encoding)
+    for column in _categorical_columns(df, path, categorical):
+        df[column] = df[column].astype('category')
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _write_cache(table, target, prefix):
+    """写入同目录的临时文件再整体替换，并删除同一源文件的旧缓存"""
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.arrow', dir=directory)
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name != os.path.basename(target):
+            os.remove(os.path.join(directory, name))
+
+
+def _arrow_types(arrow_type):
+    # 字典编码的列转换为pandas的category，其余列保持Arrow类型，直接引用映射内存
+    return None if pa.types.is_dictionary(arrow_type) else pd.ArrowDtype(arrow_type)
+
+
+def load_dataset(path, encoding='gbk', categorical=None):
+    """读取GBK等编码的CSV数据集，返回以Arrow为后端的DataFrame
+
+    第一次读取（或源文件变化后）先转换并写入缓存，之后直接内存映射缓存文件。
+    categorical是要作为分类列的列名，None时使用CATEGORICAL_COLUMNS中的设置，
+    未知数据集则自动选择低基数的文字列。缓存目录不可写时直接返回转换结果。
+    """
+    target = cache_path(path, encoding, categorical)
+    if not os.path.exists(target):
+        with _lock:
+            if not os.path.exists(target):
+                table = convert(path, encoding, categorical)
+                try:
+                    _write_cache(table, target, _cache_prefix(path))
+                except OSError:
+                    return table.to_pandas(types_mapper=_arrow_types)
+    table = feather.read_table(target, memory_map=True)
+    return table.to_pandas(types_mapper=_arrow_types)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预先生成CSV数据集的列式缓存")
+    parser.add_argument('paths', nargs='*', default=list(CATEGORICAL_COLUMNS), help="CSV文件，默认为已知的数据集")
+    parser.add_argument('--encoding', default='gbk')
+    args = parser.parse_args()
+
+    for path in args.paths:
+        df = load_dataset(path, args.encoding)
+        print(f"{path} → {cache_path(path, args.encoding)}（{len(df)} 行）")
+        print(df.dtypes.to_string())
+
+
+if __name__ == '__main__':
+    main()
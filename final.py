@@ -1,74 +1,69 @@
 
 
+import time
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 
-def get_dataframe_from_excel():
-    # pd.read_excel()函数用于读取Excel文件的数据
-    # 'supermarket_sales.xlsx'表示Excel文件的路径及名称
-    # sheet_name="销售数据"表示读取名为“销售数据”的工作表
-    # skiprows=1表示跳过Excel中的第1行，因为第1行是标题
-    # index_col="订单号"表示将“订单号”这一列作为返回的数据框的索引
-    # 最后将读取到的数据框赋值给变量df
-    df = pd.read_excel(
-        'supermarket_sales.xlsx',
-        sheet_name="销售数据",
-        skiprows=1,
-        index_col="订单号"
-    )
+import perf_timing
+import sales_data
+import sales_live
 
-    # df["时间"]取出原有的“时间”这一列，其中包含交易的完整时间字符串，如'10:25:30'
-    # pd.to_datetime将“时间”列转换成datetime类型
-    # format="%H:%M:%S"指定原有时间字符串的格式
-    # .dt.hour表示从转换后的数据框取出小时数作为新列
-    # 最后赋值给sale_df["小时"]，这样就可以得到一个包含交易小时的新列
-    df["小时"] = pd.to_datetime(df["时间"], format="%H:%M:%S").dt.hour
-    return df
+# 明细数据最多显示的行数
+DETAIL_ROWS = 1000
 
-def add_sidebar_func(df):
+@perf_timing.timed('读取Excel')
+def get_dataframe_from_excel():
+    # sales_data.load_sales()读取'supermarket_sales.xlsx'中名为“销售数据”的工作表，
+    # 以“订单号”列作为索引，并已经从“时间”列计算出交易的“小时”列
+    # 只在第一次加载时解析Excel，同时写入Parquet文件；之后的rerun直接使用进程内缓存的数据框，
+    # 服务器重启后读取Parquet文件，Excel文件内容变化时自动重新解析
+    # 返回的数据框由所有会话共享，只能读取
+    # 设置环境变量SALES_DATA_PATH可以改用列相同的其他数据文件（.xlsx、.csv或.parquet），
+    # 例如sales_generator.py生成的大数据量文件
+    return sales_data.load_sales(sales_data.DATA_PATH)
+
+@perf_timing.timed('筛选数据')
+def add_sidebar_func(filter_index):
+    # 各维度的选项直接来自位图索引（filter_index.options），不必每次rerun对整列求unique()
+    selections = {}
     # 创建侧边栏
     with st.sidebar:
         # 添加侧边栏标题
         st.header("请筛选数据：")
-        # 求数据框“城市”列去重复后的值，赋值给city_unique
-        city_unique = df["城市"].unique()
-        city = st.multiselect(
-            "请选择城市：",
-            options=city_unique,  # 将所有选项设置为city_unique
-            default=city_unique,  # 第1次的默认选项为city_unique
-        )
-        # 求数据框“顾客类型”列去重复后的值，赋值给customer_type_unique
-        customer_type_unique = df["顾客类型"].unique()
-        customer_type = st.multiselect(
-            "请选择顾客类型：",
-            options=customer_type_unique,  # 将所有选项设置为customer_type_unique
-            default=customer_type_unique,  # 第1次的默认选项为customer_type_unique
-        )
-
-        # 求数据框“性别”列去重复后的值，赋值给gender_unique
-        gender_unique = df["性别"].unique()
-        gender = st.multiselect(
-            "请选择性别：",
-            options=gender_unique,  # 将所有选项设置为gender_unique
-            default=gender_unique,  # 第1次的默认选项为gender_unique
-        )
-
-    # query()：查询方法，传入过滤条件字符串
-    # @city：通过@可以使用Streamlit多选下拉按钮“城市”的值
-    # @customer_type：通过@可以使用Streamlit多选下拉按钮“顾客类型”的值
-    # @gender：通过@可以使用Streamlit多选下拉按钮“性别”的值
-    # 最后赋值变量df_selection
-    df_selection = df.query(
-        "城市 == @city & 顾客类型 == @customer_type & 性别 == @gender"
-    )
-    return df_selection
-
-
-def product_line_chart(df):
-    # 将df按“产品类型”列分组，并计算“总价”列的和，然后按总价排序
+        for dimension in filter_index.dimensions:
+            options = filter_index.options[dimension]
+            selections[dimension] = st.multiselect(
+                f"请选择{dimension}：",
+                options=options,  # 将所有选项设置为该维度的全部取值
+                default=options,  # 第1次的默认选项为全部取值
+            )
+
+        # 日期范围，默认是数据中的全部日期
+        date_range = filter_index.date_range()
+        if date_range is not None:
+            picked = st.date_input(
+                "请选择日期范围：",
+                value=date_range,
+                min_value=date_range[0],
+                max_value=date_range[1],
+            )
+            # 只选了起始日期（正在选择结束日期）时，先按这一天筛选
+            if len(picked) == 1:
+                picked = (picked[0], picked[0])
+            date_range = tuple(picked) if len(picked) == 2 else None
+
+    # 返回筛选条件：{维度: 选中的取值}和日期范围
+    # 关键指标和图表从预聚合立方体计算，不需要筛选后的明细数据
+    return selections, date_range
+
+
+@perf_timing.timed('产品类型图表')
+def product_line_chart(selected):
+    # 从筛选后的子立方体中按“产品类型”汇总“总价”，然后按总价排序
     sales_by_product_line = (
-        df.groupby(by=["产品类型"])[["总价"]].sum().sort_values(by="总价")
+        selected.by("产品类型")[["总价"]].sort_values(by="总价")
     )
     # 使用px.bar函数生成条形图
     # - x="总价"：条形图的长度表示总价
@@ -85,10 +80,11 @@ def product_line_chart(df):
     # 将生成的条形图返回
     return fig_product_sales
 
-def hour_chart(df):
-    # 将df按“小时数”列分组，并计算“总价”列的和
+@perf_timing.timed('小时图表')
+def hour_chart(selected):
+    # 从筛选后的子立方体中按“小时”汇总“总价”
     sales_by_hour = (
-        df.groupby(by=["小时"])["总价"].sum()  # 这里原代码写的“小时数”，但df里是“小时”列，需对应
+        selected.by("小时")["总价"]
     )
     # 使用px.bar函数生成条形图
     # - x=sales_by_hour.index：条形图的标签是小时
@@ -103,22 +99,40 @@ def hour_chart(df):
     # 将生成的条形图返回
     return fig_hour_sales
 
-def main_page_demo(df):
-    """主界面函数"""
+def main_page_demo(cube, selections, date_range, live=None):
+    """主界面函数，所有指标和图表都由预聚合立方体中选中的格子求和得到
+
+    live不为None时是实时模式，关键指标和图表区域定时刷新，使用实时累加了新批次的立方体。
+    """
     # 设置标题
     st.title('销售仪表板')
+    if live is None:
+        key_metrics_and_charts(cube, selections, date_range)
+    else:
+        live_metrics_and_charts(live, selections, date_range)
+
+def key_metrics_and_charts(cube, selections, date_range):
+    """关键指标信息区和图表信息区"""
+    with perf_timing.phase('计算关键指标'):
+        # 每次rerun只筛选一次，关键指标和两个图表都从这个子立方体计算
+        selected = cube.select(selections, date_range)
+        # 筛选后的交易笔数、“总价”之和、“评分”之和
+        count, sales_sum, rating_sum = selected.totals()
+    if count == 0:
+        st.warning("没有符合筛选条件的数据，请调整侧边栏的筛选条件。")
+        return
+
     # 创建关键指标信息区，生成3个列容器
     left_key_col, middle_key_col, right_key_col = st.columns(3)
 
-    # 选中数据框中的“总价”列，使用sum()计算“总价”列的和，使用int()求整
-    total_sales = int(df["总价"].sum())
-    # 选中数据框中的“评分”列，使用mean()计算“评分”列的平均值，使用round()四舍五入
-    # 保留一位小数
-    average_rating = round(df["评分"].mean(), 1)
+    # 总销售额，使用int()求整
+    total_sales = int(sales_sum)
+    # 评分的平均值，使用round()四舍五入保留一位小数
+    average_rating = round(rating_sum / count, 1)
     # 对刚刚的结果再次四舍五入，只保留整数，并使用int()函数，表示就要整数，增加代码的可读性
     star_rating_string = ":star: " * int(round(average_rating, 0))
-    # 选中的数据框中的“总价”列，使用mean()计算“总价”列的平均值，使用round()四舍五入保留两位小数
-    average_sale_by_transaction = round(df["总价"].mean(), 2)
+    # 每单的平均销售额，使用round()四舍五入保留两位小数
+    average_sale_by_transaction = round(sales_sum / count, 2)
 
     # 关键指标区域：每个with块内的代码要缩进
     with left_key_col:
@@ -139,16 +153,59 @@ def main_page_demo(df):
     left_chart_col, right_chart_col = st.columns(2)
     with left_chart_col:
         # 生成纵向条形图
-        hour_fig = hour_chart(df)
+        hour_fig = hour_chart(selected)
         # 展示生成的Plotly图形，并设置使用父容器的宽度
         st.plotly_chart(hour_fig, use_container_width=True)
 
     with right_chart_col:
         # 生成横向条形图
-        product_fig = product_line_chart(df)
+        product_fig = product_line_chart(selected)
         # 展示生成的Plotly图形，并设置使用父容器的宽度
         st.plotly_chart(product_fig, use_container_width=True)
 
+@st.fragment(run_every=sales_live.REFRESH_SECONDS)
+def live_metrics_and_charts(live, selections, date_range):
+    """实时模式：每隔REFRESH_SECONDS秒只重新运行这个区域，先累加新到的批次，再显示指标和图表"""
+    with perf_timing.phase('增量读取'):
+        live.poll()
+    # 立方体和版本号一起取出，下面显示的指标正好包含版本号及之前的批次
+    cube, version = live.snapshot()
+    key_metrics_and_charts(cube, selections, date_range)
+    show_live_latency(live, version)
+
+def show_live_latency(live, version):
+    """计算并显示本会话中每个新批次从落地到显示的延迟"""
+    shown_at = time.time()
+    state = st.session_state.get('_sales_live')
+    if state is None or state['live'] is not live:
+        # 打开页面之前已经累加的批次不计算延迟
+        state = st.session_state['_sales_live'] = {'live': live, 'version': version, 'latencies': []}
+    latencies = state['latencies']
+    latencies.extend(sales_live.latency_rows(live.records(state['version'], version), shown_at))
+    del latencies[:-sales_live.HISTORY_BATCHES]
+    state['version'] = version
+
+    st.caption(f"实时模式：{live.source.describe()}，每 {sales_live.REFRESH_SECONDS:g} 秒检查一次，"
+               f"已累加 {version} 批、{live.rows:,} 笔新交易")
+    if latencies:
+        last = latencies[-1]
+        end_to_end = pd.Series([row['端到端(秒)'] for row in latencies])
+        st.caption(f"最近一批（{last['批次']}，{last['笔数']:,} 笔）从落地到显示用了 {last['端到端(秒)']:.2f} 秒；"
+                   f"本会话 {len(latencies)} 批的中位数 {end_to_end.median():.2f} 秒，最大 {end_to_end.max():.2f} 秒")
+        with st.expander("实时更新延迟"):
+            st.dataframe(pd.DataFrame(latencies[::-1]), hide_index=True, use_container_width=True)
+    if live.errors:
+        st.warning(f"有批次读取失败：{live.errors[-1]}")
+
+def detail_table(df, filter_index, selections, date_range):
+    """勾选后才用位图索引取出筛选后的明细数据，只显示前DETAIL_ROWS行"""
+    if not st.checkbox("显示筛选后的明细数据"):
+        return
+    with perf_timing.phase('筛选明细数据'):
+        df_selection = filter_index.select(df, selections, date_range)
+    st.caption(f"共 {len(df_selection):,} 笔交易，显示前 {min(len(df_selection), DETAIL_ROWS):,} 笔")
+    st.dataframe(df_selection.head(DETAIL_ROWS), use_container_width=True)
+
 def run_app():
     """启动应用"""
     # 设置页面
@@ -157,13 +214,27 @@ def run_app():
         page_icon=":bar_chart:",  # 图标
         layout="wide"  # 宽布局
     )
+    # 开始记录本次rerun的分阶段耗时
+    perf_timing.start_rerun('final')
 
     # 将Excel中的销售数据读取到数据框中
     sale_df = get_dataframe_from_excel()
-    # 添加不同的多选下拉按钮，并形成筛选后的数据框，构建筛选区
-    df_selection = add_sidebar_func(sale_df)
+    # 筛选用的位图索引和预聚合立方体，每个数据版本只构建一次
+    filter_index = sales_data.load_filter_index(sales_data.DATA_PATH)
+    cube = sales_data.load_sales_cube(sales_data.DATA_PATH)
+    # 添加不同的多选下拉按钮，得到筛选条件，构建筛选区
+    selections, date_range = add_sidebar_func(filter_index)
+    # 设置了SALES_LIVE_SOURCE时是实时模式，从投放目录或SQLite表中增量累加新的交易批次
+    live = None
+    if sales_live.LIVE_SOURCE:
+        live = sales_live.get_live_sales(sales_data.DATA_PATH)
+        # 日期范围到达数据文件的最后一天时，包含之后新到的日期
+        date_range = sales_live.open_ended(date_range, filter_index.date_range())
     # 构建主界面
-    main_page_demo(df_selection)
+    main_page_demo(cube, selections, date_range, live)
+    detail_table(sale_df, filter_index, selections, date_range)
+    # 结束本次rerun的计时，写入JSONL，并在侧边栏显示计时面板（需勾选）
+    perf_timing.finish_rerun()
 
 # 标准的Python开始程序（注意：这个代码块要在run_app函数外面）
 if __name__ == "__main__":
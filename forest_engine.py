@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import model_registry
+
+
+# 随机森林的扁平数组推理引擎
+#
+# sklearn对单行预测的大部分时间花在输入校验、DataFrame转数组和逐棵树调度上。
+# 这里把所有树的节点打包成几个连续的NumPy数组（特征、阈值、左右子节点、叶子值），
+# 预测时所有树、所有行同时沿树向下走一层，已经到达叶子的组合不再参与后续计算，
+# 循环次数最多等于树的最大深度。
+# 它面向单行和小批量预测；上千行的大批量时sklearn的Cython实现更快，
+# 两者的延迟对比见bench_forest_engine.py。
+#
+# 模型文件有两种格式：
+# - 原来的pickle文件（rfc_model.pkl等），加载时转换为FlatForest
+# - 目录格式（rfc_model.forest/），每个节点数组是一个未压缩的.npy文件，外加meta.json，
+#   用mmap_mode='r'加载：同一台机器上的多个Streamlit进程共享同一份物理内存页，
+#   加载时不需要反序列化，也不需要导入sklearn，冷启动几乎没有开销
+# 用 python forest_engine.py rfc_model.pkl 把pickle文件转换为目录格式。
+#
+# 结果与sklearn逐位一致：
+# - 输入和sklearn一样先转换为float32，再与float64阈值比较
+# - 缺失值按每个节点的missing_go_to_left规则走向子节点
+# - 叶子值按森林中树的顺序依次累加，再除以树的数量
+#   （模型设置了n_jobs>1时sklearn自身的累加顺序也不固定，那时只能保证误差在1ULP量级）
+
+# 目录格式中以.npy文件保存的数组
+ARRAY_FIELDS = ['feature', 'threshold', 'children', 'is_leaf', 'missing_left', 'value', 'roots']
+# 目录正在被替换时加载的重试次数和间隔
+SWAP_RETRIES = 3
+SWAP_RETRY_SECONDS = 0.05
+
+
+class FlatForest:
+    """由已训练的RandomForestClassifier/RandomForestRegressor转换而来的推理引擎"""
+
+    def __init__(self, feature, threshold, children, is_leaf, missing_left, value,
+                 roots, max_depth, n_features_in_, feature_names_in_=None, classes_=None):
+        self.feature = feature
+        self.threshold = threshold
+        # children[2 * i]是节点i的左子节点，children[2 * i + 1]是右子节点，
+        # 一次取数就能按比较结果走到下一层
+        self.children = children
+        self.is_leaf = is_leaf
+        self.missing_left = missing_left
+        # 叶子节点的输出：分类器为(节点数, 类别数)的概率，回归器为(节点数, 1)
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_features_in_ = n_features_in_
+        self.feature_names_in_ = feature_names_in_
+        self.classes_ = classes_
+
+    @classmethod
+    def from_model(cls, model):
+        """把已训练的sklearn随机森林转换为扁平数组"""
+        # 只在转换时才需要sklearn，加载目录格式的进程不必导入它
+        from sklearn.base import is_classifier
+
+        if model.n_outputs_ != 1:
+            raise ValueError("FlatForest只支持单输出的随机森林")
+        classifier = is_classifier(model)
+
+        features, thresholds, children, leaves, missing_lefts, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(offset, offset + n_nodes, dtype=np.intp)
+            is_leaf = tree.children_left == -1
+
+            # 叶子节点的特征号置0、子节点指向自己，保证任何取数都不会越界
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.intp)
+            threshold = np.where(is_leaf, np.inf, tree.threshold)
+            left = np.where(is_leaf, node_ids, tree.children_left + offset)
+            right = np.where(is_leaf, node_ids, tree.children_right + offset)
+
+            # 分类树的value已经是各类别的样本占比，DecisionTreeClassifier.predict_proba直接返回它
+            value = tree.value[:, 0, :estimator.n_classes_ if classifier else 1]
+
+            features.append(feature)
+            thresholds.append(threshold)
+            children.append(np.column_stack([left, right]).ravel())
+            leaves.append(is_leaf)
+            missing_lefts.append(tree.missing_go_to_left.astype(bool))
+            values.append(value)
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.concatenate(children).astype(np.intp),
+            is_leaf=np.concatenate(leaves),
+            missing_left=np.concatenate(missing_lefts),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.array(roots, dtype=np.intp),
+            max_depth=max_depth,
+            n_features_in_=model.n_features_in_,
+            feature_names_in_=getattr(model, 'feature_names_in_', None),
+            classes_=model.classes_ if classifier else None,
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _as_array(self, X):
+        """把输入转换为C连续的float32二维数组（与sklearn内部使用的类型相同）"""
+        if hasattr(X, 'columns') and self.feature_names_in_ is not None \
+                and list(X.columns) != list(self.feature_names_in_):
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"输入有 {X.shape[1]} 个特征，模型需要 {self.n_features_in_} 个")
+        return np.ascontiguousarray(X)
+
+    def apply(self, X):
+        """返回每棵树中每行落到的叶子节点编号，形状为(树的数量, 行数)"""
+        X = self._as_array(X)
+        n_rows, n_features = X.shape
+        X_flat = X.ravel()
+        has_missing = np.isnan(X_flat).any()
+
+        # 所有(树, 行)组合展平成一维，每一步只处理还没有到达叶子的组合
+        leaves = np.repeat(self.roots, n_rows)
+        row_offsets = np.tile(np.arange(n_rows, dtype=np.intp) * n_features, self.n_trees)
+        active = np.flatnonzero(~self.is_leaf[leaves])
+        nodes = leaves[active]
+        row_offsets = row_offsets[active]
+        while active.size:
+            x = X_flat[row_offsets + self.feature[nodes]]
+            # NaN与阈值比较为False，默认走右子节点，再按missing_go_to_left修正
+            go_right = ~(x <= self.threshold[nodes])
+            if has_missing:
+                missing = np.isnan(x)
+                go_right[missing] = ~self.missing_left[nodes[missing]]
+            nodes = self.children[2 * nodes + go_right]
+
+            reached = self.is_leaf[nodes]
+            if reached.any():
+                leaves[active[reached]] = nodes[reached]
+                pending = ~reached
+                active = active[pending]
+                nodes = nodes[pending]
+                row_offsets = row_offsets[pending]
+        return leaves.reshape(self.n_trees, n_rows)
+
+    def _accumulate(self, X):
+        """按树的顺序依次累加各棵树的叶子值，再除以树的数量"""
+        leaf_values = self.value[self.apply(X)]
+        # np.add.reduce可能改变相加顺序（成对求和），accumulate严格按树的顺序依次相加，
+        # 与sklearn逐棵树累加的浮点结果一致
+        total = np.add.accumulate(leaf_values, axis=0)[-1]
+        total /= self.n_trees
+        return total
+
+    def predict_proba(self, X):
+        if self.classes_ is None:
+            raise AttributeError("回归模型没有predict_proba")
+        return self._accumulate(X)
+
+    def predict(self, X):
+        if self.classes_ is not None:
+            return self.classes_.take(np.argmax(self._accumulate(X), axis=1), axis=0)
+        return self._accumulate(X)[:, 0]
+
+
+def save_flat_forest(forest, path):
+    """把FlatForest保存为目录格式
+
+    先写入同级的临时目录，再把旧目录移开、新目录移入，正在使用旧文件的进程不受影响
+    （已经映射的旧文件在最后一个进程关闭前不会被真正释放）。
+    目录不能被原子地替换：两次改名之间path短暂不存在，load_flat_forest()会稍等后重试。
+    """
+    path = os.path.abspath(path)
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp_', dir=os.path.dirname(path))
+    try:
+        for field in ARRAY_FIELDS:
+            np.save(os.path.join(tmp_dir, f'{field}.npy'), np.ascontiguousarray(getattr(forest, field)))
+        meta = {
+            'max_depth': int(forest.max_depth),
+            'n_features_in_': int(forest.n_features_in_),
+            'feature_names_in_': None if forest.feature_names_in_ is None else list(forest.feature_names_in_),
+            'classes_': None if forest.classes_ is None else forest.classes_.tolist(),
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        # mkdtemp创建的目录只有本用户可以访问，改为与其他模型文件相同的权限，其他用户运行的进程也能映射
+        for name in os.listdir(tmp_dir):
+            os.chmod(os.path.join(tmp_dir, name), 0o644)
+        os.chmod(tmp_dir, 0o755)
+
+        old_dir = None
+        if os.path.exists(path):
+            old_dir = tempfile.mkdtemp(prefix='.old_', dir=os.path.dirname(path))
+            os.replace(path, os.path.join(old_dir, 'forest'))
+        os.replace(tmp_dir, path)
+        if old_dir is not None:
+            shutil.rmtree(old_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def _mmap_loader(path):
+    """以内存映射方式加载目录格式的模型，数组数据按需从页缓存读取"""
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    # 去掉np.memmap子类（映射关系不变），避免每次索引都经过子类的额外开销
+    arrays = {
+        field: np.load(os.path.join(path, f'{field}.npy'), mmap_mode='r').view(np.ndarray)
+        for field in ARRAY_FIELDS
+    }
+    return FlatForest(
+        max_depth=meta['max_depth'],
+        n_features_in_=meta['n_features_in_'],
+        feature_names_in_=None if meta['feature_names_in_'] is None else np.array(meta['feature_names_in_'], dtype=object),
+        classes_=None if meta['classes_'] is None else np.array(meta['classes_']),
+        **arrays,
+    )
+
+
+def _flat_forest_loader(path):
+    if os.path.isdir(path):
+        return _mmap_loader(path)
+    with open(path, 'rb') as f:
+        return FlatForest.from_model(pickle.load(f))
+
+
+def load_flat_forest(path):
+    """加载FlatForest，通过模型注册表在进程内缓存
+
+    path是目录时按内存映射的目录格式加载，是文件时按pickle加载并转换（兼容原有的.pkl模型）。
+    save_flat_forest()正在替换目录时path会短暂不存在，这时稍等后重试，重试后仍不存在才抛出FileNotFoundError。
+    """
+    for attempt in range(SWAP_RETRIES):
+        try:
+            return model_registry.get_model(path, loader=_flat_forest_loader)
+        except FileNotFoundError:
+            if attempt == SWAP_RETRIES - 1:
+                raise
+            time.sleep(SWAP_RETRY_SECONDS)
+
+
+def flat_forest_entry(path):
+    """返回load_flat_forest(path)加载结果的注册表记录（含模型文件内容的sha256），未加载过时返回None"""
+    return model_registry.get_entry(path, loader=_flat_forest_loader)
+
+
+def preferred_artifact(pkl_path):
+    """pkl_path旁边存在同名的目录格式模型（如rfc_model.forest）时优先使用它
+
+    目录正在被save_flat_forest()替换的瞬间返回pkl_path，加载的是同一个模型。
+    """
+    forest_path = os.path.splitext(pkl_path)[0] + '.forest'
+    return forest_path if os.path.isdir(forest_path) else pkl_path
+
+
+def convert(pkl_path, output=None):
+    """把pickle模型文件转换为目录格式，返回输出目录"""
+    output = output or os.path.splitext(pkl_path)[0] + '.forest'
+    with open(pkl_path, 'rb') as f:
+        forest = FlatForest.from_model(pickle.load(f))
+    save_flat_forest(forest, output)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把pickle格式的随机森林模型转换为可内存映射的目录格式")
+    parser.add_argument('pkl_paths', nargs='+', help="pickle模型文件，例如rfc_model.pkl rfr_model.pkl")
+    parser.add_argument('-o', '--output', help="输出目录（只转换一个文件时可用），默认为同名的.forest目录")
+    args = parser.parse_args()
+    if args.output and len(args.pkl_paths) > 1:
+        parser.error("转换多个文件时不能指定--output")
+
+    for pkl_path in args.pkl_paths:
+        output = convert(pkl_path, args.output)
+        print(f"{pkl_path} → {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+import batch_output
+from insurance_features import FEATURE_NAMES, INPUT_COLUMNS, encode_insurance
+
+
+# 每次预测的行数，内存占用只与它有关，与上传文件的总行数无关
+CHUNK_SIZE = 20000
+
+RESULT_COLUMN = '预测医疗费用'
+
+
+def _input_size(file):
+    """返回上传文件的总字节数，用于估算进度"""
+    position = file.tell()
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(position)
+    return size
+
+
+def _csv_chunks(file, encoding, chunk_size):
+    """按块读取CSV，产生(数据块, 已处理比例)"""
+    total_bytes = _input_size(file) or 1
+    for chunk in pd.read_csv(file, encoding=encoding, chunksize=chunk_size):
+        yield chunk, min(file.tell() / total_bytes, 1.0)
+
+
+def _xlsx_chunks(file, chunk_size):
+    """用openpyxl的只读模式逐行读取第一个工作表，产生(数据块, 已处理比例)
+
+    pd.read_excel会一次性读入整个工作表，只读模式按行流式解析，内存只保留当前数据块。
+    文件损坏或不是xlsx格式（例如改了扩展名）时抛出ValueError。
+    """
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        raise ValueError(f"不是有效的xlsx文件（{e}）") from e
+    try:
+        sheet = workbook.worksheets[0]
+        total_rows = max((sheet.max_row or 1) - 1, 1)
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(name).strip() if name is not None else '' for name in next(rows, ())]
+        buffer, seen = [], 0
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) == chunk_size:
+                seen += len(buffer)
+                yield pd.DataFrame(buffer, columns=header), min(seen / total_rows, 1.0)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header), 1.0
+    finally:
+        workbook.close()
+
+
+def quote_chunk(chunk, rfr_model):
+    """对一个数据块做向量化报价，返回增加了“预测医疗费用”列的数据块
+
+    年龄、BMI、子女数量缺失或不是数字，以及性别、是否吸烟、区域不是已知取值的行无法报价，结果列留空。
+    """
+    X = encode_insurance(chunk)
+    # 三组独热列各自恰好有一个1，且数值列都不是缺失值
+    mask = ~np.isnan(X[:, :3]).any(axis=1) & (X[:, 3:].sum(axis=1) == 3)
+    result = np.full(len(chunk), np.nan)
+    if mask.any():
+        result[mask] = rfr_model.predict(pd.DataFrame(X[mask], columns=FEATURE_NAMES)).round(2)
+    chunk[RESULT_COLUMN] = result
+    return chunk
+
+
+def quote_file(file, rfr_model, file_name, output_format='csv', encoding='gbk',
+               chunk_size=CHUNK_SIZE, on_progress=None):
+    """分块读取上传的CSV/XLSX文件，逐块报价并写入临时结果文件
+
+    file_name用于按扩展名判断文件类型。文件缺少insurance-chinese.csv中的某一列或无法解析时抛出ValueError。
+    on_progress(已处理比例, 已处理行数, 刚写入的数据块)在每个数据块之后调用。
+    返回(结果文件路径, 总行数)，调用方负责在下载后删除结果文件。
+    """
+    if file_name.lower().endswith('.xlsx'):
+        chunks = _xlsx_chunks(file, chunk_size)
+    else:
+        chunks = _csv_chunks(file, encoding, chunk_size)
+    progress = {'ratio': 0.0}
+
+    def priced_chunks():
+        for chunk, ratio in chunks:
+            missing = [column for column in INPUT_COLUMNS if column not in chunk.columns]
+            if missing:
+                raise ValueError(f"文件缺少以下列：{'、'.join(missing)}")
+            progress['ratio'] = ratio
+            yield quote_chunk(chunk, rfr_model)
+
+    def on_chunk(chunk, rows):
+        if on_progress is not None:
+            on_progress(progress['ratio'], rows, chunk)
+
+    return batch_output.write_chunks(priced_chunks(), output_format, prefix='insurance_batch_', on_chunk=on_chunk)
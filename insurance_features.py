@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+
+# insurance-chinese.csv的中文列名
+AGE_COLUMN = '年龄'
+SEX_COLUMN = '性别'
+BMI_COLUMN = 'BMI'
+CHILDREN_COLUMN = '子女数量'
+SMOKE_COLUMN = '是否吸烟'
+REGION_COLUMN = '区域'
+TARGET_COLUMN = '医疗费用'
+
+INPUT_COLUMNS = [AGE_COLUMN, SEX_COLUMN, BMI_COLUMN, CHILDREN_COLUMN, SMOKE_COLUMN, REGION_COLUMN]
+
+# 分类取值 → 独热编码后的特征名，与ten.py中predict_page的if/elif分支一致
+SEX_FEATURES = {'女性': 'sex_female', '男性': 'sex_male'}
+SMOKE_FEATURES = {'否': 'smoke_no', '是': 'smoke_yes'}
+REGION_FEATURES = {
+    '东北部': 'region_northeast',
+    '东南部': 'region_southeast',
+    '西北部': 'region_northwest',
+    '西南部': 'region_southwest',
+}
+
+# 与ten.py中format_data的顺序完全一致
+FEATURE_NAMES = [
+    'age', 'bmi', 'children', 'sex_female', 'sex_male',
+    'smoke_no', 'smoke_yes',
+    'region_northeast', 'region_southeast', 'region_northwest', 'region_southwest'
+]
+
+
+def _one_hot(values, value_to_feature, out):
+    """用分类编码一次性写出一组独热列，不认识的取值编码为全0"""
+    categories = list(value_to_feature)
+    codes = pd.Categorical(values, categories=categories).codes
+    columns = np.array([FEATURE_NAMES.index(value_to_feature[c]) for c in categories])
+    rows = np.flatnonzero(codes >= 0)
+    out[rows, columns[codes[rows]]] = 1.0
+
+
+def encode_insurance(df):
+    """把insurance-chinese.csv格式的数据编码为模型的特征矩阵
+
+    返回形状为(行数, 11)的float64数组，列顺序与FEATURE_NAMES一致。
+    """
+    X = np.zeros((len(df), len(FEATURE_NAMES)), dtype=np.float64)
+    X[:, 0] = pd.to_numeric(df[AGE_COLUMN], errors='coerce')
+    X[:, 1] = pd.to_numeric(df[BMI_COLUMN], errors='coerce')
+    X[:, 2] = pd.to_numeric(df[CHILDREN_COLUMN], errors='coerce')
+    _one_hot(df[SEX_COLUMN], SEX_FEATURES, X)
+    _one_hot(df[SMOKE_COLUMN], SMOKE_FEATURES, X)
+    _one_hot(df[REGION_COLUMN], REGION_FEATURES, X)
+    return X
@@ -0,0 +1,59 @@
+import threading
+
+import forest_engine
+import model_registry
+
+
+# ten.py/webo.py/webw.py共用的医疗费用模型获取方式
+#
+# - 惰性：只有提交表单、真正需要预测时才获取模型，切换单选框、修改数字等rerun不触碰模型
+# - 进程内缓存：通过模型注册表加载，一个进程只加载一次，所有会话和三个页面变体共享；
+#   模型文件更新后自动重新加载
+# - 预热：warm_up()在服务器进程第一次执行脚本时启动后台线程预先加载模型，
+#   第一个真正的报价也不用等待加载（注册表内部有锁，预热和提交同时发生时只会加载一次）
+
+MODEL_PATH = 'rfr_model.pkl'
+
+_warm_up_started = False
+_warm_up_lock = threading.Lock()
+
+
+def get_insurance_model():
+    """返回医疗费用预测模型（FlatForest，输出与sklearn模型的predict完全一致）
+
+    存在rfr_model.forest目录时以内存映射方式加载，否则加载rfr_model.pkl。
+    """
+    return forest_engine.load_flat_forest(forest_engine.preferred_artifact(MODEL_PATH))
+
+
+def get_insurance_model_entry():
+    """返回get_insurance_model()所加载模型的注册表记录
+
+    entry.obj是FlatForest，entry.sha256是其模型文件内容的sha256，可作为依赖该模型的计算结果的缓存键。
+    """
+    path = forest_engine.preferred_artifact(MODEL_PATH)
+    forest_engine.load_flat_forest(path)
+    return forest_engine.flat_forest_entry(path)
+
+
+def get_batch_model():
+    """返回批量报价使用的sklearn原始模型：上千行的数据块用sklearn的Cython实现预测更快"""
+    return model_registry.get_model(MODEL_PATH)
+
+
+def _warm_up():
+    try:
+        get_insurance_model()
+    except FileNotFoundError:
+        # 模型文件缺失时由提交表单时的加载报错，预热阶段不处理
+        pass
+
+
+def warm_up():
+    """在后台线程中预加载模型，每个进程只执行一次，不阻塞当前页面的渲染"""
+    global _warm_up_started
+    with _warm_up_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+    threading.Thread(target=_warm_up, name='insurance-model-warm-up', daemon=True).start()
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from insurance_features import (AGE_COLUMN, BMI_COLUMN, CHILDREN_COLUMN, FEATURE_NAMES, INPUT_COLUMNS,
+                                SMOKE_COLUMN, SMOKE_FEATURES, encode_insurance)
+
+
+# 投保人的费用敏感性分析：固定其他输入，只改变年龄、BMI或子女数量中的一个，
+# 分别计算吸烟和不吸烟两种情况下的预测费用曲线。
+# 所有曲线上的点拼成一个特征矩阵，只调用一次predict。
+
+# 每个变量的取值：年龄和子女数量是整数，取训练数据范围内的全部整数；BMI按0.1细分
+SWEEPS = {
+    AGE_COLUMN: np.arange(18, 65),
+    BMI_COLUMN: np.round(np.arange(15.0, 55.0 + 1e-9, 0.1), 1),
+    CHILDREN_COLUMN: np.arange(0, 6),
+}
+
+VARIABLE_COLUMN = '变量'
+VALUE_COLUMN = '取值'
+RESULT_COLUMN = '预测医疗费用'
+
+
+def sweep_frame(profile):
+    """生成所有曲线上的点，profile是包含INPUT_COLUMNS各列取值的字典
+
+    返回的DataFrame除INPUT_COLUMNS外还有“变量”“取值”两列，标明每行属于哪条曲线。
+    """
+    parts = []
+    for variable, values in SWEEPS.items():
+        for smoke in SMOKE_FEATURES:
+            part = pd.DataFrame({column: np.repeat(profile[column], len(values)) for column in INPUT_COLUMNS})
+            part[variable] = values
+            part[SMOKE_COLUMN] = smoke
+            part[VARIABLE_COLUMN] = variable
+            part[VALUE_COLUMN] = values.astype(np.float64)
+            parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def sensitivity_curves(rfr_model, profile):
+    """一次预测得到全部敏感性曲线
+
+    返回长表：变量、取值、是否吸烟、预测医疗费用，每条曲线按取值升序排列。
+    """
+    frame = sweep_frame(profile)
+    X = pd.DataFrame(encode_insurance(frame), columns=FEATURE_NAMES)
+    frame[RESULT_COLUMN] = rfr_model.predict(X)
+    return frame[[VARIABLE_COLUMN, VALUE_COLUMN, SMOKE_COLUMN, RESULT_COLUMN]]
@@ -0,0 +1,202 @@
+import hashlib
+import mmap
+import os
+import pickle
+import threading
+import sys
+import time
+from dataclasses import dataclass
+
+
+# 进程级模型注册表：
+# - 每个模型文件在一个服务器进程中只反序列化一次，所有会话共享同一个对象
+# - 每次获取时只做一次os.stat()，文件的修改时间/大小变化后再计算内容哈希，
+#   哈希也变了才重新加载（热替换），仅被touch的文件不会重复加载
+# - 记录每个模型的加载耗时和常驻内存，供管理页面展示
+
+
+@dataclass
+class ModelEntry:
+    """注册表中的一条记录"""
+    path: str
+    loader_name: str
+    obj: object
+    mtime_ns: int
+    file_size: int
+    disk_bytes: int
+    sha256: str
+    load_seconds: float
+    resident_bytes: int
+    loaded_at: float
+    load_count: int = 1
+
+
+_entries = {}
+_lock = threading.Lock()
+# 每个(文件, loader)一把加载锁：加载慢的模型不会挡住其他模型的获取
+_load_locks = {}
+
+
+def _artifact_files(path):
+    """模型由单个文件组成时返回它本身，由目录组成时返回目录下的全部文件（按名称排序）"""
+    if not os.path.isdir(path):
+        return [path]
+    return [os.path.join(path, name) for name in sorted(os.listdir(path))
+            if os.path.isfile(os.path.join(path, name))]
+
+
+def artifact_sha256(path):
+    """分块计算文件（或目录下全部文件）内容的sha256，避免一次性读入大文件"""
+    digest = hashlib.sha256()
+    for file_path in _artifact_files(path):
+        digest.update(os.path.basename(file_path).encode('utf-8'))
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _pickle_loader(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _is_memory_mapped(array):
+    """沿着base链查找，判断数组的数据是否来自mmap"""
+    base = array
+    while base is not None:
+        if isinstance(base, mmap.mmap):
+            return True
+        base = getattr(base, 'base', None)
+    return False
+
+
+def _resident_size(obj, seen=None):
+    """递归估算对象占用的内存字节数
+
+    NumPy数组按nbytes计算；sklearn的Tree等扩展类型没有__dict__，
+    通过__getstate__()拿到其中的节点数组再统计。
+    """
+    # seen同时持有对象引用，防止__getstate__()产生的临时对象被回收后id被复用
+    if seen is None:
+        seen = {}
+    if id(obj) in seen:
+        return 0
+    seen[id(obj)] = obj
+
+    if hasattr(obj, 'memory_usage') and hasattr(obj, 'index'):
+        # pandas的DataFrame/Series：sys.getsizeof()按memory_usage(deep=True)计算，不必再递归
+        return sys.getsizeof(obj)
+    nbytes = getattr(obj, 'nbytes', None)
+    if isinstance(nbytes, int) and hasattr(obj, 'dtype'):
+        if _is_memory_mapped(obj):
+            # 内存映射数组的数据在操作系统页缓存中，由所有进程共享，不计入本进程的常驻内存
+            return 0
+        return sys.getsizeof(obj) if obj.base is None else nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _resident_size(key, seen) + _resident_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += _resident_size(item, seen)
+    elif isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        pass
+    elif hasattr(obj, '__dict__'):
+        size += _resident_size(vars(obj), seen)
+    elif hasattr(obj, '__getstate__'):
+        try:
+            state = obj.__getstate__()
+        except TypeError:
+            state = None
+        if state is not None:
+            size += _resident_size(state, seen)
+    return size
+
+
+def _load(path, loader):
+    """加载模型，同时测量耗时和模型对象的常驻大小"""
+    start = time.perf_counter()
+    obj = loader(path)
+    load_seconds = time.perf_counter() - start
+    return obj, load_seconds, _resident_size(obj)
+
+
+def get_model(path, loader=None):
+    """返回path对应的模型对象，进程内只加载一次，文件内容变化时自动重新加载
+
+    loader是接收文件路径、返回模型对象的函数，默认使用pickle。
+    同一个文件可以用不同的loader各加载一份（例如原始模型和转换后的推理引擎），互不影响。
+    文件不存在时抛出FileNotFoundError，与直接open()的行为一致。
+    """
+    loader = loader or _pickle_loader
+    abspath = os.path.abspath(path)
+    key = (abspath, loader)
+    stat = os.stat(abspath)
+    entry = _entries.get(key)
+    if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.file_size == stat.st_size:
+        return entry.obj
+
+    with _lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+    with load_lock:
+        # 拿到锁之后再检查一次，别的会话可能已经完成了加载
+        entry = _entries.get(key)
+        if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.file_size == stat.st_size:
+            return entry.obj
+
+        sha256 = artifact_sha256(abspath)
+        if entry is not None and entry.sha256 == sha256:
+            # 内容没变，只是修改时间变了，不必重新反序列化
+            entry.mtime_ns = stat.st_mtime_ns
+            entry.file_size = stat.st_size
+            return entry.obj
+
+        obj, load_seconds, resident_bytes = _load(abspath, loader)
+        _entries[key] = ModelEntry(
+            path=abspath,
+            loader_name=getattr(loader, '__name__', repr(loader)),
+            obj=obj,
+            mtime_ns=stat.st_mtime_ns,
+            file_size=stat.st_size,
+            disk_bytes=sum(os.path.getsize(p) for p in _artifact_files(abspath)),
+            sha256=sha256,
+            load_seconds=load_seconds,
+            resident_bytes=resident_bytes,
+            loaded_at=time.time(),
+            load_count=entry.load_count + 1 if entry is not None else 1,
+        )
+        return obj
+
+
+def get_entry(path, loader=None):
+    """返回path对应的注册表记录，未加载过时返回None"""
+    return _entries.get((os.path.abspath(path), loader or _pickle_loader))
+
+
+def invalidate(path=None):
+    """丢弃指定模型的所有加载结果（path为None时丢弃全部），下次获取时重新加载"""
+    with _lock:
+        if path is None:
+            _entries.clear()
+        else:
+            abspath = os.path.abspath(path)
+            for key in [key for key in _entries if key[0] == abspath]:
+                del _entries[key]
+
+
+def registry_stats():
+    """返回所有已加载模型的统计信息，每个模型一个字典，用于管理页面展示"""
+    return [
+        {
+            '文件': os.path.basename(entry.path),
+            '加载方式': entry.loader_name,
+            '加载耗时(毫秒)': round(entry.load_seconds * 1000, 2),
+            '常驻内存(KB)': round(entry.resident_bytes / 1024, 1),
+            '文件大小(KB)': round(entry.disk_bytes / 1024, 1),
+            'SHA256': entry.sha256[:12],
+            '加载时间': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.loaded_at)),
+            '加载次数': entry.load_count,
+        }
+        for entry in list(_entries.values())
+    ]
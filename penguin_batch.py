@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import batch_output
+from penguin_features import complete_rows, encode_penguins
+
+
+# 每次预测的行数，内存占用只与它有关，与上传文件的总行数无关
+CHUNK_SIZE = 20000
+
+RESULT_COLUMN = '预测物种'
+
+
+def _input_size(file):
+    """返回上传文件的总字节数，用于估算进度"""
+    position = file.tell()
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(position)
+    return size
+
+
+def classify_chunk(chunk, rfc_model, output_uniques_map):
+    """对一个数据块做向量化预测，返回增加了“预测物种”列的数据块
+
+    测量值不完整的行无法预测，结果列留空。
+    """
+    X = encode_penguins(chunk, rfc_model.feature_names_in_)
+    mask = complete_rows(X)
+    labels = np.full(len(chunk), None, dtype=object)
+    if mask.any():
+        X_df = pd.DataFrame(X[mask], columns=rfc_model.feature_names_in_)
+        codes = rfc_model.predict(X_df)
+        # 把类别编码一次性映射为物种名称
+        lookup = np.array([output_uniques_map[c] for c in rfc_model.classes_], dtype=object)
+        labels[mask] = lookup[np.searchsorted(rfc_model.classes_, codes)]
+    # 固定为字符串类型，避免整块都是缺失值时推断出不同的列类型
+    chunk[RESULT_COLUMN] = pd.array(labels, dtype='string')
+    return chunk
+
+
+def classify_file(file, rfc_model, output_uniques_map, output_format='csv',
+                  encoding='gbk', chunk_size=CHUNK_SIZE, on_progress=None):
+    """分块读取上传的CSV文件，逐块预测并写入临时结果文件
+
+    每个数据块预测完就追加写入磁盘，不在内存中保留全部结果。
+    on_progress(已处理比例, 已处理行数)在每个数据块之后调用。
+    返回(结果文件路径, 总行数)，调用方负责在下载后删除结果文件。
+    """
+    total_bytes = _input_size(file) or 1
+    chunks = (classify_chunk(chunk, rfc_model, output_uniques_map)
+              for chunk in pd.read_csv(file, encoding=encoding, chunksize=chunk_size))
+
+    def on_chunk(chunk, rows):
+        if on_progress is not None:
+            on_progress(min(file.tell() / total_bytes, 1.0), rows)
+
+    return batch_output.write_chunks(chunks, output_format, prefix='penguin_batch_', on_chunk=on_chunk)
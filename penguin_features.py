@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+
+# （企鹅识别数据）penguins-chinese.csv的中文列名 → 模型特征名
+NUMERIC_COLUMNS = {
+    '喙的长度': 'bill_length',
+    '喙的深度': 'bill_depth',
+    '翅膀的长度': 'flipper_length',
+    '身体质量': 'body_mass',
+}
+
+ISLAND_COLUMN = '企鹅栖息的岛屿'
+SEX_COLUMN = '性别'
+SPECIES_COLUMN = '企鹅的种类'
+
+# 岛屿/性别取值 → 独热编码后的特征名
+# 数据集里写作“托尔森岛”，预测页面的下拉框写作“托尔斯岛”，两者都映射到同一个特征
+ISLAND_FEATURES = {
+    '比斯科群岛': 'island_biscoe',
+    '德里姆岛': 'island_dream',
+    '托尔森岛': 'island_torgerson',
+    '托尔斯岛': 'island_torgerson',
+}
+SEX_FEATURES = {
+    '雄性': 'sex_male',
+    '雌性': 'sex_female',
+}
+
+# 与qq.py中format_data的顺序完全一致
+FEATURE_NAMES = [
+    'bill_length', 'bill_depth', 'flipper_length', 'body_mass',
+    'island_dream', 'island_torgerson', 'island_biscoe', 'sex_male', 'sex_female'
+]
+
+
+def _one_hot(values, value_to_feature, feature_names, out):
+    """把一列分类取值一次性写成独热编码
+
+    先用pd.Categorical把取值映射为整数编码，再用np.eye查表，
+    整列只扫描一遍；不认识的取值（包括缺失值）编码为全0。
+    """
+    categories = list(value_to_feature)
+    codes = pd.Categorical(values, categories=categories).codes
+    # 每个类别对应输出矩阵中的哪一列，-1表示模型中没有这个特征
+    column_of = np.array([
+        feature_names.index(value_to_feature[c]) if value_to_feature[c] in feature_names else -1
+        for c in categories
+    ])
+    rows = np.flatnonzero(codes >= 0)
+    cols = column_of[codes[rows]]
+    keep = cols >= 0
+    out[rows[keep], cols[keep]] = 1.0
+
+
+def encode_penguins(df, feature_names=FEATURE_NAMES):
+    """把中文列名的企鹅数据编码为模型的特征矩阵
+
+    返回形状为(行数, 特征数)的float64数组，列顺序与feature_names一致，
+    可以直接与模型的feature_names_in_配合使用。
+    """
+    feature_names = list(feature_names)
+    X = np.zeros((len(df), len(feature_names)), dtype=np.float64)
+    for column, feature in NUMERIC_COLUMNS.items():
+        X[:, feature_names.index(feature)] = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+    _one_hot(df[ISLAND_COLUMN], ISLAND_FEATURES, feature_names, X)
+    _one_hot(df[SEX_COLUMN], SEX_FEATURES, feature_names, X)
+    return X
+
+
+def complete_rows(X):
+    """返回没有缺失测量值的行的布尔掩码"""
+    return ~np.isnan(X).any(axis=1)
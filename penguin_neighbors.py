@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+import dataset_cache
+from penguin_features import NUMERIC_COLUMNS
+
+
+# 按四项测量值查找最相似的已观测企鹅
+#
+# 测量值的量纲相差很大（喙的深度十几毫米，身体质量几千克），
+# 先按参考数据的均值和标准差标准化，再建KD树；查询复杂度约为O(log n)，
+# 参考数据增长到数百万条时单次查询仍在亚毫秒级（见bench_penguin_neighbors.py）。
+
+MEASUREMENT_COLUMNS = list(NUMERIC_COLUMNS)
+
+
+class PenguinNeighborIndex:
+    """标准化测量值上的KD树索引，查询返回参考数据中最相似的k只企鹅"""
+
+    def __init__(self, reference, leaf_size=40):
+        # 测量值不完整的观测无法计算距离，不放进索引
+        reference = reference.dropna(subset=MEASUREMENT_COLUMNS).reset_index(drop=True)
+        values = reference[MEASUREMENT_COLUMNS].to_numpy(dtype=np.float64)
+        self.mean = values.mean(axis=0)
+        self.std = values.std(axis=0)
+        self.std[self.std == 0] = 1.0
+        self.reference = reference
+        # 按列保存为NumPy数组，查询结果只需按下标取k个元素，不必切片整个DataFrame
+        self.columns = {column: reference[column].to_numpy() for column in reference.columns}
+        self.tree = KDTree((values - self.mean) / self.std, leaf_size=leaf_size)
+
+    def __len__(self):
+        return len(self.reference)
+
+    def query(self, measurements, k=5):
+        """measurements为[喙的长度, 喙的深度, 翅膀的长度, 身体质量]，返回最相似的k行及其距离"""
+        point = (np.asarray(measurements, dtype=np.float64).reshape(1, -1) - self.mean) / self.std
+        distances, indices = self.tree.query(point, k=min(k, len(self)))
+        result = {'相似距离': distances[0].round(3)}
+        for column, values in self.columns.items():
+            result[column] = values[indices[0]]
+        return pd.DataFrame(result)
+
+
+def build_index(csv_path='（企鹅识别数据）penguins-chinese.csv', encoding='gbk'):
+    """从GBK编码的企鹅数据构建相似企鹅索引（通过列式缓存读取）"""
+    return PenguinNeighborIndex(dataset_cache.load_dataset(csv_path, encoding=encoding))
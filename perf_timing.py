@@ -0,0 +1,224 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+
+# 每次重新运行（rerun）的分阶段计时
+#
+# 用法：
+#     perf_timing.start_rerun('qq')             # 脚本开头（st.set_page_config之后）
+#     with perf_timing.phase('加载模型'):         # 计时一段代码
+#         ...
+#     @perf_timing.timed('读取Excel')            # 计时一个函数
+#     def get_dataframe_from_excel(): ...
+#     perf_timing.finish_rerun()                # 脚本结尾：写入JSONL并显示侧边栏面板
+#
+# 计时结果同时累计到三个地方：
+# - 当前会话：最近一次rerun的各阶段明细和本会话的直方图，保存在st.session_state中
+# - 当前进程：所有会话共享的直方图
+# - 滚动的JSONL文件：每次rerun一行，便于离线比较不同版本
+
+
+# 直方图的桶边界（毫秒），最后一个桶是“大于5000毫秒”
+BUCKET_EDGES_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+LOG_PATH = os.environ.get('PERF_TIMING_LOG', os.path.join('perf_logs', 'rerun_timings.jsonl'))
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+_SESSION_KEY = '_perf_timing'
+
+
+class Histogram:
+    """固定桶边界的计时直方图，同时记录次数、总和和最大值"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_EDGES_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.buckets[bisect.bisect_left(BUCKET_EDGES_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q):
+        """按桶估算分位数，返回所在桶的上边界"""
+        if self.count == 0:
+            return 0.0
+        target = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return BUCKET_EDGES_MS[i] if i < len(BUCKET_EDGES_MS) else self.max_ms
+        return self.max_ms
+
+    def summary(self):
+        return {
+            '次数': self.count,
+            '平均(毫秒)': round(self.total_ms / self.count, 2) if self.count else 0.0,
+            'p50≤(毫秒)': self.percentile(50),
+            'p99≤(毫秒)': self.percentile(99),
+            '最大(毫秒)': round(self.max_ms, 2),
+        }
+
+
+_process_histograms = {}
+_process_lock = threading.Lock()
+_fallback_state = {}
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def _session_state():
+    """返回当前会话的计时状态；不在Streamlit中运行时（脚本、基准测试）使用进程内的一份"""
+    if get_script_run_ctx() is None:
+        state = _fallback_state
+    else:
+        state = st.session_state.setdefault(_SESSION_KEY, {})
+    state.setdefault('histograms', {})
+    state.setdefault('current', None)
+    state.setdefault('last', None)
+    return state
+
+
+def _get_logger():
+    """返回写JSONL的logger；Streamlit重新加载本模块后logger仍是同一个，已经有写LOG_PATH的handler时不再添加"""
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            logger = logging.getLogger('perf_timing')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            path = os.path.abspath(LOG_PATH)
+            if not any(isinstance(handler, RotatingFileHandler) and handler.baseFilename == path
+                       for handler in logger.handlers):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES,
+                                              backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger.addHandler(handler)
+            _logger = logger
+    return _logger
+
+
+def _record(name, ms, depth):
+    state = _session_state()
+    if state['current'] is not None:
+        state['current']['phases'].append({'name': name, 'ms': round(ms, 3), 'depth': depth})
+    state['histograms'].setdefault(name, Histogram()).add(ms)
+    with _process_lock:
+        _process_histograms.setdefault(name, Histogram()).add(ms)
+
+
+def start_rerun(app):
+    """标记一次rerun的开始，app是应用名称（写入JSONL，用于区分不同应用）"""
+    state = _session_state()
+    ctx = get_script_run_ctx()
+    state['current'] = {
+        'app': app,
+        'session_id': ctx.session_id if ctx is not None else None,
+        'started_at': time.time(),
+        'start': time.perf_counter(),
+        'phases': [],
+        'depth': 0,
+    }
+
+
+@contextmanager
+def phase(name):
+    """计时一段代码；可以嵌套，嵌套的阶段在明细中带有层级"""
+    state = _session_state()
+    current = state['current']
+    depth = current['depth'] if current is not None else 0
+    if current is not None:
+        current['depth'] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        if current is not None:
+            current['depth'] -= 1
+        _record(name, ms, depth)
+
+
+def timed(name=None):
+    """把整个函数作为一个阶段计时，name默认为函数名"""
+    def decorator(func):
+        phase_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(phase_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def finish_rerun(show_panel=True):
+    """结束当前rerun：累计总耗时、追加到JSONL文件，并按需在侧边栏显示计时面板"""
+    state = _session_state()
+    current = state['current']
+    if current is None:
+        return
+    total_ms = (time.perf_counter() - current['start']) * 1000
+    # 先结束当前rerun，总耗时只进入直方图，不作为一个阶段出现在明细中
+    state['current'] = None
+    _record('rerun总耗时', total_ms, 0)
+    record = {
+        'ts': current['started_at'],
+        'app': current['app'],
+        'session_id': current['session_id'],
+        'total_ms': round(total_ms, 3),
+        'phases': current['phases'],
+    }
+    state['last'] = record
+    try:
+        _get_logger().info(json.dumps(record, ensure_ascii=False))
+    except OSError:
+        # 日志目录不可写时不影响页面
+        pass
+    if show_panel:
+        render_sidebar_panel()
+
+
+def process_histograms():
+    """返回当前进程中所有阶段的直方图摘要"""
+    with _process_lock:
+        return {name: hist.summary() for name, hist in _process_histograms.items()}
+
+
+def render_sidebar_panel():
+    """在侧边栏显示最近一次rerun的分阶段耗时（需要用户勾选才显示）"""
+    with st.sidebar:
+        if not st.checkbox('显示性能计时', key='_perf_timing_panel'):
+            return
+        state = _session_state()
+        last = state['last']
+        if last is None:
+            return
+        st.caption(f"最近一次rerun总耗时 {last['total_ms']:.1f} 毫秒")
+        if last['phases']:
+            phases = pd.DataFrame(last['phases'])
+            phases['阶段'] = ['　' * d + n for n, d in zip(phases['name'], phases['depth'])]
+            st.dataframe(phases[['阶段', 'ms']].rename(columns={'ms': '耗时(毫秒)'}),
+                         hide_index=True, use_container_width=True)
+        with st.expander('本会话直方图'):
+            st.dataframe(pd.DataFrame({n: h.summary() for n, h in state['histograms'].items()}).T,
+                         use_container_width=True)
+        with st.expander('本进程直方图'):
+            st.dataframe(pd.DataFrame(process_histograms()).T, use_container_width=True)
@@ -0,0 +1,296 @@
+import argparse
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import insurance_model
+import model_registry
+from insurance_features import FEATURE_NAMES, REGION_FEATURES, SEX_FEATURES, SMOKE_FEATURES
+
+
+# 医疗费用的预计算报价表
+#
+# ten.py的输入里只有BMI是连续值，年龄、子女数量是整数，性别、是否吸烟、区域是分类值。
+# 随机森林对BMI是阶梯函数，只在分裂阈值处变化，所以这里把模型在
+# “全部离散组合 × 相邻两个BMI阈值之间的每个区间”上一次性批量预测，
+# 结果保存为形状为(年龄, 子女数量, 性别, 是否吸烟, 区域, BMI区间)的数组，另外保存排好序的BMI分裂阈值。
+# 报价时用np.searchsorted在阈值中二分查找BMI所在的区间，直接取出该区间的费用，不做插值。
+#
+# - 与sklearn一样先把BMI转换为float32再与阈值比较（x <= 阈值走左侧），任意位数小数的BMI报价都与模型预测完全一致；
+#   python premium_grid.py 会用随机输入检查查表报价与真实模型的差异
+# - 坐标轴的范围来自模型本身的分裂阈值：超出范围的取值在每棵树中都和边界值走同一条路径，
+#   所以年龄、子女数量先裁剪到范围内再查表，结果不变；BMI超出范围时落在首尾两个区间
+# - 报价表按模型文件的sha256缓存在rfr_model.premium_grid.npz中；通过模型注册表获取，
+#   模型文件更新后自动重新生成
+# - 生成报价表需要几秒，在后台线程中进行；还没生成好时quote()返回None，由调用方直接用模型预测
+
+GRID_PATH = os.path.splitext(insurance_model.MODEL_PATH)[0] + '.premium_grid.npz'
+
+SEX_VALUES = list(SEX_FEATURES)
+SMOKE_VALUES = list(SMOKE_FEATURES)
+REGION_VALUES = list(REGION_FEATURES)
+
+_AGE, _BMI, _CHILDREN = (FEATURE_NAMES.index(name) for name in ('age', 'bmi', 'children'))
+
+_build_thread = None
+_build_lock = threading.Lock()
+
+
+class PremiumGrid:
+    """预计算的报价表
+
+    values[年龄, 子女数量, 性别, 是否吸烟, 区域, BMI区间]为预测的医疗费用，
+    BMI区间k是bmi_thresholds[k-1] < BMI <= bmi_thresholds[k]。
+    """
+
+    def __init__(self, values, bmi_thresholds, age_start, children_start, model_sha256):
+        self.values = values
+        self.bmi_thresholds = bmi_thresholds
+        self.age_start = age_start
+        self.children_start = children_start
+        self.model_sha256 = model_sha256
+
+    @property
+    def age_stop(self):
+        return self.age_start + self.values.shape[0] - 1
+
+    @property
+    def children_stop(self):
+        return self.children_start + self.values.shape[1] - 1
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.bmi_thresholds.nbytes
+
+    def _bmi_interval(self, bmi):
+        """BMI所在的区间，即小于它的阈值个数；与sklearn一样先转换为float32再比较"""
+        return np.searchsorted(self.bmi_thresholds, np.asarray(bmi, dtype=np.float32), side='left')
+
+    def quote(self, age, sex, bmi, children, smoke, region):
+        """按ten.py表单的原始输入报价；年龄、子女数量不是整数或分类取值不认识时返回None"""
+        if age != int(age) or children != int(children):
+            return None
+        try:
+            sex_i, smoke_i, region_i = SEX_VALUES.index(sex), SMOKE_VALUES.index(smoke), REGION_VALUES.index(region)
+        except ValueError:
+            return None
+        age_i = min(max(int(age), self.age_start), self.age_stop) - self.age_start
+        children_i = min(max(int(children), self.children_start), self.children_stop) - self.children_start
+        row = self.values[age_i, children_i, sex_i, smoke_i, region_i]
+
+        return float(row[self._bmi_interval(float(bmi))])
+
+    def quote_batch(self, X):
+        """对编码后的特征矩阵（列顺序同FEATURE_NAMES）批量报价，无法查表的行为NaN"""
+        X = np.asarray(X, dtype=np.float64)
+        result = np.full(len(X), np.nan)
+        ages, bmis, children = X[:, _AGE], X[:, _BMI], X[:, _CHILDREN]
+        sex_i, sex_ok = _category_index(X, SEX_FEATURES)
+        smoke_i, smoke_ok = _category_index(X, SMOKE_FEATURES)
+        region_i, region_ok = _category_index(X, REGION_FEATURES)
+        ok = sex_ok & smoke_ok & region_ok & (ages == np.round(ages)) & (children == np.round(children)) \
+            & ~np.isnan(bmis)
+        if not ok.any():
+            return result
+
+        age_i = np.clip(ages[ok], self.age_start, self.age_stop).astype(np.intp) - self.age_start
+        children_i = np.clip(children[ok], self.children_start, self.children_stop).astype(np.intp) \
+            - self.children_start
+        result[ok] = self.values[age_i, children_i, sex_i[ok], smoke_i[ok], region_i[ok], self._bmi_interval(bmis[ok])]
+        return result
+
+
+def _category_index(X, value_to_feature):
+    """返回每行独热编码的取值下标，以及该组独热列是否恰好有一个1"""
+    block = X[:, [FEATURE_NAMES.index(feature) for feature in value_to_feature.values()]]
+    return np.argmax(block, axis=1), block.sum(axis=1) == 1
+
+
+def _thresholds(model, feature_index):
+    """返回模型中某个特征的全部分裂阈值（去重并排序）"""
+    return np.unique(np.concatenate([
+        tree.tree_.threshold[tree.tree_.feature == feature_index] for tree in model.estimators_
+    ]))
+
+
+def _integer_axis(model, feature_index):
+    """覆盖全部分裂阈值的整数范围，范围外的取值与最近的边界预测结果相同"""
+    thresholds = _thresholds(model, feature_index)
+    return int(np.floor(thresholds[0])), int(np.ceil(thresholds[-1]))
+
+
+def build_grid(model, model_sha256):
+    """用一次批量预测生成报价表，model是sklearn的RandomForestRegressor"""
+    age_start, age_stop = _integer_axis(model, _AGE)
+    children_start, children_stop = _integer_axis(model, _CHILDREN)
+    ages = np.arange(age_start, age_stop + 1)
+    children = np.arange(children_start, children_stop + 1)
+
+    # 相邻两个BMI阈值之间模型输出不变，每个区间取中点代表；首尾两个区间向外延伸1
+    bmi_thresholds = _thresholds(model, _BMI)
+    bmi_points = np.concatenate([
+        [bmi_thresholds[0] - 1], (bmi_thresholds[:-1] + bmi_thresholds[1:]) / 2, [bmi_thresholds[-1] + 1]
+    ])
+    shape = (len(ages), len(children), len(SEX_VALUES), len(SMOKE_VALUES), len(REGION_VALUES), len(bmi_points))
+    age_i, children_i, sex_i, smoke_i, region_i, bmi_i = (index.ravel() for index in np.indices(shape))
+    X = np.zeros((age_i.size, len(FEATURE_NAMES)), dtype=np.float32)
+    X[:, _AGE] = ages[age_i]
+    X[:, _BMI] = bmi_points[bmi_i]
+    X[:, _CHILDREN] = children[children_i]
+    rows = np.arange(len(X))
+    for features, index in ((SEX_FEATURES, sex_i), (SMOKE_FEATURES, smoke_i), (REGION_FEATURES, region_i)):
+        columns = np.array([FEATURE_NAMES.index(feature) for feature in features.values()])
+        X[rows, columns[index]] = 1.0
+    del age_i, children_i, sex_i, smoke_i, region_i, bmi_i, rows
+
+    values = model.predict(pd.DataFrame(X, columns=FEATURE_NAMES, copy=False))
+    return PremiumGrid(values.reshape(shape), bmi_thresholds, age_start, children_start, model_sha256)
+
+
+def save_grid(grid, path=GRID_PATH):
+    """写入同级的临时文件再整体替换，正在读取旧文件的进程不受影响"""
+    path = os.path.abspath(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.npz', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, values=grid.values, bmi_thresholds=grid.bmi_thresholds, age_start=grid.age_start,
+                     children_start=grid.children_start, model_sha256=grid.model_sha256)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def load_grid(path=GRID_PATH):
+    """读取缓存的报价表，文件不存在、已损坏或是旧格式时返回None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            return PremiumGrid(data['values'], data['bmi_thresholds'], int(data['age_start']),
+                               int(data['children_start']), str(data['model_sha256']))
+    except (KeyError, ValueError, OSError):
+        return None
+
+
+def _premium_grid_loader(path):
+    """模型注册表的loader：缓存文件与模型文件的sha256一致时直接读取，否则重新生成"""
+    model_sha256 = model_registry.artifact_sha256(path)
+    grid = load_grid()
+    if grid is not None and grid.model_sha256 == model_sha256:
+        return grid
+    with open(path, 'rb') as f:
+        model = pickle.load(f)
+    grid = build_grid(model, model_sha256)
+    try:
+        save_grid(grid)
+    except OSError:
+        # 目录不可写时只在进程内使用
+        pass
+    return grid
+
+
+def get_premium_grid():
+    """返回当前模型对应的报价表，进程内只加载一次，模型文件变化时自动重新生成（会等待生成完成）"""
+    return model_registry.get_model(insurance_model.MODEL_PATH, loader=_premium_grid_loader)
+
+
+def ready_premium_grid():
+    """报价表已经按当前的模型文件生成好时返回它，否则返回None，不等待"""
+    entry = model_registry.get_entry(insurance_model.MODEL_PATH, loader=_premium_grid_loader)
+    if entry is None:
+        return None
+    try:
+        stat = os.stat(entry.path)
+    except FileNotFoundError:
+        return None
+    if entry.mtime_ns != stat.st_mtime_ns or entry.file_size != stat.st_size:
+        return None
+    return entry.obj
+
+
+def _build():
+    try:
+        get_premium_grid()
+    except FileNotFoundError:
+        # 模型文件缺失时由提交表单时的模型加载报错
+        pass
+
+
+def warm_up():
+    """报价表不可用时在后台线程中生成（同一时间只有一个生成线程），不阻塞当前页面"""
+    global _build_thread
+    if ready_premium_grid() is not None:
+        return
+    with _build_lock:
+        if _build_thread is not None and _build_thread.is_alive():
+            return
+        _build_thread = threading.Thread(target=_build, name='premium-grid-build', daemon=True)
+        _build_thread.start()
+
+
+def quote(age, sex, bmi, children, smoke, region):
+    """查表报价；报价表还没有生成好或输入无法查表时返回None，由调用方使用模型预测"""
+    grid = ready_premium_grid()
+    if grid is None:
+        warm_up()
+        return None
+    return grid.quote(age, sex, bmi, children, smoke, region)
+
+
+def lookup_error(grid, model, n_samples=100_000, bmi_decimals=None, seed=0):
+    """在报价表范围内随机抽取输入（BMI在首尾阈值外各延伸1），比较查表报价与模型预测
+
+    bmi_decimals为None时BMI取连续值，为2时与表单输入的精度相同。
+    """
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_samples, len(FEATURE_NAMES)), dtype=np.float64)
+    X[:, _AGE] = rng.integers(grid.age_start, grid.age_stop + 1, n_samples)
+    X[:, _BMI] = rng.uniform(grid.bmi_thresholds[0] - 1, grid.bmi_thresholds[-1] + 1, n_samples)
+    X[:, _CHILDREN] = rng.integers(grid.children_start, grid.children_stop + 1, n_samples)
+    for features in (SEX_FEATURES, SMOKE_FEATURES, REGION_FEATURES):
+        columns = np.array([FEATURE_NAMES.index(feature) for feature in features.values()])
+        X[np.arange(n_samples), columns[rng.integers(0, len(columns), n_samples)]] = 1.0
+    if bmi_decimals is not None:
+        X[:, _BMI] = X[:, _BMI].round(bmi_decimals)
+
+    expected = model.predict(pd.DataFrame(X, columns=FEATURE_NAMES, copy=False))
+    error = np.abs(grid.quote_batch(X) - expected)
+    worst = int(np.argmax(error))
+    return {
+        '样本数': n_samples,
+        '最大绝对误差': round(float(error[worst]), 2),
+        '最大误差处的模型预测': round(float(expected[worst]), 2),
+        '最大相对误差(%)': round(float(np.max(error / expected)) * 100, 3),
+        'p99绝对误差': round(float(np.percentile(error, 99)), 2),
+        '平均绝对误差': round(float(error.mean()), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成医疗费用报价表，并检查查表误差")
+    parser.add_argument('--samples', type=int, default=100_000, help="误差检查的随机样本数")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    grid = get_premium_grid()
+    print(f"报价表：形状 {grid.values.shape}，{grid.nbytes / 1024 / 1024:.1f} MB，"
+          f"耗时 {time.perf_counter() - start:.1f} 秒（{GRID_PATH}）")
+    print(f"年龄 {grid.age_start}~{grid.age_stop}，子女数量 {grid.children_start}~{grid.children_stop}，"
+          f"BMI {len(grid.bmi_thresholds)} 个分裂阈值（{grid.bmi_thresholds[0]:g}~{grid.bmi_thresholds[-1]:g}）")
+
+    model = model_registry.get_model(insurance_model.MODEL_PATH)
+    for title, bmi_decimals in (('BMI保留两位小数（与表单输入相同）', 2), ('BMI取连续值', None)):
+        print(f"查表误差，{title}：")
+        for name, value in lookup_error(grid, model, args.samples, bmi_decimals).items():
+            print(f"  {name}：{value}")
+
+
+if __name__ == '__main__':
+    main()
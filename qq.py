@@ -1,7 +1,15 @@
+import os
+
 import streamlit as st
-import pickle
 import pandas as pd
 
+import batch_output
+import forest_engine
+import model_registry
+import penguin_batch
+import penguin_neighbors
+import perf_timing
+
 # 设置页面的主题、图标和布局
 st.set_page_config(
     page_title="企鹅分类器",  # 页面标题
@@ -9,12 +17,21 @@ st.set_page_config(
     layout="wide"
 )
 
+# 开始记录本次rerun的分阶段耗时
+perf_timing.start_rerun('qq')
+
+# 相似企鹅索引在每个服务器进程中只构建一次，所有会话共享
+@st.cache_resource
+def get_neighbor_index():
+    return penguin_neighbors.build_index()
+
+
 # 使用侧边栏实现多页面显示效果
 with st.sidebar:
     # 这里如果有logo图，可替换为你的logo（没有的话继续用文字也可以）
     st.title("企鹅分类器")
     st.subheader("请选择页面")
-    page = st.selectbox("请选择页面", ["简介页面", "预测分类页面"], label_visibility="collapsed")
+    page = st.selectbox("请选择页面", ["简介页面", "预测分类页面", "批量分类页面", "模型管理页面"], label_visibility="collapsed")
 
 if page == "简介页面":
     st.title("企鹅分类器: :penguin:")
@@ -74,16 +91,18 @@ elif page == "预测分类页面":
                    island_dream, island_torgerson, island_biscoe, sex_male,
                    sex_female]
 
-    # 加载模型和映射文件（确保这两个文件存在）
+    # 从进程级注册表获取模型和映射文件（确保这两个文件存在）
+    # 同一进程内只反序列化一次，文件更新后自动重新加载
+    # 单行预测使用扁平数组推理引擎，结果与sklearn的predict完全一致，但省去了逐棵树调度的开销
+    # 存在rfc_model.forest目录时以内存映射方式加载，多个进程共享同一份模型内存
     try:
-        with open('rfc_model.pkl', 'rb') as f:
-            rfc_model = pickle.load(f)
-        with open('output_uniques.pkl', 'rb') as f:
-            output_uniques_map = pickle.load(f)
+        with perf_timing.phase('加载模型'):
+            rfc_model = forest_engine.load_flat_forest(forest_engine.preferred_artifact('rfc_model.pkl'))
+            output_uniques_map = model_registry.get_model('output_uniques.pkl')
 
         if submitted:
-            format_data_df = pd.DataFrame(data=[format_data], columns=rfc_model.feature_names_in_)
-            predict_result_code = rfc_model.predict(format_data_df)
+            with perf_timing.phase('单行预测'):
+                predict_result_code = rfc_model.predict([format_data])
             predict_result_species = output_uniques_map[predict_result_code[0]]
             st.write(f"根据您输入的数据，预测该企鹅的物种名称是：**{predict_result_species}**")
 
@@ -93,3 +112,78 @@ elif page == "预测分类页面":
 
     except FileNotFoundError:
         st.error("缺少模型文件（rfc_model.pkl/output_uniques.pkl），请先准备训练好的模型文件！")
+
+    # 展示与输入测量值最相似的已观测企鹅
+    if submitted:
+        st.subheader("最相似的已观测企鹅")
+        with perf_timing.phase('相似企鹅查询'):
+            neighbors = get_neighbor_index().query([bill_length, bill_depth, flipper_length, body_mass], k=5)
+        st.dataframe(neighbors, hide_index=True, use_container_width=True)
+
+elif page == "批量分类页面":
+    st.header("批量分类页面")
+    st.markdown("上传与（企鹅识别数据）penguins-chinese.csv格式相同的野外调查文件，一次性预测所有企鹅的物种，并下载带有预测结果的文件。")
+
+    uploaded_file = st.file_uploader("上传企鹅观测数据（CSV）", type=["csv"])
+    col_encoding, col_format = st.columns(2)
+    with col_encoding:
+        encoding = st.selectbox("文件编码", options=["gbk", "utf-8"])
+    with col_format:
+        output_format = st.selectbox("结果文件格式", options=["csv", "parquet"])
+
+    if uploaded_file is not None and st.button("开始批量分类"):
+        try:
+            with perf_timing.phase('加载模型'):
+                rfc_model = model_registry.get_model('rfc_model.pkl')
+                output_uniques_map = model_registry.get_model('output_uniques.pkl')
+        except FileNotFoundError:
+            st.error("缺少模型文件（rfc_model.pkl/output_uniques.pkl），请先准备训练好的模型文件！")
+        else:
+            # 删除上一次批量分类留下的结果文件
+            previous = st.session_state.pop("batch_result", None)
+            if previous is not None and os.path.exists(previous["path"]):
+                os.remove(previous["path"])
+
+            progress_bar = st.progress(0.0, text="正在分类...")
+            with perf_timing.phase('批量分类'):
+                result_path, total_rows = penguin_batch.classify_file(
+                    uploaded_file, rfc_model, output_uniques_map,
+                    output_format=output_format,
+                    encoding=encoding,
+                    on_progress=lambda ratio, rows: progress_bar.progress(ratio, text=f"已分类 {rows:,} 行"),
+                )
+            progress_bar.progress(1.0, text=f"分类完成，共 {total_rows:,} 行")
+            st.session_state["batch_result"] = {
+                "path": result_path,
+                "rows": total_rows,
+                "format": output_format,
+            }
+
+    batch_result = st.session_state.get("batch_result")
+    if batch_result is not None and os.path.exists(batch_result["path"]):
+        st.success(f"已完成 {batch_result['rows']:,} 行企鹅数据的分类")
+        result_path = batch_result["path"]
+        # 传入函数而不是文件内容，点击下载时才从磁盘读取结果文件
+        st.download_button(
+            "下载分类结果",
+            data=lambda: batch_output.read_result(result_path),
+            file_name=f"企鹅分类结果.{batch_result['format']}",
+            mime="text/csv" if batch_result["format"] == "csv" else "application/octet-stream",
+        )
+
+elif page == "模型管理页面":
+    st.header("模型管理页面")
+    st.markdown("当前服务器进程中已加载的模型文件。模型在进程内只加载一次并由所有会话共享，文件内容变化后会自动重新加载。")
+
+    stats = model_registry.registry_stats()
+    if stats:
+        st.dataframe(pd.DataFrame(stats), hide_index=True, use_container_width=True)
+    else:
+        st.info("当前进程还没有加载任何模型，打开预测分类页面后会自动加载。")
+
+    if st.button("强制重新加载全部模型"):
+        model_registry.invalidate()
+        st.success("已清空注册表，下次预测时将重新加载模型。")
+
+# 结束本次rerun的计时，写入JSONL，并在侧边栏显示计时面板（需勾选）
+perf_timing.finish_rerun()
@@ -0,0 +1,262 @@
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from sales_index import DATE_COLUMN, FILTER_DIMENSIONS
+
+
+# final.py销售仪表板使用的预聚合立方体
+#
+# 按(城市, 顾客类型, 性别, 产品类型, [支付方式], 小时)的每个组合保存交易笔数、总价之和、评分之和，
+# 数据加载后用一次bincount构建。任意筛选条件下的总销售额、平均评分、每单平均销售额、
+# 按小时和按产品类型的销售额都由对应的格子求和得到，计算量只与立方体的格子数有关，与交易笔数无关。
+# 日期不是稠密的轴（天数×其他维度的格子数会比交易笔数还多），而是按(日期, 格子)汇总的稀疏记录，按日期排列：
+# 日期范围筛选是在记录中二分查找出一段，再用一次bincount累加到格子上；日期范围包含全部数据时直接使用整个立方体。
+# 每次rerun只用select()筛选一次，得到的子立方体再求总计和按维度汇总。
+# 新到的一批交易用fold_batch()累加到立方体中（实时模式，见sales_live.py），计算量只与批次大小和格子数有关。
+
+HOUR_COLUMN = '小时'
+SALES_COLUMN = '总价'
+RATING_COLUMN = '评分'
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DayCells:
+    """按(日期, 格子)汇总的稀疏记录，按日期排列；cells是格子在不含日期的立方体中的扁平位置"""
+    days: np.ndarray
+    cells: np.ndarray
+    count: np.ndarray
+    sales: np.ndarray
+    rating: np.ndarray
+
+    @property
+    def nbytes(self):
+        return self.days.nbytes + self.cells.nbytes + self.count.nbytes + self.sales.nbytes + self.rating.nbytes
+
+
+class SalesCube:
+    """count/sales/rating是形状相同的数组，每个维度一个轴，axes[维度]是该轴的取值
+
+    day_cells是按日期的稀疏记录；select()得到的子立方体已经按日期筛选过，day_cells为None。
+    """
+
+    def __init__(self, dimensions, axes, count, sales, rating, day_cells=None):
+        self.dimensions = dimensions
+        self.axes = axes
+        self.count = count
+        self.sales = sales
+        self.rating = rating
+        self.day_cells = day_cells
+
+    @property
+    def nbytes(self):
+        nbytes = self.count.nbytes + self.sales.nbytes + self.rating.nbytes
+        return nbytes + (self.day_cells.nbytes if self.day_cells is not None else 0)
+
+    def _selector(self, dimension, selected):
+        values = self.axes[dimension]
+        positions = sorted({values.index(value) for value in selected if value in values})
+        return None if len(positions) == len(values) else positions
+
+    def _date_arrays(self, date_range):
+        """日期范围内的(count, sales, rating)；范围包含全部数据时返回整个立方体"""
+        arrays = [self.count, self.sales, self.rating]
+        day_cells = self.day_cells
+        if date_range is None or day_cells is None:
+            return arrays
+        start = np.searchsorted(day_cells.days, np.datetime64(date_range[0], 'D'), side='left')
+        end = np.searchsorted(day_cells.days, np.datetime64(date_range[1], 'D'), side='right')
+        if start == 0 and end == len(day_cells.days):
+            return arrays
+        cells = day_cells.cells[start:end]
+        size = self.count.size
+        return [
+            np.bincount(cells, weights=day_cells.count[start:end], minlength=size).astype(self.count.dtype).reshape(self.count.shape),
+            np.bincount(cells, weights=day_cells.sales[start:end], minlength=size).reshape(self.count.shape),
+            np.bincount(cells, weights=day_cells.rating[start:end], minlength=size).reshape(self.count.shape),
+        ]
+
+    def select(self, selections, date_range=None):
+        """按筛选条件取出选中的格子，返回子立方体；每次rerun只筛选一次，总计和各维度的汇总都从子立方体计算"""
+        arrays = self._date_arrays(date_range)
+        axes = dict(self.axes)
+        for dimension, selected in selections.items():
+            if dimension not in self.axes:
+                continue
+            positions = self._selector(dimension, selected)
+            if positions is not None:
+                axis = self.dimensions.index(dimension)
+                arrays = [np.take(array, positions, axis=axis) for array in arrays]
+                axes[dimension] = [self.axes[dimension][p] for p in positions]
+        count, sales, rating = arrays
+        return SalesCube(self.dimensions, axes, count, sales, rating)
+
+    def totals(self):
+        """交易笔数、总销售额、评分之和"""
+        return int(self.count.sum()), float(self.sales.sum()), float(self.rating.sum())
+
+    def by(self, dimension):
+        """按某个维度汇总，只保留有交易的取值，列为笔数、总价、评分"""
+        axis = self.dimensions.index(dimension)
+        other_axes = tuple(i for i in range(self.count.ndim) if i != axis)
+        result = pd.DataFrame({
+            '笔数': self.count.sum(axis=other_axes),
+            SALES_COLUMN: self.sales.sum(axis=other_axes),
+            RATING_COLUMN: self.rating.sum(axis=other_axes),
+        }, index=pd.Index(self.axes[dimension], name=dimension))
+        return result[result['笔数'] > 0]
+
+
+def _axis_codes(series):
+    """返回(该轴的取值, 每行的编码)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return list(series.cat.categories), series.cat.codes.to_numpy().astype(np.intp)
+    values, codes = np.unique(series.to_numpy(), return_inverse=True)
+    return list(values), codes.astype(np.intp)
+
+
+def _complete_rows(df, columns):
+    """去掉维度或日期缺失的行（category列中不在取值范围内的值也是缺失），记录去掉的笔数
+
+    这些行在侧边栏的任何筛选条件下都不会被选中，不能计入某个取值的格子。
+    """
+    complete = df[columns].notna().all(axis=1).to_numpy()
+    if not complete.all():
+        logger.warning("忽略 %d 笔%s中有缺失值的交易", int((~complete).sum()), '、'.join(columns))
+        df = df[complete]
+    return df
+
+
+def _aggregate_day_cells(days, cells, count, sales, rating):
+    """把(日期, 格子)相同的记录合并，按日期和格子排列"""
+    if not len(days):
+        return DayCells(days, cells, count, sales, rating)
+    order = np.lexsort((cells, days))
+    days, cells = days[order], cells[order]
+    starts = np.flatnonzero(np.r_[True, (days[1:] != days[:-1]) | (cells[1:] != cells[:-1])])
+    return DayCells(days[starts], cells[starts], np.add.reduceat(count[order], starts),
+                    np.add.reduceat(sales[order], starts), np.add.reduceat(rating[order], starts))
+
+
+def _merge_day_cells(old, new):
+    """把new（已合并并排列好的记录）并入old：相同(日期, 格子)的记录累加到原有记录上，其余插入到排列中的位置
+
+    只在new涉及的日期内二分查找，除了复制数组外，计算量与new的记录数成正比。
+    """
+    positions = np.empty(len(new.days), dtype=np.intp)
+    for day in np.unique(new.days):
+        start, end = np.searchsorted(old.days, day, side='left'), np.searchsorted(old.days, day, side='right')
+        new_start, new_end = np.searchsorted(new.days, day, side='left'), np.searchsorted(new.days, day, side='right')
+        positions[new_start:new_end] = start + np.searchsorted(old.cells[start:end], new.cells[new_start:new_end])
+    matched = positions < len(old.days)
+    matched[matched] = ((old.days[positions[matched]] == new.days[matched])
+                        & (old.cells[positions[matched]] == new.cells[matched]))
+    inserted = ~matched
+    merged = []
+    for old_values, new_values in [(old.count, new.count), (old.sales, new.sales), (old.rating, new.rating)]:
+        values = old_values.copy()
+        values[positions[matched]] += new_values[matched]
+        merged.append(np.insert(values, positions[inserted], new_values[inserted]))
+    return DayCells(np.insert(old.days, positions[inserted], new.days[inserted]),
+                    np.insert(old.cells, positions[inserted], new.cells[inserted]), *merged)
+
+
+def _batch_arrays(df, cells, size, shape):
+    """一批交易在各格子上的(count, sales, rating)和按日期的稀疏记录"""
+    sales = df[SALES_COLUMN].to_numpy(dtype=np.float64)
+    rating = df[RATING_COLUMN].to_numpy(dtype=np.float64)
+    arrays = [
+        np.bincount(cells, minlength=size).reshape(shape),
+        np.bincount(cells, weights=sales, minlength=size).reshape(shape),
+        np.bincount(cells, weights=rating, minlength=size).reshape(shape),
+    ]
+    days = df[DATE_COLUMN].to_numpy().astype('datetime64[D]')
+    return arrays, DayCells(days, cells, np.ones(len(cells), dtype=arrays[0].dtype), sales, rating)
+
+
+def build_sales_cube(df, dimensions=FILTER_DIMENSIONS):
+    dimensions = [dimension for dimension in dimensions if dimension in df.columns] + [HOUR_COLUMN]
+    df = _complete_rows(df, dimensions + [DATE_COLUMN])
+    axes = {}
+    codes = []
+    for dimension in dimensions:
+        values, axis_codes = _axis_codes(df[dimension])
+        axes[dimension] = values
+        codes.append(axis_codes.ravel())
+    shape = tuple(len(axes[dimension]) for dimension in dimensions)
+    size = int(np.prod(shape))
+    cells = np.ravel_multi_index(codes, shape) if len(df) else np.zeros(0, dtype=np.intp)
+
+    (count, sales, rating), rows = _batch_arrays(df, cells, size, shape)
+    day_cells = _aggregate_day_cells(rows.days, rows.cells, rows.count, rows.sales, rows.rating)
+    return SalesCube(dimensions, axes, count, sales, rating, day_cells)
+
+
+def _merged_axis(values, series):
+    """返回(合并新取值后的轴, 原有取值在新轴上的位置, 批次每行的编码)
+
+    小时保持从小到大排列；category列的新取值追加在后面，与build_sales_cube的顺序一致。
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        batch_values = list(series.cat.categories)
+        merged = list(values) + [value for value in batch_values if value not in set(values)]
+        positions = pd.Index(merged).get_indexer(batch_values)
+        codes = positions[series.cat.codes.to_numpy()]
+    else:
+        merged = list(np.union1d(np.asarray(values), series.to_numpy()))
+        codes = pd.Index(merged).get_indexer(series.to_numpy())
+    return merged, pd.Index(merged).get_indexer(values), codes.astype(np.intp)
+
+
+def fold_batch(cube, df):
+    """把一批新交易累加到立方体中，返回新的立方体，原立方体不变（其他会话可能正在读取）
+
+    批次中出现新的小时或类别时相应的轴变长，原有的格子和按日期的记录搬到新的位置。
+    维度或日期缺失的行不累加，只记录笔数。
+    """
+    missing = [dimension for dimension in cube.dimensions + [DATE_COLUMN] if dimension not in df.columns]
+    if missing:
+        raise ValueError(f"批次缺少列：{'、'.join(missing)}")
+    df = _complete_rows(df, cube.dimensions + [DATE_COLUMN])
+    axes = {}
+    old_positions = []
+    codes = []
+    for dimension in cube.dimensions:
+        values, positions, batch_codes = _merged_axis(cube.axes[dimension], df[dimension])
+        axes[dimension] = values
+        old_positions.append(positions)
+        codes.append(batch_codes)
+    shape = tuple(len(axes[dimension]) for dimension in cube.dimensions)
+    size = int(np.prod(shape))
+    old = cube.day_cells
+
+    if shape == cube.count.shape:
+        arrays = [cube.count.copy(), cube.sales.copy(), cube.rating.copy()]
+        old_cells = old.cells
+    else:
+        arrays = []
+        for old_array in [cube.count, cube.sales, cube.rating]:
+            array = np.zeros(shape, dtype=old_array.dtype)
+            array[np.ix_(*old_positions)] = old_array
+            arrays.append(array)
+        # 每个轴上原有取值的位置都是递增的，搬到新位置后记录仍按(日期, 格子)排列
+        old_codes = np.unravel_index(old.cells, cube.count.shape)
+        old_cells = np.ravel_multi_index([p[c] for p, c in zip(old_positions, old_codes)], shape)
+    count, sales, rating = arrays
+    old = DayCells(old.days, old_cells, old.count, old.sales, old.rating)
+    if not len(df):
+        return SalesCube(list(cube.dimensions), axes, count, sales, rating, old)
+
+    cells = np.ravel_multi_index(codes, shape)
+    (batch_count, batch_sales, batch_rating), rows = _batch_arrays(df, cells, size, shape)
+    count += batch_count
+    sales += batch_sales
+    rating += batch_rating
+    # 只合并批次本身的记录，再并入原有的记录，不重新排列全部历史记录
+    batch_cells = _aggregate_day_cells(rows.days, rows.cells, rows.count, rows.sales, rows.rating)
+    day_cells = _merge_day_cells(old, batch_cells)
+    return SalesCube(list(cube.dimensions), axes, count, sales, rating, day_cells)
@@ -0,0 +1,156 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+import model_registry
+import sales_cube
+import sales_index
+
+
+# final.py销售仪表板的数据加载
+#
+# - 第一次加载时用openpyxl解析“销售数据”工作表，转换好类型（城市等列为category，
+#   预先计算“小时”列），写成同目录下的Parquet文件（supermarket_sales.sales.parquet）
+# - 数据源也可以是列相同的CSV（UTF-8）或Parquet文件（例如sales_generator.py生成的大数据量文件），
+#   通过环境变量SALES_DATA_PATH指定final.py使用的数据文件
+# - Parquet文件的元数据中记录Excel文件的sha256，Excel内容变化后自动重新解析；
+#   服务器重启后直接读取Parquet，不必再解析Excel
+# - 进程内通过模型注册表缓存：每次rerun只对Excel做一次os.stat()，所有会话共享同一个DataFrame，
+#   修改时间/大小变化且内容也变化时才重新加载
+#
+# 侧边栏筛选使用的位图索引（sales_index.py）和仪表板使用的预聚合立方体（sales_cube.py）
+# 同样通过注册表缓存，与数据一起随Excel文件失效。
+#
+# 返回的DataFrame由所有会话共享，只能读取，需要修改时先复制。
+
+XLSX_PATH = 'supermarket_sales.xlsx'
+DATA_PATH = os.environ.get('SALES_DATA_PATH', XLSX_PATH)
+SHEET_NAME = '销售数据'
+INDEX_COLUMN = '订单号'
+CATEGORICAL_COLUMNS = ['城市', '顾客类型', '性别', '产品类型', '支付方式']
+
+# 列的类型或计算方式变化时加1，使已有的Parquet文件失效
+FORMAT_VERSION = 1
+
+_METADATA_KEY = b'sales_data'
+_ARROW_TYPES = {arrow_type: pd.ArrowDtype(arrow_type) for arrow_type in [pa.string(), pa.large_string(), pa.time64('us')]}
+
+
+def sidecar_path(path):
+    stem, _ = os.path.splitext(path)
+    return f'{stem}.sales.parquet'
+
+
+def _hours(series):
+    """从“时间”列（datetime.time、Arrow的time64或'HH:MM:SS'字符串）取出小时"""
+    times = pa.array(series)
+    if pa.types.is_string(times.type) or pa.types.is_large_string(times.type):
+        times = pc.strptime(times, format='%H:%M:%S', unit='s')
+    return pc.hour(times).to_numpy(zero_copy_only=False).astype(np.int8)
+
+
+def parse_source(path):
+    """解析数据文件并转换列的类型
+
+    .csv、.parquet按列读取；其他扩展名按Excel工作表读取（第1行是标题，第2行是列名）。
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        convert_options = pacsv.ConvertOptions(column_types={
+            INDEX_COLUMN: pa.string(), '日期': pa.timestamp('ns'), '时间': pa.time64('us')})
+        df = pacsv.read_csv(path, convert_options=convert_options).to_pandas(types_mapper=_ARROW_TYPES.get)
+        df = df.set_index(INDEX_COLUMN)
+    elif ext == '.parquet':
+        df = pq.read_table(path).to_pandas(types_mapper=_ARROW_TYPES.get).set_index(INDEX_COLUMN)
+    else:
+        df = pd.read_excel(path, sheet_name=SHEET_NAME, skiprows=1, index_col=INDEX_COLUMN)
+    return prepare_frame(df)
+
+
+def prepare_frame(df):
+    """计算“小时”列，并把城市等列转换为category；数据库等其他来源读到的交易也用它转换"""
+    df["小时"] = _hours(df["时间"])
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def _metadata(source_sha256):
+    return f'{FORMAT_VERSION}:{source_sha256}'.encode('utf-8')
+
+
+def write_sidecar(df, path, source_sha256):
+    """写入同级的临时文件再整体替换，元数据中记录来源Excel的sha256"""
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), _METADATA_KEY: _metadata(source_sha256)})
+    path = os.path.abspath(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.parquet', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp_path)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def read_sidecar(path, source_sha256):
+    """读取Parquet文件，不存在、已损坏或与Excel内容不符时返回None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        if pq.read_schema(path).metadata.get(_METADATA_KEY) != _metadata(source_sha256):
+            return None
+        table = pq.read_table(path)
+    except (pa.ArrowInvalid, OSError, AttributeError):
+        return None
+    # 订单号、分店等文字列和“时间”列保持Arrow类型，不逐行创建Python对象；其他列使用pandas的默认类型
+    return table.to_pandas(types_mapper=_ARROW_TYPES.get)
+
+
+def _sales_loader(path):
+    """模型注册表的loader：Parquet文件与Excel内容一致时直接读取，否则解析Excel并重写Parquet"""
+    source_sha256 = model_registry.artifact_sha256(path)
+    sidecar = sidecar_path(path)
+    df = read_sidecar(sidecar, source_sha256)
+    if df is not None:
+        return df
+    df = parse_source(path)
+    try:
+        write_sidecar(df, sidecar, source_sha256)
+    except OSError:
+        # 目录不可写时只在进程内使用
+        return df
+    # 从刚写入的Parquet文件读取，第一次加载与之后的加载得到的列类型相同
+    return read_sidecar(sidecar, source_sha256)
+
+
+def load_sales(path=DATA_PATH):
+    """返回销售数据，进程内只加载一次，数据文件变化时自动重新加载"""
+    return model_registry.get_model(path, loader=_sales_loader)
+
+
+def _filter_index_loader(path):
+    return sales_index.build_filter_index(load_sales(path))
+
+
+def load_filter_index(path=DATA_PATH):
+    """返回与load_sales()的数据对应的筛选位图索引，每个数据版本只构建一次"""
+    return model_registry.get_model(path, loader=_filter_index_loader)
+
+
+def _sales_cube_loader(path):
+    return sales_cube.build_sales_cube(load_sales(path))
+
+
+def load_sales_cube(path=DATA_PATH):
+    """返回与load_sales()的数据对应的预聚合立方体，每个数据版本只构建一次"""
+    return model_registry.get_model(path, loader=_sales_cube_loader)
@@ -0,0 +1,159 @@
+import argparse
+import datetime
+import os
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+
+# 模拟超市销售数据，列与supermarket_sales.xlsx的“销售数据”工作表相同，用于容量测试
+#
+# 用法：python sales_generator.py --rows 1000000 --output sales_1m.parquet [--seed 42] [--payment]
+#
+# - 各列的分布参照随项目提供的1000笔交易：分店与城市一一对应，产品类型按原数据的比例抽样，
+#   单价10~100元、数量1~10件、总价=单价×数量，日期在2022年1月1日~3月30日之间，
+#   时间在10:00~20:59之间（精确到分钟），评分4.0~10.0
+# - 按CHUNK_ROWS行一块生成并追加写入文件，生成5000万行也只占用一块的内存；
+#   每块使用由(seed, 块号)确定的随机数，相同的参数总是得到相同的文件
+# - 输出格式由扩展名决定：.xlsx（最多EXCEL_MAX_ROWS行）、.csv（UTF-8）、.parquet
+# - --payment时增加“支付方式”列，用于测试额外的筛选维度
+
+BRANCH_CITIES = {'1号店': '太原', '2号店': '大同', '3号店': '临汾'}
+CUSTOMER_TYPES = ['会员用户', '普通用户']
+GENDERS = ['女性', '男性']
+PRODUCT_TYPES = ['时尚配饰', '食品饮料', '电子配件', '运动旅行', '家居生活', '健康美容']
+PRODUCT_WEIGHTS = [0.178, 0.174, 0.170, 0.166, 0.160, 0.152]
+PAYMENT_METHODS = ['电子钱包', '现金', '信用卡']
+PAYMENT_WEIGHTS = [0.345, 0.344, 0.311]
+
+FIRST_DATE = datetime.date(2022, 1, 1)
+N_DAYS = 89
+OPEN_MINUTE = 10 * 60
+CLOSE_MINUTE = 21 * 60
+
+CHUNK_ROWS = 1_000_000
+# 工作表最多1048576行，第1行是标题，第2行是列名
+EXCEL_MAX_ROWS = 1_048_576 - 2
+TITLE = '超市销售数据'
+
+# 订单号由行号经过乘法散列得到，10位数字互不重复，看起来是随机的
+_ORDER_MODULUS = 10 ** 10
+_ORDER_MULTIPLIER = 2_654_435_761
+
+
+def _choice(rng, weights, n):
+    """按权重抽样，返回取值的编号"""
+    codes = np.searchsorted(np.cumsum(weights), rng.random(n), side='right')
+    return np.minimum(codes, len(weights) - 1).astype(np.int8)
+
+
+def _dictionary(codes, categories):
+    """编号加取值表组成Arrow的字典数组，不为每行创建字符串"""
+    return pa.DictionaryArray.from_arrays(pa.array(codes), pa.array(categories))
+
+
+def _order_ids(start_row, n):
+    numbers = (np.arange(start_row, start_row + n, dtype=np.uint64) * np.uint64(_ORDER_MULTIPLIER)
+               + np.uint64(1_234_567_891)) % np.uint64(_ORDER_MODULUS)
+    digits = pc.utf8_lpad(pc.cast(pa.array(numbers), pa.string()), 10, '0')
+    parts = [pc.utf8_slice_codeunits(digits, start, stop) for start, stop in [(0, 4), (4, 6), (6, 10)]]
+    return pc.binary_join_element_wise(*parts, '-')
+
+
+def generate_sales(n_rows, seed=42, start_row=0, include_payment=False):
+    """生成n_rows笔交易，订单号从第start_row行开始编号；返回pyarrow.Table"""
+    rng = np.random.default_rng([seed, start_row])
+    branches = _choice(rng, [1 / 3] * 3, n_rows)
+    unit_price = np.round(rng.uniform(10, 100, n_rows), 2)
+    quantity = rng.integers(1, 11, n_rows)
+    minutes = rng.integers(OPEN_MINUTE, CLOSE_MINUTE, n_rows)
+
+    columns = {
+        '订单号': _order_ids(start_row, n_rows),
+        '分店': _dictionary(branches, list(BRANCH_CITIES)),
+        '城市': _dictionary(branches, list(BRANCH_CITIES.values())),
+        '顾客类型': _dictionary(_choice(rng, [0.5, 0.5], n_rows), CUSTOMER_TYPES),
+        '性别': _dictionary(_choice(rng, [0.5, 0.5], n_rows), GENDERS),
+        '产品类型': _dictionary(_choice(rng, PRODUCT_WEIGHTS, n_rows), PRODUCT_TYPES),
+        '单价': pa.array(unit_price),
+        '数量': pa.array(quantity),
+        '总价': pa.array(np.round(unit_price * quantity, 2)),
+        '日期': pa.array(np.datetime64(FIRST_DATE, 'D') + rng.integers(0, N_DAYS, n_rows)).cast(pa.timestamp('ns')),
+        '时间': pa.array(minutes.astype(np.int64) * 60_000_000).cast(pa.time64('us')),
+        '评分': pa.array(rng.integers(40, 101, n_rows) / 10),
+    }
+    if include_payment:
+        columns['支付方式'] = _dictionary(_choice(rng, PAYMENT_WEIGHTS, n_rows), PAYMENT_METHODS)
+    return pa.table(columns)
+
+
+def _chunks(n_rows, seed, include_payment):
+    for start in range(0, n_rows, CHUNK_ROWS):
+        yield generate_sales(min(CHUNK_ROWS, n_rows - start), seed, start, include_payment)
+
+
+def _write_parquet(path, chunks):
+    writer = None
+    try:
+        for table in chunks:
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _write_csv(path, chunks):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for i, table in enumerate(chunks):
+            df = table.to_pandas()
+            df['日期'] = df['日期'].dt.strftime('%Y-%m-%d')
+            df.to_csv(f, index=False, header=i == 0)
+
+
+def _write_xlsx(path, chunks):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('销售数据')
+    sheet.append([TITLE])
+    for i, table in enumerate(chunks):
+        if i == 0:
+            sheet.append(table.column_names)
+        columns = [column.to_pylist() for column in table.columns]
+        for row in zip(*columns):
+            sheet.append(row)
+    workbook.save(path)
+
+
+def write_sales(path, n_rows, seed=42, include_payment=False):
+    """生成n_rows笔交易并写入path，格式由扩展名决定"""
+    ext = os.path.splitext(path)[1].lower()
+    writers = {'.parquet': _write_parquet, '.csv': _write_csv, '.xlsx': _write_xlsx}
+    if ext not in writers:
+        raise ValueError(f"不支持的文件格式：{ext}，只能是.xlsx、.csv或.parquet")
+    if ext == '.xlsx' and n_rows > EXCEL_MAX_ROWS:
+        raise ValueError(f"Excel工作表最多{EXCEL_MAX_ROWS:,}笔交易，请改用.csv或.parquet")
+    writers[ext](path, _chunks(n_rows, seed, include_payment))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成模拟超市销售数据")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--output', required=True, help="输出文件，扩展名为.xlsx、.csv或.parquet")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--payment', action='store_true', help="增加“支付方式”列")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    write_sales(args.output, args.rows, args.seed, args.payment)
+    print(f"{args.output}：{args.rows:,}笔交易，{os.path.getsize(args.output) / 1024 / 1024:.1f} MB，"
+          f"耗时{time.perf_counter() - start:.1f}秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+
+# final.py侧边栏筛选使用的位图索引
+#
+# 对每个筛选维度的每个取值预先保存一个位图（np.packbits压缩，每行1位），数据加载后只构建一次：
+# - 同一维度内选中的多个取值做按位或，不同维度之间做按位与，每次点击的计算量是几个位图的按位运算，
+#   不再逐行解析和比较字符串
+# - 某个维度选中了全部取值时不参与运算；所有维度都是全选时直接返回原数据框，不复制
+# - 日期按天保存“该日及之后”的累积位图，任意日期范围只需两个位图运算：on_or_after[起] & ~on_or_after[止+1]
+# 数据中没有的维度（例如随项目提供的工作簿没有“支付方式”列）不建索引，页面上也不显示。
+
+FILTER_DIMENSIONS = ['城市', '顾客类型', '性别', '产品类型', '支付方式']
+DATE_COLUMN = '日期'
+
+
+class FilterIndex:
+    """各筛选维度的取值和对应的位图"""
+
+    def __init__(self, n_rows, options, bitmaps, dates, on_or_after):
+        self.n_rows = n_rows
+        self.options = options
+        self.bitmaps = bitmaps
+        self.dates = dates
+        self.on_or_after = on_or_after
+
+    @property
+    def dimensions(self):
+        return list(self.options)
+
+    @property
+    def nbytes(self):
+        return sum(b.nbytes for b in self.bitmaps.values()) + self.on_or_after.nbytes
+
+    def date_range(self):
+        """数据中最早和最晚的日期（datetime.date），没有日期时返回None"""
+        if len(self.dates) == 0:
+            return None
+        return self.dates[0].astype(object), self.dates[-1].astype(object)
+
+    def _dimension_bits(self, dimension, selected):
+        options = self.options[dimension]
+        positions = [options.index(value) for value in set(selected) if value in options]
+        if len(positions) == len(options):
+            return None
+        if not positions:
+            return np.zeros(self.bitmaps[dimension].shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bitmaps[dimension][positions], axis=0)
+
+    def _date_bits(self, start, end):
+        start_pos = np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left')
+        end_pos = np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right')
+        if start_pos == 0 and end_pos == len(self.dates):
+            return None
+        if start_pos >= end_pos:
+            return np.zeros(self.on_or_after.shape[1], dtype=np.uint8)
+        bits = self.on_or_after[start_pos]
+        if end_pos < len(self.dates):
+            bits = bits & ~self.on_or_after[end_pos]
+        return bits
+
+    def mask(self, selections, date_range=None):
+        """selections是{维度: 选中的取值}，date_range是(起, 止)（包含两端）
+
+        返回布尔数组；没有任何维度需要筛选时返回None。
+        """
+        result = None
+        parts = [self._dimension_bits(dimension, selected) for dimension, selected in selections.items()]
+        if date_range is not None and len(self.dates):
+            parts.append(self._date_bits(*date_range))
+        for bits in parts:
+            if bits is not None:
+                result = bits if result is None else result & bits
+        if result is None:
+            return None
+        return np.unpackbits(result, count=self.n_rows).view(bool)
+
+    def select(self, df, selections, date_range=None):
+        """筛选后的数据框；没有筛选条件时返回df本身"""
+        mask = self.mask(selections, date_range)
+        return df if mask is None else df[mask]
+
+
+def _value_codes(series):
+    """返回(取值列表, 每行的取值编码)；category列直接使用其编码"""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype('category')
+    return list(series.cat.categories), series.cat.codes.to_numpy()
+
+
+def build_filter_index(df, dimensions=FILTER_DIMENSIONS, date_column=DATE_COLUMN):
+    n_rows = len(df)
+    options = {}
+    bitmaps = {}
+    for dimension in dimensions:
+        if dimension not in df.columns:
+            continue
+        values, codes = _value_codes(df[dimension])
+        options[dimension] = values
+        bitmaps[dimension] = np.stack([np.packbits(codes == k) for k in range(len(values))]) if values else \
+            np.zeros((0, (n_rows + 7) // 8), dtype=np.uint8)
+
+    if date_column in df.columns:
+        days = df[date_column].to_numpy().astype('datetime64[D]')
+        dates, day_codes = np.unique(days, return_inverse=True)
+        # 从最后一天往前累积：on_or_after[i]是日期不早于dates[i]的行
+        on_or_after = np.empty((len(dates), (n_rows + 7) // 8), dtype=np.uint8)
+        current = np.zeros(on_or_after.shape[1], dtype=np.uint8)
+        for i in range(len(dates) - 1, -1, -1):
+            current = current | np.packbits(day_codes == i)
+            on_or_after[i] = current
+    else:
+        dates = np.array([], dtype='datetime64[D]')
+        on_or_after = np.zeros((0, (n_rows + 7) // 8), dtype=np.uint8)
+    return FilterIndex(n_rows, options, bitmaps, dates, on_or_after)
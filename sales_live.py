@@ -0,0 +1,291 @@
+import argparse
+import collections
+import contextlib
+import datetime
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import sales_cube
+import sales_data
+import sales_generator
+
+
+# final.py的实时模式：从投放目录或SQLite表中增量读取新到的交易批次，累加到预聚合立方体中
+#
+# 用法：
+#     SALES_LIVE_SOURCE=incoming streamlit run final.py      # 投放目录
+#     SALES_LIVE_SOURCE=sales.db streamlit run final.py      # SQLite数据库，表名由SALES_LIVE_TABLE指定（默认sales）
+#     python sales_live.py --source incoming --rows 500 --interval 2    # 模拟每2秒到达一批500笔交易
+#
+# - 投放目录：每个新出现的.csv/.parquet文件是一批交易，列与数据文件相同。写入方先写到以“.”开头的临时文件，
+#   写完再改名（改名是原子操作），页面不会读到写了一半的文件。文件的修改时间作为批次的落地时间
+# - SQLite：只追加的表，每次读取rowid大于上次的新行；有“入库时间”列（Unix时间戳）时作为落地时间，
+#   否则使用发现新行的时间
+# - 新批次只用sales_cube.fold_batch()累加到立方体，不重新加载数据文件，也不重建位图索引，
+#   所以侧边栏的选项和明细数据仍然只来自数据文件；批次中出现的新城市等取值不在侧边栏的选项中，不会被选中
+# - 每个数据文件和数据源在进程内只有一个LiveSales，所有会话共享；已读取的文件和rowid只记在内存中，
+#   服务器重启后重新累加投放目录中的全部文件（或表中的全部行），结果与重启前相同
+# - final.py的关键指标和图表区域是每REFRESH_SECONDS秒运行一次的fragment，每次先检查数据源再显示，
+#   侧边栏和页面的其他部分不重新运行
+# - 端到端延迟 = 本会话显示出包含该批次的指标和图表的时间 - 批次落地时间，分为等待读取、读取和累加、显示三段；
+#   显示时间是服务器生成完页面元素的时间，不包括浏览器绘制
+
+LIVE_SOURCE = os.environ.get('SALES_LIVE_SOURCE')
+LIVE_TABLE = os.environ.get('SALES_LIVE_TABLE', 'sales')
+REFRESH_SECONDS = float(os.environ.get('SALES_LIVE_REFRESH', '2'))
+
+BATCH_EXTENSIONS = ('.csv', '.parquet')
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+# 每次从SQLite最多读取的行数，积压的行在之后几次检查中读完
+SQLITE_BATCH_ROWS = 100_000
+LANDED_COLUMN = '入库时间'
+# 保留最近的批次记录和错误信息的条数
+HISTORY_BATCHES = 100
+
+
+@dataclass
+class Batch:
+    """从数据源读到的一批交易，时间都是Unix时间戳"""
+    name: str
+    frame: pd.DataFrame
+    landed_at: float
+    detected_at: float
+
+
+@dataclass
+class BatchRecord:
+    """已累加的批次；version是累加这一批之后立方体的版本号"""
+    version: int
+    name: str
+    rows: int
+    landed_at: float
+    detected_at: float
+    folded_at: float
+
+
+class DropDirectorySource:
+    """投放目录中新出现的.csv/.parquet文件"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._seen = set()
+        os.makedirs(directory, exist_ok=True)
+
+    def describe(self):
+        return f"投放目录 {self.directory}"
+
+    def _is_batch(self, entry):
+        return (entry.is_file() and entry.name not in self._seen and not entry.name.startswith(('.', '~'))
+                and os.path.splitext(entry.name)[1].lower() in BATCH_EXTENSIONS)
+
+    def poll(self):
+        """返回(新批次, 错误信息)，按文件的修改时间排列；读取失败的文件不再重试"""
+        detected_at = time.time()
+        with os.scandir(self.directory) as entries:
+            files = sorted((entry.stat().st_mtime, entry.name, entry.path) for entry in entries if self._is_batch(entry))
+        batches = []
+        errors = []
+        for mtime, name, path in files:
+            self._seen.add(name)
+            try:
+                frame = sales_data.parse_source(path)
+            except Exception as e:
+                errors.append(f"{name}：{e}")
+                continue
+            batches.append(Batch(name, frame, mtime, detected_at))
+        return batches, errors
+
+
+class SqliteSource:
+    """SQLite表中rowid大于上次读取位置的新行"""
+
+    def __init__(self, path, table=LIVE_TABLE):
+        self.path = path
+        self.table = table
+        self._last_rowid = 0
+
+    def describe(self):
+        return f"SQLite {self.path} 的 {self.table} 表"
+
+    def poll(self):
+        detected_at = time.time()
+        if not os.path.exists(self.path):
+            return [], []
+        table = self.table.replace('"', '""')
+        query = f'SELECT rowid AS _rowid, * FROM "{table}" WHERE rowid > ? ORDER BY rowid LIMIT ?'
+        uri = pathlib.Path(self.path).resolve().as_uri() + '?mode=ro'
+        with contextlib.closing(sqlite3.connect(uri, uri=True)) as conn:
+            frame = pd.read_sql_query(query, conn, params=(self._last_rowid, SQLITE_BATCH_ROWS))
+        if frame.empty:
+            return [], []
+        name = f"rowid {frame['_rowid'].iloc[0]}~{frame['_rowid'].iloc[-1]}"
+        self._last_rowid = int(frame['_rowid'].iloc[-1])
+        landed_at = float(frame[LANDED_COLUMN].max()) if LANDED_COLUMN in frame.columns else detected_at
+        try:
+            frame = frame.drop(columns=['_rowid', LANDED_COLUMN], errors='ignore')
+            frame['日期'] = pd.to_datetime(frame['日期'])
+            frame = sales_data.prepare_frame(frame.set_index(sales_data.INDEX_COLUMN))
+        except Exception as e:
+            return [], [f"{name}：{e}"]
+        return [Batch(name, frame, landed_at, detected_at)], []
+
+
+def open_source(source, table=LIVE_TABLE):
+    """扩展名为.db/.sqlite/.sqlite3时是SQLite数据库，否则是投放目录"""
+    if os.path.splitext(source)[1].lower() in SQLITE_EXTENSIONS:
+        return SqliteSource(source, table)
+    return DropDirectorySource(source)
+
+
+class LiveSales:
+    """数据文件的立方体加上实时累加的批次，所有会话共享"""
+
+    def __init__(self, base, source):
+        self.base = base
+        self.source = source
+        self.rows = 0
+        self.history = collections.deque(maxlen=HISTORY_BATCHES)
+        self.errors = collections.deque(maxlen=HISTORY_BATCHES)
+        # (立方体, 版本号)放在一个属性中整体替换，读取的会话总是得到一致的一对
+        self._snapshot = (base, 0)
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """返回(立方体, 版本号)，立方体包含版本号及之前的所有批次"""
+        return self._snapshot
+
+    def poll(self):
+        """检查数据源并累加新批次，返回本次累加的批次记录；其他会话正在检查时直接返回"""
+        if not self._lock.acquire(blocking=False):
+            return []
+        try:
+            try:
+                batches, errors = self.source.poll()
+            except Exception as e:
+                batches, errors = [], [f"{self.source.describe()}：{e}"]
+            cube, version = self._snapshot
+            records = []
+            for batch in batches:
+                try:
+                    cube = sales_cube.fold_batch(cube, batch.frame)
+                except ValueError as e:
+                    errors.append(f"{batch.name}：{e}")
+                    continue
+                version += 1
+                self.rows += len(batch.frame)
+                records.append(BatchRecord(version, batch.name, len(batch.frame),
+                                           batch.landed_at, batch.detected_at, time.time()))
+            # 先替换立方体再记录批次，看到批次记录的会话一定能读到包含它的立方体
+            self._snapshot = (cube, version)
+            self.history.extend(records)
+            now = time.strftime('%H:%M:%S')
+            self.errors.extend(f"{now} {error}" for error in errors)
+            return records
+        finally:
+            self._lock.release()
+
+    def records(self, after_version, up_to_version):
+        """版本号在(after_version, up_to_version]之间的批次记录"""
+        return [record for record in list(self.history) if after_version < record.version <= up_to_version]
+
+
+_live = {}
+_live_lock = threading.Lock()
+
+
+def get_live_sales(data_path, source=LIVE_SOURCE, table=LIVE_TABLE):
+    """返回数据文件和数据源对应的LiveSales，进程内只创建一次；数据文件变化后重新从数据源的开头累加"""
+    base = sales_data.load_sales_cube(data_path)
+    key = (os.path.abspath(data_path), os.path.abspath(source), table)
+    with _live_lock:
+        live = _live.get(key)
+        if live is None or live.base is not base:
+            live = _live[key] = LiveSales(base, open_source(source, table))
+        return live
+
+
+def open_ended(date_range, data_range):
+    """侧边栏的日期范围到达数据文件的最早或最晚日期时，这一端不再限制，新批次中更早或更晚的日期也包含在内"""
+    if date_range is None or data_range is None:
+        return date_range
+    start, end = date_range
+    return (datetime.date.min if start <= data_range[0] else start,
+            datetime.date.max if end >= data_range[1] else end)
+
+
+def latency_rows(records, shown_at):
+    """每个批次从落地到显示的各段耗时（秒）"""
+    return [{
+        '批次': record.name,
+        '笔数': record.rows,
+        '等待读取(秒)': round(record.detected_at - record.landed_at, 3),
+        '读取和累加(秒)': round(record.folded_at - record.detected_at, 3),
+        '显示(秒)': round(shown_at - record.folded_at, 3),
+        '端到端(秒)': round(shown_at - record.landed_at, 3),
+    } for record in records]
+
+
+def _stamped_batch(n_rows, start_row, seed, include_payment):
+    """用sales_generator生成一批交易，日期和时间改为当前时刻"""
+    df = sales_generator.generate_sales(n_rows, seed, start_row, include_payment).to_pandas()
+    now = datetime.datetime.now().replace(microsecond=0)
+    df['日期'] = pd.Timestamp(now.date())
+    df['时间'] = now.time()
+    return df
+
+
+def _drop_file(directory, df):
+    """先写临时文件再改名，投放目录中只会出现完整的文件；文件名按写入时刻命名，不会覆盖已有的批次"""
+    name = f'batch_{time.time_ns()}.parquet'
+    tmp_path = os.path.join(directory, f'.{name}.tmp')
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+    os.replace(tmp_path, os.path.join(directory, name))
+    return name
+
+
+def _insert_rows(path, table, df):
+    df = df.astype({column: str for column in df.columns if column not in ('单价', '数量', '总价', '评分')})
+    df[LANDED_COLUMN] = time.time()
+    with contextlib.closing(sqlite3.connect(path)) as conn, conn:
+        df.to_sql(table, conn, if_exists='append', index=False)
+    return f'{table}表'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟实时到达的交易批次")
+    parser.add_argument('--source', default=LIVE_SOURCE, required=LIVE_SOURCE is None,
+                        help="投放目录，或扩展名为.db/.sqlite/.sqlite3的SQLite数据库")
+    parser.add_argument('--table', default=LIVE_TABLE)
+    parser.add_argument('--rows', type=int, default=500, help="每批的交易笔数")
+    parser.add_argument('--interval', type=float, default=2.0, help="两批之间的秒数")
+    parser.add_argument('--batches', type=int, default=0, help="批数，0表示一直运行")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--payment', action='store_true', help="增加“支付方式”列（数据文件有该列时需要）")
+    args = parser.parse_args()
+
+    is_sqlite = os.path.splitext(args.source)[1].lower() in SQLITE_EXTENSIONS
+    if not is_sqlite:
+        os.makedirs(args.source, exist_ok=True)
+    # 订单号从一个较大的行号开始编号，与数据文件中的订单号不重复
+    start_row = 100_000_000
+    i = 0
+    while args.batches == 0 or i < args.batches:
+        df = _stamped_batch(args.rows, start_row, args.seed, args.payment)
+        name = _insert_rows(args.source, args.table, df) if is_sqlite else _drop_file(args.source, df)
+        print(f"{time.strftime('%H:%M:%S')} 第{i + 1}批：{name}，{args.rows}笔", flush=True)
+        start_row += args.rows
+        i += 1
+        if args.batches == 0 or i < args.batches:
+            time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,16 @@
+import os
+import time
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-import plotly.express as px
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import train_test_split
+
+import perf_timing
+import student_data
+import student_model
+import student_scoring
+import student_stats
 
 # 设置页面配置
 st.set_page_config(
@@ -14,69 +19,207 @@ st.set_page_config(
     layout="wide"
 )
 
+# 模拟学生的人数和随机种子，容量测试时可以通过环境变量调大，例如 STUDENT_COUNT=1000000
+STUDENT_COUNT = int(os.environ.get('STUDENT_COUNT', 1000))
+STUDENT_SEED = int(os.environ.get('STUDENT_SEED', 42))
+
+# 数据集版本，数据和模型的缓存都以它为键
+DATASET_VERSION = student_data.dataset_version(STUDENT_COUNT, STUDENT_SEED)
+
 # 生成模拟数据
-@st.cache_data
-def generate_sample_data():
-    np.random.seed(42)
-    n_students = 1000
-    
-    majors = ['大数据管理', '计算机科学', '信息系统', '软件工程', '数据科学', '人工智能', '电子商务']
-    
-    data = {
-        '学号': [f'2023{str(i).zfill(6)}' for i in range(1, n_students+1)],
-        '姓名': [f'学生{i}' for i in range(1, n_students+1)],
-        '性别': np.random.choice(['男', '女'], n_students, p=[0.6, 0.4]),
-        '专业': np.random.choice(majors, n_students, p=[0.25, 0.15, 0.15, 0.15, 0.10, 0.10, 0.10]),
-        '平时成绩': np.random.normal(75, 10, n_students).clip(40, 100),
-        '作业完成率': np.random.uniform(60, 100, n_students).round(1),
-        '上课出勤率': np.random.uniform(70, 100, n_students).round(1),
-        '每周学习时长': np.random.uniform(10, 40, n_students).round(1),
-        '期中考试分数': np.random.normal(70, 15, n_students).clip(40, 100).round(1),
-        '期末成绩': np.random.normal(70, 15, n_students).clip(40, 100).round(1)
-    }
+# 用cache_resource让所有会话共享同一个DataFrame，每次rerun不必反序列化一份拷贝；
+# 页面中只读使用它，需要增加列时先筛选或复制
+@st.cache_resource
+def generate_sample_data(n_students=STUDENT_COUNT, seed=STUDENT_SEED):
+    return student_data.generate_students(n_students, seed)
+
+# 成绩预测模型正在后台读取或训练时显示进度，每秒刷新一次，准备好后重新运行整个页面
+@st.fragment(run_every=1)
+def show_model_warming():
+    if student_model.ready_model(DATASET_VERSION) is not None:
+        st.rerun()
     
-    df = pd.DataFrame(data)
-    df['总评成绩'] = (df['平时成绩'] * 0.3 + df['期中考试分数'] * 0.3 + df['期末成绩'] * 0.4).round(1)
+    status = student_model.training_status()
+    if status is None or status.state == 'loading':
+        st.info("⏳ 模型预热中：正在读取已保存的预测模型...")
+    elif status.state == 'training':
+        elapsed = time.time() - status.started_at
+        st.progress(status.progress, text=f"⏳ 模型预热中：正在训练预测模型 {status.progress:.0%}（已用时 {elapsed:.0f} 秒）")
+        st.caption("首次启动或数据集变化时需要训练模型，训练完成后会保存到磁盘，之后重启服务器可以直接使用")
+    elif status.state == 'failed':
+        st.error(f"预测模型训练失败：{status.error}")
+        if st.button("重新训练"):
+            student_model.warm_up(generate_sample_data(), DATASET_VERSION, retry=True)
+
+# 全体学生的预测正在后台进行时显示进度，完成后重新运行整个页面
+@st.fragment(run_every=1)
+def show_scoring_progress(prediction_model):
+    if student_scoring.ready_scores(prediction_model.version) is not None:
+        st.rerun()
     
-    return df
+    status = student_scoring.scoring_status()
+    if status is None or status.state == 'scoring':
+        rows_done = status.rows_done if status is not None else 0
+        elapsed = time.time() - status.started_at if status is not None else 0
+        progress = status.progress if status is not None else 0.0
+        speed = f"，{rows_done / elapsed:,.0f} 人/秒" if elapsed > 0 and rows_done else ""
+        st.progress(progress, text=f"⏳ 正在预测全体学生的期末成绩：{rows_done:,}/{STUDENT_COUNT:,} 人{speed}")
+        st.caption("每个模型版本只需要预测一次，结果会保存到磁盘，翻页、筛选和排序不会重新预测")
+    elif status.state == 'failed':
+        st.error(f"全体学生成绩预测失败：{status.error}")
+        if st.button("重新预测"):
+            student_scoring.warm_up(generate_sample_data(), prediction_model, retry=True)
 
-# 创建预测模型
-@st.cache_resource
-def create_prediction_model(df):
-    le_gender = LabelEncoder()
-    le_major = LabelEncoder()
+# 风险预警名单：筛选、排序只对预警学生的行号进行，每次只取出当前页显示
+def show_at_risk_list(df, scores):
+    total = len(df)
+    at_risk_total = len(scores.at_risk)
     
-    df['性别_编码'] = le_gender.fit_transform(df['性别'])
-    df['专业_编码'] = le_major.fit_transform(df['专业'])
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("学生总数", f"{total:,}人")
+    with col2:
+        st.metric("预测不及格人数", f"{at_risk_total:,}人")
+    with col3:
+        st.metric("预警比例", f"{at_risk_total / total * 100:.2f}%")
     
-    features = ['平时成绩', '作业完成率', '上课出勤率', '每周学习时长', '期中考试分数', '性别_编码', '专业_编码']
+    with perf_timing.phase('预警人数统计'):
+        counts = student_scoring.at_risk_counts(df, scores)
+    fig = go.Figure(data=[go.Bar(
+        x=counts.index,
+        y=counts['预警人数'],
+        marker_color='#FF6B6B',
+        text=[f"{n:,}人 ({n / m * 100:.1f}%)" if m else "0人" for n, m in zip(counts['预警人数'], counts['学生人数'])],
+        textposition='outside'
+    )])
+    fig.update_layout(
+        title='各专业预警人数',
+        xaxis_title='专业',
+        yaxis_title='人数',
+        height=350,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white'),
+        margin=dict(l=50, r=20, t=50, b=50)
+    )
+    st.plotly_chart(fig, use_container_width=True)
     
-    X = df[features]
-    y = df['期末成绩']
+    st.subheader("预警学生名单")
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        majors = st.multiselect("专业", list(df['专业'].cat.categories), placeholder="全部专业")
+    with col2:
+        genders = st.multiselect("性别", list(df['性别'].cat.categories), placeholder="全部")
+    with col3:
+        sort_by = st.selectbox("排序", student_scoring.SORT_COLUMNS)
+    with col4:
+        order = st.radio("顺序", ["升序", "降序"], horizontal=True)
     
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    with perf_timing.phase('预警名单筛选'):
+        rows = student_scoring.filter_at_risk(df, scores, majors or None, genders or None)
+        rows = student_scoring.sort_rows(df, scores, rows, sort_by, ascending=order == "升序")
     
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        page_size = st.selectbox("每页人数", [20, 50, 100], index=1)
+    total_pages = max(1, -(-len(rows) // page_size))
+    with col2:
+        page = st.number_input("页码", min_value=1, max_value=total_pages, value=1, step=1)
     
-    return model, le_gender, le_major, features
+    with perf_timing.phase('预警名单分页'):
+        table = student_scoring.page_table(df, scores, rows, page, page_size)
+    st.dataframe(
+        table,
+        column_config={
+            "预测期末成绩": st.column_config.NumberColumn(format="%.1f"),
+            "平时成绩": st.column_config.NumberColumn(format="%.1f"),
+            "期中考试分数": st.column_config.NumberColumn(format="%.1f"),
+            "上课出勤率": st.column_config.NumberColumn(format="%.1f %%"),
+            "作业完成率": st.column_config.NumberColumn(format="%.1f %%"),
+            "每周学习时长": st.column_config.NumberColumn(format="%.1f")
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+    st.caption(f"第 {page}/{total_pages} 页，符合条件的预警学生共 {len(rows):,} 人")
 
-# 创建成绩分段柱状图
-def create_score_segment_bar_chart(major_df, major_name="大数据管理"):
-    """创建成绩分段柱状图，展示各分数段人数分布"""
+# 各专业（及专业×性别）的统计立方体，一次遍历数据得到，按数据集版本缓存
+# 专业数据分析页面的图表和表格都从它读取，切换指标不再对原始数据分组
+@st.cache_resource
+def get_stats_cube(dataset_version, _df):
+    return student_stats.build_cube(_df)
+
+# 按专业排序的行号索引，按数据集版本缓存；切换专业时只是切片，不对整个DataFrame做布尔筛选
+@st.cache_resource
+def get_major_index(dataset_version, _df):
+    return student_stats.build_major_index(_df)
+
+# 某个专业期末成绩的直方图和成绩分段人数，在服务器端分箱，按(数据集版本, 专业)缓存
+# 返回的只是几十个整数，图表数据的大小与学生人数无关
+@st.cache_data
+def get_score_distribution(dataset_version, major, _df):
+    values = get_major_index(dataset_version, _df).values(_df, '期末成绩', major)
+    counts, edges = student_stats.score_histogram(values)
+    return counts, edges, student_stats.score_segments(values)
+
+# 创建成绩直方图，输入是分箱后的人数
+@perf_timing.timed('成绩直方图')
+def create_score_histogram_chart(counts, edges, avg_score):
+    """用柱宽等于箱宽的柱状图画直方图，只向浏览器发送每个箱的人数"""
+    
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        marker_color='#36A2EB',
+        opacity=0.8,
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate='成绩: %{customdata[0]:.0f}-%{customdata[1]:.0f}<br>人数: %{y}人<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title='期末成绩分布直方图',
+        height=400,
+        bargap=0,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white'),
+        showlegend=False,
+        margin=dict(l=50, r=20, t=50, b=50)
+    )
+    
+    fig.update_xaxes(
+        title='期末成绩 (分)',
+        showgrid=True,
+        gridcolor='rgba(255,255,255,0.1)'
+    )
     
-    # 定义分数段
-    bins = [0, 60, 70, 80, 90, 100]
-    labels = ['不及格(0-59)', '及格(60-69)', '中等(70-79)', '良好(80-89)', '优秀(90-100)']
+    fig.update_yaxes(
+        title='人数',
+        showgrid=True,
+        gridcolor='rgba(255,255,255,0.1)'
+    )
+    
+    # 添加平均线
+    fig.add_vline(
+        x=avg_score,
+        line_dash="dash",
+        line_color="red",
+        annotation_text=f"平均: {avg_score:.1f}分",
+        annotation_position="top right"
+    )
     
-    # 对成绩进行分段
-    major_df['成绩段'] = pd.cut(major_df['期末成绩'], bins=bins, labels=labels, right=False)
+    return fig
+
+# 创建成绩分段柱状图
+@perf_timing.timed('成绩分段图')
+def create_score_segment_bar_chart(segment_counts, major_name="大数据管理"):
+    """创建成绩分段柱状图，展示各分数段人数分布，输入是各分数段的人数"""
     
-    # 统计各分数段人数
-    score_segments = major_df['成绩段'].value_counts().reindex(labels).fillna(0)
+    score_segments = pd.Series(segment_counts, index=student_stats.SCORE_SEGMENT_LABELS)
     
     # 计算百分比
-    total_students = len(major_df)
+    total_students = max(int(score_segments.sum()), 1)
     percentages = (score_segments / total_students * 100).round(1)
     
     # 创建柱状图
@@ -124,6 +267,7 @@ def create_score_segment_bar_chart(major_df, major_name="大数据管理"):
     return fig
 
 # 创建成绩对比柱状图
+@perf_timing.timed('成绩对比图')
 def create_score_comparison_chart(major_df, major_name="大数据管理"):
     """创建成绩对比柱状图，展示各指标对比"""
     
@@ -179,9 +323,17 @@ def create_score_comparison_chart(major_df, major_name="大数据管理"):
 
 # 主应用
 def main():
+    # 开始记录本次rerun的分阶段耗时
+    perf_timing.start_rerun('student')
+    
     # 加载数据
-    df = generate_sample_data()
-    model, le_gender, le_major, features = create_prediction_model(df)
+    with perf_timing.phase('生成数据'):
+        df = generate_sample_data()
+    with perf_timing.phase('训练模型'):
+        # 在后台线程中读取或训练，不阻塞页面；只有成绩预测页面需要等待模型
+        student_model.warm_up(df, DATASET_VERSION)
+    with perf_timing.phase('统计立方体'):
+        cube = get_stats_cube(DATASET_VERSION, df)
     
     # 侧边栏导航 - 改为选择菜单栏格式
     with st.sidebar:
@@ -189,7 +341,7 @@ def main():
         st.markdown("---")
         
         # 创建导航选项
-        nav_options = ["项目介绍", "专业数据分析", "成绩预测"]
+        nav_options = ["项目介绍", "专业数据分析", "成绩预测", "风险预警"]
         
         # 使用单选按钮作为菜单
         selected_page = st.radio(
@@ -220,7 +372,8 @@ def main():
         
         with col2:
             # 专业分布图
-            major_counts = df['专业'].value_counts()
+            with perf_timing.phase('专业人数统计'):
+                major_counts = cube.major_counts().sort_values(ascending=False)
             fig = go.Figure(data=[go.Bar(
                 x=major_counts.index,
                 y=major_counts.values,
@@ -290,8 +443,8 @@ def main():
         # 1. 各专业男女性别比例
         st.header("1. 各专业男女性别比例")
         
-        gender_by_major = pd.crosstab(df['专业'], df['性别'])
-        gender_by_major = gender_by_major.sort_index()
+        with perf_timing.phase('性别比例统计'):
+            gender_by_major = cube.counts()
         
         col1, col2 = st.columns([2, 1])
         
@@ -342,7 +495,8 @@ def main():
             st.subheader("性别比例数据")
             
             # 计算比例
-            gender_by_major_pct = pd.crosstab(df['专业'], df['性别'], normalize='index') * 100
+            with perf_timing.phase('性别比例统计'):
+                gender_by_major_pct = gender_by_major.div(gender_by_major.sum(axis=1), axis=0) * 100
             
             # 创建格式化数据表格
             display_df = pd.DataFrame({
@@ -385,8 +539,10 @@ def main():
         
         with col1:
             # 改进的组合图表
-            major_avg = df.groupby('专业')[metric].mean()
-            major_std = df.groupby('专业')[metric].std()
+            with perf_timing.phase('学习指标统计'):
+                metric_stats = cube.metric_stats(metric)
+                major_avg = metric_stats['mean']
+                major_std = metric_stats['std']
             
             fig = go.Figure()
             
@@ -456,7 +612,8 @@ def main():
             st.subheader("详细数据")
             
             # 创建统计表格
-            stats_df = df.groupby('专业')[metric].agg(['mean', 'std', 'min', 'max']).round(1)
+            with perf_timing.phase('学习指标统计'):
+                stats_df = metric_stats[['mean', 'std', 'min', 'max']].round(1)
             stats_df.columns = ['平均值', '标准差', '最小值', '最大值']
             stats_df = stats_df.sort_values('平均值', ascending=False)
             
@@ -483,7 +640,9 @@ def main():
         
         with col1:
             # 改进的矩形色块图
-            attendance_by_major = df.groupby('专业')['上课出勤率'].mean().sort_values()
+            with perf_timing.phase('出勤率统计'):
+                attendance_mean = cube.metric_stats('上课出勤率')['mean']
+                attendance_by_major = attendance_mean.sort_values()
             
             # 使用渐变色
             colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FECA57', '#FF9FF3', '#54A0FF']
@@ -528,7 +687,7 @@ def main():
         with col2:
             st.subheader("出勤率排名")
             
-            attendance_rank = df.groupby('专业')['上课出勤率'].mean().sort_values(ascending=False).round(1)
+            attendance_rank = attendance_mean.sort_values(ascending=False).round(1)
             attendance_df = pd.DataFrame({
                 '专业': attendance_rank.index,
                 '平均出勤率': attendance_rank.values,
@@ -546,23 +705,30 @@ def main():
                 use_container_width=True
             )
         
-        # 4. 专项分析 - 根据图片调整为"大数据管理专业专项分析"
-        st.header("4. 大数据管理专业专项分析")
-        
-        # 设置默认选择为大数据管理专业
-        selected_major = "大数据管理"
+        # 4. 专项分析 - 可以选择任意专业，默认大数据管理专业
+        st.header("4. 专业专项分析")
         
-        major_df = df[df['专业'] == selected_major]
+        majors = list(df['专业'].cat.categories)
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            selected_major = st.selectbox(
+                "选择专业",
+                majors,
+                index=majors.index("大数据管理") if "大数据管理" in majors else 0
+            )
         
-        # 添加挂科率计算
-        major_df['是否挂科'] = major_df['期末成绩'] < 60
-        major_df['是否优良'] = major_df['期末成绩'] >= 80
+        # 指标卡片的数据都来自统计立方体
+        grades = cube.grade_counts().loc[selected_major]
+        final_stats = cube.metric_stats('期末成绩').loc[selected_major]
+        major_total = int(grades['count'])
+        passed = major_total - int(grades['failed'])
+        excellent = int(grades['excellent'])
         
         # 指标卡片 - 使用更醒目的样式
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            pass_rate = (1 - major_df['是否挂科'].mean()) * 100
+            pass_rate = passed / major_total * 100
             st.markdown(f"""
             <div style="
                 background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
@@ -573,12 +739,12 @@ def main():
             ">
                 <h3 style="margin: 0;">及格率</h3>
                 <h1 style="margin: 10px 0; font-size: 36px;">{pass_rate:.1f}%</h1>
-                <p style="margin: 0; opacity: 0.8;">{(len(major_df) - major_df['是否挂科'].sum())}/{len(major_df)}人</p>
+                <p style="margin: 0; opacity: 0.8;">{passed}/{major_total}人</p>
             </div>
             """, unsafe_allow_html=True)
         
         with col2:
-            avg_score = major_df['期末成绩'].mean()
+            avg_score = final_stats['mean']
             st.markdown(f"""
             <div style="
                 background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
@@ -589,12 +755,12 @@ def main():
             ">
                 <h3 style="margin: 0;">平均分</h3>
                 <h1 style="margin: 10px 0; font-size: 36px;">{avg_score:.1f}分</h1>
-                <p style="margin: 0; opacity: 0.8;">标准差: {major_df['期末成绩'].std():.1f}分</p>
+                <p style="margin: 0; opacity: 0.8;">标准差: {final_stats['std']:.1f}分</p>
             </div>
             """, unsafe_allow_html=True)
         
         with col3:
-            excellent_rate = major_df['是否优良'].mean() * 100
+            excellent_rate = excellent / major_total * 100
             st.markdown(f"""
             <div style="
                 background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
@@ -605,12 +771,12 @@ def main():
             ">
                 <h3 style="margin: 0;">优良率</h3>
                 <h1 style="margin: 10px 0; font-size: 36px;">{excellent_rate:.1f}%</h1>
-                <p style="margin: 0; opacity: 0.8;">{major_df['是否优良'].sum()}/{len(major_df)}人</p>
+                <p style="margin: 0; opacity: 0.8;">{excellent}/{major_total}人</p>
             </div>
             """, unsafe_allow_html=True)
         
         with col4:
-            avg_study_hours = major_df['每周学习时长'].mean()
+            avg_study_hours = cube.metric_stats('每周学习时长').loc[selected_major, 'mean']
             st.markdown(f"""
             <div style="
                 background: linear-gradient(135deg, #43e97b 0%, #38f9d7 100%);
@@ -630,54 +796,17 @@ def main():
         
         col1, col2 = st.columns(2)
         
+        with perf_timing.phase('成绩分箱'):
+            histogram_counts, histogram_edges, segment_counts = get_score_distribution(DATASET_VERSION, selected_major, df)
+        
         with col1:
-            # 改进的成绩分布直方图
-            fig = px.histogram(
-                major_df,
-                x='期末成绩',
-                nbins=20,
-                title='期末成绩分布直方图',
-                color_discrete_sequence=['#36A2EB'],
-                opacity=0.8,
-                labels={'期末成绩': '成绩'},
-                marginal=None
-            )
-            
-            fig.update_layout(
-                height=400,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white'),
-                showlegend=False,
-                margin=dict(l=50, r=20, t=50, b=50)
-            )
-            
-            fig.update_xaxes(
-                title='期末成绩 (分)',
-                showgrid=True,
-                gridcolor='rgba(255,255,255,0.1)'
-            )
-            
-            fig.update_yaxes(
-                title='人数',
-                showgrid=True,
-                gridcolor='rgba(255,255,255,0.1)'
-            )
-            
-            # 添加平均线
-            fig.add_vline(
-                x=avg_score,
-                line_dash="dash",
-                line_color="red",
-                annotation_text=f"平均: {avg_score:.1f}分",
-                annotation_position="top right"
-            )
-            
+            # 成绩分布直方图，服务器端分箱
+            fig = create_score_histogram_chart(histogram_counts, histogram_edges, avg_score)
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
             # 将箱线图改为柱状图 - 使用成绩分段柱状图
-            fig = create_score_segment_bar_chart(major_df, selected_major)
+            fig = create_score_segment_bar_chart(segment_counts, selected_major)
             st.plotly_chart(fig, use_container_width=True)
     
     elif selected_page == "成绩预测":
@@ -713,8 +842,12 @@ def main():
         with input_cols[3]:
             st.metric("作业完成率", f"{homework_rate}%")
         
+        prediction_model = student_model.ready_model(DATASET_VERSION)
+        if prediction_model is None:
+            show_model_warming()
+        
         # 预测按钮
-        if st.button("预测期末成绩", type="primary"):
+        elif st.button("预测期末成绩", type="primary"):
             # 准备输入数据
             input_data = pd.DataFrame({
                 '平时成绩': [usual_score],
@@ -722,12 +855,13 @@ def main():
                 '上课出勤率': [attendance],
                 '每周学习时长': [study_hours],
                 '期中考试分数': [midterm_score],
-                '性别_编码': [le_gender.transform([gender])[0]],
-                '专业_编码': [le_major.transform([major])[0]]
+                '性别_编码': [prediction_model.le_gender.transform([gender])[0]],
+                '专业_编码': [prediction_model.le_major.transform([major])[0]]
             })
             
             # 预测成绩
-            prediction = model.predict(input_data)[0]
+            with perf_timing.phase('单个学生预测'):
+                prediction = prediction_model.flat_model.predict(input_data)[0]
             predicted_score = round(prediction, 1)
             
             # 显示预测结果
@@ -748,6 +882,25 @@ def main():
                 <h3 style="color: white;">预测期末成绩</h3>
             </div>
             """, unsafe_allow_html=True)
+    
+    elif selected_page == "风险预警":
+        st.title("⚠️ 成绩风险预警")
+        
+        st.markdown(f"#### 用预测模型预测全体学生的期末成绩，列出预测低于{student_scoring.AT_RISK_SCORE}分的学生")
+        
+        prediction_model = student_model.ready_model(DATASET_VERSION)
+        if prediction_model is None:
+            show_model_warming()
+        else:
+            student_scoring.warm_up(df, prediction_model)
+            scores = student_scoring.ready_scores(prediction_model.version)
+            if scores is None:
+                show_scoring_progress(prediction_model)
+            else:
+                show_at_risk_list(df, scores)
+    
+    # 结束本次rerun的计时，写入JSONL，并在侧边栏显示计时面板（需勾选）
+    perf_timing.finish_rerun()
 
 if __name__ == "__main__":
     main()
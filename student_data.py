@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+# student.py使用的模拟学生数据
+#
+# 全部按列向量化生成，可以生成上千万名学生用于容量测试：
+# - 学号、姓名用Arrow的字符串计算函数拼接，保存为string[pyarrow]列，不创建Python字符串对象
+# - 性别、专业是category类型，每行只占1字节编码
+# - 成绩类的列使用float32
+#
+# 注意：随机数改用np.random.default_rng，各列的抽样顺序和精度也与原来student.py中
+# np.random.seed(42)逐列生成的数据不同。默认参数（1000名学生、种子42）下人数和各列的分布不变，
+# 但每名学生的具体数据不同，各页面显示的统计数字、图表和预测结果与改动前的版本不一致。
+
+MAJORS = ['大数据管理', '计算机科学', '信息系统', '软件工程', '数据科学', '人工智能', '电子商务']
+MAJOR_WEIGHTS = [0.25, 0.15, 0.15, 0.15, 0.10, 0.10, 0.10]
+GENDERS = ['男', '女']
+GENDER_WEIGHTS = [0.6, 0.4]
+
+# 生成规则变化时加1，使以数据集版本为键的缓存失效
+GENERATOR_VERSION = 1
+
+SCORE_COLUMNS = ['平时成绩', '作业完成率', '上课出勤率', '每周学习时长', '期中考试分数', '期末成绩', '总评成绩']
+
+
+def _normal(rng, mean, std, n, low, high):
+    values = rng.standard_normal(n, dtype=np.float32)
+    values *= std
+    values += mean
+    return values.clip(low, high, out=values)
+
+
+def _uniform(rng, low, high, n):
+    values = rng.random(n, dtype=np.float32)
+    values *= high - low
+    values += low
+    return values
+
+
+def _choice(rng, categories, weights, n):
+    """按权重抽样，直接生成category编码，不经过字符串数组"""
+    codes = np.searchsorted(np.cumsum(weights), rng.random(n), side='right')
+    codes = np.minimum(codes, len(categories) - 1).astype(np.int8)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def _numbered(prefix, digits):
+    return pd.arrays.ArrowExtensionArray(pc.binary_join_element_wise(prefix, digits, ''))
+
+
+def generate_students(n_students=1000, seed=42):
+    """生成n_students名学生的模拟数据，相同的参数总是得到相同的数据"""
+    rng = np.random.default_rng(seed)
+    digits = pc.cast(pa.array(np.arange(1, n_students + 1)), pa.string())
+
+    df = pd.DataFrame({
+        '学号': _numbered('2023', pc.utf8_lpad(digits, 6, '0')),
+        '姓名': _numbered('学生', digits),
+        '性别': _choice(rng, GENDERS, GENDER_WEIGHTS, n_students),
+        '专业': _choice(rng, MAJORS, MAJOR_WEIGHTS, n_students),
+        '平时成绩': _normal(rng, 75, 10, n_students, 40, 100),
+        '作业完成率': _uniform(rng, 60, 100, n_students).round(1),
+        '上课出勤率': _uniform(rng, 70, 100, n_students).round(1),
+        '每周学习时长': _uniform(rng, 10, 40, n_students).round(1),
+        '期中考试分数': _normal(rng, 70, 15, n_students, 40, 100).round(1),
+        '期末成绩': _normal(rng, 70, 15, n_students, 40, 100).round(1),
+    })
+    df['总评成绩'] = (df['平时成绩'] * np.float32(0.3) + df['期中考试分数'] * np.float32(0.3)
+                  + df['期末成绩'] * np.float32(0.4)).round(1)
+    return df
+
+
+def dataset_version(n_students, seed):
+    """数据集的版本标识：人数、随机种子和生成器版本相同时，生成的数据完全相同
+
+    用作缓存键，代替对整个DataFrame计算哈希。
+    """
+    return f'students-v{GENERATOR_VERSION}-n{n_students}-s{seed}'
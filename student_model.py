@@ -0,0 +1,214 @@
+import glob
+import os
+import pickle
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from forest_engine import FlatForest
+
+
+# student.py的成绩预测模型：后台训练、保存到磁盘、重启后直接复用
+#
+# - warm_up()在后台线程中准备模型，不阻塞页面渲染：磁盘上有同一数据集版本的模型时直接读取，
+#   否则训练并保存；同一时间只有一个准备线程
+# - 训练分成TRAINING_STEPS步用warm_start逐步增加树的数量，每步之后更新进度；
+#   sklearn保证这样得到的模型与一次训练100棵树完全相同
+# - 模型文件名包含数据集版本和MODEL_VERSION，数据集或训练方式变化时才重新训练，
+#   保存新模型后删除其他版本的模型文件
+
+MODEL_DIR = os.environ.get('STUDENT_MODEL_DIR', '.student_model')
+
+# 训练方式（特征、参数、抽样）变化时加1，使已保存的模型失效
+MODEL_VERSION = 1
+
+# 训练预测模型最多使用的学生数，人数很多时随机抽样，训练时间不随人数增长
+MAX_TRAINING_ROWS = 50_000
+N_ESTIMATORS = 100
+TRAINING_STEPS = 10
+
+FEATURE_COLUMNS = ['平时成绩', '作业完成率', '上课出勤率', '每周学习时长', '期中考试分数']
+
+
+@dataclass
+class StudentModel:
+    """训练好的模型及预测时需要的编码器、特征顺序"""
+    dataset_version: str
+    model: RandomForestRegressor
+    le_gender: LabelEncoder
+    le_major: LabelEncoder
+    features: list
+    train_seconds: float
+    # 单个学生的预测使用扁平数组推理引擎，结果与model.predict完全一致，延迟低得多；不保存到文件
+    flat_model: FlatForest = None
+
+    @property
+    def version(self):
+        """模型版本：数据集版本加训练方式版本，用作预测结果等派生数据的缓存键"""
+        return model_version(self.dataset_version)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['flat_model'] = None
+        return state
+
+
+@dataclass
+class TrainingStatus:
+    """后台准备模型的状态：loading读取已保存的模型，training训练中，ready可用，failed出错"""
+    dataset_version: str
+    state: str
+    progress: float = 0.0
+    started_at: float = 0.0
+    error: str = None
+
+
+_model = None
+_status = None
+_thread = None
+_lock = threading.Lock()
+
+
+def model_version(dataset_version):
+    return f'{dataset_version}.v{MODEL_VERSION}'
+
+
+def model_path(dataset_version):
+    return os.path.join(MODEL_DIR, f'student_model.{model_version(dataset_version)}.pkl')
+
+
+def train_model(df, dataset_version, on_progress=None):
+    """训练成绩预测模型，on_progress(ratio)在每一步之后调用"""
+    start = time.perf_counter()
+    train_df = df.sample(MAX_TRAINING_ROWS, random_state=42) if len(df) > MAX_TRAINING_ROWS else df
+
+    # 编码后的特征放在单独的DataFrame中，不修改共享的原始数据
+    le_gender = LabelEncoder()
+    le_major = LabelEncoder()
+
+    X = train_df[FEATURE_COLUMNS].copy()
+    X['性别_编码'] = le_gender.fit_transform(train_df['性别'])
+    X['专业_编码'] = le_major.fit_transform(train_df['专业'])
+    features = list(X.columns)
+    y = train_df['期末成绩']
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    model = RandomForestRegressor(n_estimators=N_ESTIMATORS, random_state=42, warm_start=True)
+    for step in range(1, TRAINING_STEPS + 1):
+        model.set_params(n_estimators=N_ESTIMATORS * step // TRAINING_STEPS)
+        model.fit(X_train, y_train)
+        if on_progress is not None:
+            on_progress(step / TRAINING_STEPS)
+    model.set_params(warm_start=False)
+
+    return StudentModel(dataset_version, model, le_gender, le_major, features,
+                        time.perf_counter() - start, FlatForest.from_model(model))
+
+
+def save_model(student_model):
+    """写入临时文件再整体替换，然后删除其他版本的模型文件"""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    path = model_path(student_model.dataset_version)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.pkl', dir=MODEL_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(student_model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    for stale in glob.glob(os.path.join(MODEL_DIR, 'student_model.*.pkl')):
+        if os.path.abspath(stale) != os.path.abspath(path):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def load_model(dataset_version):
+    """读取已保存的模型，文件不存在、已损坏或版本不符时返回None"""
+    path = model_path(dataset_version)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            student_model = pickle.load(f)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, OSError):
+        return None
+    if not isinstance(student_model, StudentModel) or student_model.dataset_version != dataset_version:
+        return None
+    student_model.flat_model = FlatForest.from_model(student_model.model)
+    return student_model
+
+
+def _set_progress(ratio):
+    _status.progress = ratio
+
+
+def _prepare(df, dataset_version):
+    global _model
+    try:
+        student_model = load_model(dataset_version)
+        if student_model is None:
+            _status.state = 'training'
+            student_model = train_model(df, dataset_version, on_progress=_set_progress)
+            try:
+                save_model(student_model)
+            except OSError:
+                # 目录不可写时只在进程内使用
+                pass
+        _model = student_model
+        _status.progress = 1.0
+        _status.state = 'ready'
+    except Exception as e:
+        _status.state = 'failed'
+        _status.error = f'{type(e).__name__}: {e}'
+
+
+def warm_up(df, dataset_version, retry=False):
+    """模型不可用时在后台线程中读取或训练，立即返回
+
+    上一次准备失败时不会自动重试，retry=True时重新开始。
+    """
+    global _status, _thread
+    if ready_model(dataset_version) is not None:
+        return
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        if (_status is not None and _status.dataset_version == dataset_version
+                and _status.state == 'failed' and not retry):
+            return
+        _status = TrainingStatus(dataset_version, 'loading', started_at=time.time())
+        _thread = threading.Thread(target=_prepare, args=(df, dataset_version),
+                                   name='student-model-warm-up', daemon=True)
+        _thread.start()
+
+
+def ready_model(dataset_version):
+    """模型已经准备好时返回StudentModel，否则返回None，不等待"""
+    model = _model
+    if model is None or model.dataset_version != dataset_version:
+        return None
+    return model
+
+
+def training_status():
+    """当前（或最近一次）准备模型的状态，还没有开始时返回None"""
+    return _status
+
+
+def wait_model(df, dataset_version, timeout=None):
+    """启动准备并等待完成，供脚本和基准测试使用；失败或超时时返回None"""
+    warm_up(df, dataset_version)
+    thread = _thread
+    if thread is not None:
+        thread.join(timeout)
+    return ready_model(dataset_version)
@@ -0,0 +1,217 @@
+import glob
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import student_model
+
+
+# 全体学生的期末成绩预测与风险预警名单
+#
+# - 按CHUNK_ROWS行一块，用sklearn模型整块预测（不逐行调用），每块之后更新进度；
+#   百万名学生单核需要半分钟左右，所以同样放在后台线程中进行，不阻塞页面
+# - 预测结果以模型版本为键保存在进程内和磁盘上（float32，每百万名学生4MB），
+#   翻页、筛选、排序只是对预警名单的下标做运算，不会重新预测
+# - 预警名单只保存预测低于AT_RISK_SCORE的学生下标，页面每次只取出当前页的几十行
+
+CHUNK_ROWS = 100_000
+AT_RISK_SCORE = 60
+
+# 预警名单可以排序的列：显示名 -> 数据列（预测期末成绩另外处理，学号与行号的顺序一致）
+SORT_COLUMNS = ['预测期末成绩', '学号', '期中考试分数', '平时成绩', '上课出勤率', '作业完成率', '每周学习时长']
+TABLE_COLUMNS = ['学号', '姓名', '专业', '性别', '平时成绩', '期中考试分数', '上课出勤率', '作业完成率', '每周学习时长']
+
+
+@dataclass
+class CohortScores:
+    """全体学生的预测成绩，以及预测不及格学生的行号（升序）"""
+    model_version: str
+    predictions: np.ndarray
+    at_risk: np.ndarray
+
+
+@dataclass
+class ScoringStatus:
+    """后台预测的状态：scoring预测中，ready可用，failed出错"""
+    model_version: str
+    state: str
+    progress: float = 0.0
+    started_at: float = 0.0
+    rows_done: int = 0
+    error: str = None
+
+
+_scores = None
+_status = None
+_thread = None
+_lock = threading.Lock()
+
+
+def scores_path(model_version):
+    return os.path.join(student_model.MODEL_DIR, f'cohort_scores.{model_version}.npy')
+
+
+def _category_codes(series, encoder):
+    """把category列转换为模型训练时LabelEncoder的编码：只转换类别，再按行的category编码取值"""
+    mapping = encoder.transform(series.cat.categories)
+    return mapping[series.cat.codes.to_numpy()]
+
+
+def feature_frame(df, prediction_model):
+    """按训练时的特征顺序构造预测输入"""
+    X = df[student_model.FEATURE_COLUMNS].copy()
+    X['性别_编码'] = _category_codes(df['性别'], prediction_model.le_gender)
+    X['专业_编码'] = _category_codes(df['专业'], prediction_model.le_major)
+    return X[prediction_model.features]
+
+
+def score_cohort(df, prediction_model, on_progress=None):
+    """预测全体学生的期末成绩，on_progress(ratio, rows_done)在每一块之后调用"""
+    predictions = np.empty(len(df), dtype=np.float32)
+    for start in range(0, len(df), CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS, len(df))
+        predictions[start:stop] = prediction_model.model.predict(feature_frame(df.iloc[start:stop], prediction_model))
+        if on_progress is not None:
+            on_progress(stop / len(df), stop)
+    return CohortScores(prediction_model.version, predictions, np.flatnonzero(predictions < AT_RISK_SCORE))
+
+
+def save_scores(scores):
+    """写入临时文件再整体替换，然后删除其他模型版本的预测结果"""
+    os.makedirs(student_model.MODEL_DIR, exist_ok=True)
+    path = scores_path(scores.model_version)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.npy', dir=student_model.MODEL_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, scores.predictions)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    for stale in glob.glob(os.path.join(student_model.MODEL_DIR, 'cohort_scores.*.npy')):
+        if os.path.abspath(stale) != os.path.abspath(path):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def load_scores(model_version, n_students):
+    """读取已保存的预测结果，文件不存在、已损坏或行数不符时返回None"""
+    path = scores_path(model_version)
+    if not os.path.exists(path):
+        return None
+    try:
+        predictions = np.load(path)
+    except (ValueError, OSError):
+        return None
+    if predictions.shape != (n_students,):
+        return None
+    return CohortScores(model_version, predictions, np.flatnonzero(predictions < AT_RISK_SCORE))
+
+
+def _set_progress(ratio, rows_done):
+    _status.progress = ratio
+    _status.rows_done = rows_done
+
+
+def _prepare(df, prediction_model):
+    global _scores
+    try:
+        scores = load_scores(prediction_model.version, len(df))
+        if scores is None:
+            scores = score_cohort(df, prediction_model, on_progress=_set_progress)
+            try:
+                save_scores(scores)
+            except OSError:
+                # 目录不可写时只在进程内使用
+                pass
+        _scores = scores
+        _status.progress = 1.0
+        _status.rows_done = len(df)
+        _status.state = 'ready'
+    except Exception as e:
+        _status.state = 'failed'
+        _status.error = f'{type(e).__name__}: {e}'
+
+
+def warm_up(df, prediction_model, retry=False):
+    """预测结果不可用时在后台线程中读取或计算，立即返回；失败后只有retry=True时重试"""
+    global _status, _thread
+    if ready_scores(prediction_model.version) is not None:
+        return
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        if (_status is not None and _status.model_version == prediction_model.version
+                and _status.state == 'failed' and not retry):
+            return
+        _status = ScoringStatus(prediction_model.version, 'scoring', started_at=time.time())
+        _thread = threading.Thread(target=_prepare, args=(df, prediction_model),
+                                   name='student-cohort-scoring', daemon=True)
+        _thread.start()
+
+
+def ready_scores(model_version):
+    """预测结果已经就绪时返回CohortScores，否则返回None，不等待"""
+    scores = _scores
+    if scores is None or scores.model_version != model_version:
+        return None
+    return scores
+
+
+def scoring_status():
+    """当前（或最近一次）后台预测的状态，还没有开始时返回None"""
+    return _status
+
+
+def _category_mask(series, rows, selected):
+    codes = series.cat.codes.to_numpy()[rows]
+    selected_codes = series.cat.categories.get_indexer(list(selected))
+    return np.isin(codes, selected_codes[selected_codes >= 0])
+
+
+def filter_at_risk(df, scores, majors=None, genders=None):
+    """按专业、性别筛选预警名单，返回行号；None表示不筛选"""
+    rows = scores.at_risk
+    if majors is not None:
+        rows = rows[_category_mask(df['专业'], rows, majors)]
+    if genders is not None:
+        rows = rows[_category_mask(df['性别'], rows, genders)]
+    return rows
+
+
+def sort_rows(df, scores, rows, sort_by='预测期末成绩', ascending=True):
+    """按指定列对行号稳定排序，值相同的行在升序和降序中都保持原来的顺序；学号与行号顺序一致，不需要比较字符串"""
+    if sort_by == '学号':
+        return rows if ascending else rows[::-1]
+    if sort_by == '预测期末成绩':
+        keys = scores.predictions[rows]
+    else:
+        keys = df[sort_by].to_numpy()[rows]
+    # 降序时对取负的值做稳定排序，不能把升序的结果反转（那样值相同的行顺序也会反过来）
+    return rows[np.argsort(keys if ascending else -keys, kind='stable')]
+
+
+def page_table(df, scores, rows, page, page_size):
+    """取出第page页（从1开始）的学生信息和预测成绩"""
+    page_rows = rows[(page - 1) * page_size:page * page_size]
+    table = df.iloc[page_rows][TABLE_COLUMNS].reset_index(drop=True)
+    table.insert(2, '预测期末成绩', scores.predictions[page_rows].astype(np.float64).round(1))
+    return table
+
+
+def at_risk_counts(df, scores):
+    """各专业的预警人数和学生总数"""
+    codes = df['专业'].cat.codes.to_numpy()
+    n_majors = len(df['专业'].cat.categories)
+    return pd.DataFrame({
+        '预警人数': np.bincount(codes[scores.at_risk], minlength=n_majors),
+        '学生人数': np.bincount(codes, minlength=n_majors),
+    }, index=pd.Index(df['专业'].cat.categories, name='专业'))
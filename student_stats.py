@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+from student_data import GENDERS, MAJORS, SCORE_COLUMNS
+
+
+# 专业数据分析页面使用的统计立方体
+#
+# 对每个“专业×性别”分组、每个指标，一次性计算人数、总和、平方和、最小值和最大值。
+# 这些量都可以直接相加或取最值合并，所以按专业（合并性别）或按性别的统计量、
+# 平均值、标准差都由立方体推出，不必再扫描原始数据；页面上切换指标只是读取几个小数组。
+# 另外按期末成绩统计不及格和优良的人数，供及格率、优良率使用。
+
+PASS_SCORE = 60
+EXCELLENT_SCORE = 80
+
+# 成绩直方图和成绩分段图在服务器端分箱，只把每个箱的人数交给Plotly，
+# 图表数据的大小与学生人数无关
+HISTOGRAM_BINS = 20
+SCORE_SEGMENT_EDGES = [60, 70, 80, 90]
+SCORE_SEGMENT_LABELS = ['不及格(0-59)', '及格(60-69)', '中等(70-79)', '良好(80-89)', '优秀(90-100)']
+
+
+class StatsCube:
+    """count/failed/excellent[专业, 性别]，sum/sumsq/min/max[专业, 性别, 指标]"""
+
+    def __init__(self, majors, genders, metrics, count, total, sumsq, minimum, maximum, failed, excellent):
+        self.majors = majors
+        self.genders = genders
+        self.metrics = metrics
+        self.count = count
+        self.sum = total
+        self.sumsq = sumsq
+        self.min = minimum
+        self.max = maximum
+        self.failed = failed
+        self.excellent = excellent
+
+    def counts(self):
+        """各专业各性别的人数，等同于pd.crosstab(df['专业'], df['性别']).sort_index()"""
+        return pd.DataFrame(self.count, index=pd.Index(self.majors, name='专业'),
+                            columns=pd.Index(self.genders, name='性别'))
+
+    def major_counts(self):
+        """各专业的人数"""
+        return pd.Series(self.count.sum(axis=1), index=pd.Index(self.majors, name='专业'), name='count')
+
+    def grade_counts(self):
+        """各专业的人数、期末成绩不及格和优良的人数"""
+        return pd.DataFrame({
+            'count': self.count.sum(axis=1),
+            'failed': self.failed.sum(axis=1),
+            'excellent': self.excellent.sum(axis=1),
+        }, index=pd.Index(self.majors, name='专业'))
+
+    def metric_stats(self, metric, gender=None):
+        """按专业汇总某个指标：count、mean、std（样本标准差）、min、max
+
+        gender为None时合并两个性别，否则只统计该性别。没有学生的专业各项为NaN。
+        """
+        m = self.metrics.index(metric)
+        if gender is None:
+            count = self.count.sum(axis=1)
+            total = self.sum[:, :, m].sum(axis=1)
+            sumsq = self.sumsq[:, :, m].sum(axis=1)
+            minimum = self.min[:, :, m].min(axis=1)
+            maximum = self.max[:, :, m].max(axis=1)
+        else:
+            g = self.genders.index(gender)
+            count = self.count[:, g]
+            total = self.sum[:, g, m]
+            sumsq = self.sumsq[:, g, m]
+            minimum = self.min[:, g, m]
+            maximum = self.max[:, g, m]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+            variance = (sumsq - total * mean) / (count - 1)
+        std = np.sqrt(np.maximum(variance, 0.0))
+        empty = count == 0
+        return pd.DataFrame({
+            'count': count,
+            'mean': mean,
+            'std': np.where(count > 1, std, np.nan),
+            'min': np.where(empty, np.nan, minimum),
+            'max': np.where(empty, np.nan, maximum),
+        }, index=pd.Index(self.majors, name='专业'))
+
+
+def build_cube(df, metrics=SCORE_COLUMNS):
+    """一次遍历每个指标列，计算所有分组的统计量
+
+    专业和性别按名称排序，各方法返回的结果与pd.crosstab(...).sort_index()、groupby('专业')的顺序相同。
+    """
+    majors = sorted(df['专业'].cat.categories if isinstance(df['专业'].dtype, pd.CategoricalDtype) else MAJORS)
+    genders = sorted(df['性别'].cat.categories if isinstance(df['性别'].dtype, pd.CategoricalDtype) else GENDERS)
+    major_codes = pd.Categorical(df['专业'], categories=majors).codes.astype(np.intp)
+    gender_codes = pd.Categorical(df['性别'], categories=genders).codes.astype(np.intp)
+    valid = (major_codes >= 0) & (gender_codes >= 0)
+    groups = (major_codes * len(genders) + gender_codes)[valid]
+    n_groups = len(majors) * len(genders)
+    shape = (len(majors), len(genders))
+
+    count = np.bincount(groups, minlength=n_groups).reshape(shape)
+    total = np.empty(shape + (len(metrics),))
+    sumsq = np.empty_like(total)
+    minimum = np.full_like(total, np.inf)
+    maximum = np.full_like(total, -np.inf)
+    for m, metric in enumerate(metrics):
+        values = df[metric].to_numpy(dtype=np.float64)[valid]
+        total[:, :, m] = np.bincount(groups, weights=values, minlength=n_groups).reshape(shape)
+        sumsq[:, :, m] = np.bincount(groups, weights=values * values, minlength=n_groups).reshape(shape)
+        group_min = np.full(n_groups, np.inf)
+        group_max = np.full(n_groups, -np.inf)
+        np.minimum.at(group_min, groups, values)
+        np.maximum.at(group_max, groups, values)
+        minimum[:, :, m] = group_min.reshape(shape)
+        maximum[:, :, m] = group_max.reshape(shape)
+
+    final = df['期末成绩'].to_numpy()[valid]
+    failed = np.bincount(groups[final < PASS_SCORE], minlength=n_groups).reshape(shape)
+    excellent = np.bincount(groups[final >= EXCELLENT_SCORE], minlength=n_groups).reshape(shape)
+    return StatsCube(majors, genders, list(metrics), count, total, sumsq, minimum, maximum, failed, excellent)
+
+
+def score_histogram(values, bins=HISTOGRAM_BINS):
+    """等宽分箱，范围取数据的最小值和最大值向外取整，返回(各箱人数, 箱边界)"""
+    values = np.asarray(values)
+    if len(values) == 0:
+        return np.zeros(bins, dtype=np.int64), np.linspace(0, 100, bins + 1)
+    low = np.floor(values.min())
+    high = max(np.ceil(values.max()), low + 1)
+    return np.histogram(values, bins=bins, range=(low, high))
+
+
+def score_segments(values):
+    """各成绩段的人数，顺序与SCORE_SEGMENT_LABELS一致（左闭右开，100分计入优秀）"""
+    segments = np.searchsorted(SCORE_SEGMENT_EDGES, np.asarray(values), side='right')
+    return np.bincount(segments, minlength=len(SCORE_SEGMENT_LABELS))
+
+
+class MajorIndex:
+    """按专业稳定排序后的行号order，第k个专业的行是order[offsets[k]:offsets[k+1]]
+
+    取某个专业的行号只是切片（视图），与学生总数无关；需要按专业取某一列时，
+    该列按order重排一次后缓存，之后每个专业的取值也只是切片，不复制整个DataFrame。
+    """
+
+    def __init__(self, majors, order, offsets):
+        self.majors = majors
+        self.order = order
+        self.offsets = offsets
+        self._sorted_columns = {}
+
+    def _bounds(self, major):
+        k = self.majors.index(major)
+        return self.offsets[k], self.offsets[k + 1]
+
+    def size(self, major):
+        start, stop = self._bounds(major)
+        return int(stop - start)
+
+    def rows(self, major):
+        """该专业学生在df中的行号（按原顺序）"""
+        start, stop = self._bounds(major)
+        return self.order[start:stop]
+
+    def values(self, df, column, major):
+        """该专业学生某一列的值，返回按专业排序后的列的切片"""
+        sorted_column = self._sorted_columns.get(column)
+        if sorted_column is None:
+            sorted_column = df[column].to_numpy()[self.order]
+            sorted_column.flags.writeable = False
+            self._sorted_columns[column] = sorted_column
+        start, stop = self._bounds(major)
+        return sorted_column[start:stop]
+
+
+def build_major_index(df):
+    """按专业的category编码做一次稳定排序（int8编码使用基数排序），记录每个专业的起止位置"""
+    majors = list(df['专业'].cat.categories)
+    codes = df['专业'].cat.codes.to_numpy()
+    order = np.argsort(codes, kind='stable')
+    order.flags.writeable = False
+    # 缺失的专业编码为-1，排在最前面，不属于任何专业
+    n_missing = int(np.count_nonzero(codes < 0))
+    counts = np.bincount(codes[codes >= 0] if n_missing else codes, minlength=len(majors))
+    offsets = n_missing + np.concatenate([[0], np.cumsum(counts)])
+    return MajorIndex(majors, order, offsets)
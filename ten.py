@@ -1,7 +1,19 @@
 #第9章/streamlit_predict_v2.py
+import os
+import time
+
 import streamlit as st
-import pickle
 import pandas as pd
+import plotly.express as px
+
+import batch_output
+import insurance_batch
+import insurance_model
+import insurance_sensitivity
+import perf_timing
+import premium_grid
+
+MISSING_MODEL_MESSAGE = "缺少模型文件（rfr_model.pkl），请先运行train_insurance_model.py训练模型！"
 
 def introduce_page():
     """当选择简介页面时，将呈现该函数的内容"""
@@ -79,26 +91,161 @@ def predict_page():
                    smoke_no, smoke_yes,
                    region_northeast, region_southeast, region_northwest, region_southwest]
 
-    #使用pickle的load方法从磁盘文件反序列化加载一个之前保存的随机森林回归模型
-    with open('rfr_model.pkl', 'rb') as f:
-        rfr_model = pickle.load(f)
     if submitted:
-        format_data_df = pd.DataFrame(data=[format_data], columns=rfr_model.feature_names_in_)
+        #优先从预计算的报价表中查表报价，报价表还没生成好时才使用模型预测
+        with perf_timing.phase('查表报价'):
+            predict_result = premium_grid.quote(age, sex, bmi, children, smoke, region)
+        if predict_result is None:
+            #只在需要时获取随机森林回归模型，模型在进程内只加载一次，由所有会话共享
+            try:
+                with perf_timing.phase('加载模型'):
+                    rfr_model = insurance_model.get_insurance_model()
+            except FileNotFoundError:
+                st.error(MISSING_MODEL_MESSAGE)
+                return
+            format_data_df = pd.DataFrame(data=[format_data], columns=rfr_model.feature_names_in_)
 
-        #使用模型对格式化后的数据format_data进行预测，返回预测的医疗费用
-        predict_result = rfr_model.predict(format_data_df)[0]
+            #使用模型对格式化后的数据format_data进行预测，返回预测的医疗费用
+            with perf_timing.phase('预测'):
+                predict_result = rfr_model.predict(format_data_df)[0]
         st.write('根据您输入的数据，预测该客户的医疗费用是：', round(predict_result, 2))
+        try:
+            with perf_timing.phase('敏感性分析'):
+                show_sensitivity_curves(age, sex, bmi, children, smoke, region)
+        except FileNotFoundError:
+            st.error(MISSING_MODEL_MESSAGE)
         st.write('技术支持:email: support@example.com')
+
+@st.cache_data(max_entries=1000)
+def get_sensitivity_curves(age, sex, bmi, children, region, model_sha256, _rfr_model):
+    """按投保人信息缓存敏感性曲线；model_sha256参与缓存键，模型更新后重新计算
+
+    两种吸烟状态的曲线一起计算，所以是否吸烟不在缓存键中。
+    """
+    profile = {'年龄': age, '性别': sex, 'BMI': bmi, '子女数量': children, '是否吸烟': '否', '区域': region}
+    return insurance_sensitivity.sensitivity_curves(_rfr_model, profile)
+
+def show_sensitivity_curves(age, sex, bmi, children, smoke, region):
+    """展示年龄、BMI、子女数量变化时预测费用的变化（吸烟与不吸烟各一条曲线）"""
+    #与单个报价使用同一个FlatForest模型（已预热），不需要导入sklearn、加载pickle模型
+    entry = insurance_model.get_insurance_model_entry()
+    curves = get_sensitivity_curves(age, sex, bmi, children, region, entry.sha256, entry.obj)
+
+    st.subheader('费用敏感性分析')
+    st.caption(f'其他信息保持不变，只改变一项时预测费用的变化；性别为{sex}，区域为{region}，竖线为当前输入。')
+    current = {'年龄': age, 'BMI': bmi, '子女数量': children}
+    for tab, variable in zip(st.tabs(list(current)), current):
+        with tab:
+            fig = px.line(
+                curves[curves['变量'] == variable],
+                x='取值',
+                y='预测医疗费用',
+                color='是否吸烟',
+                labels={'取值': variable},
+                template='plotly_white',
+            )
+            fig.add_vline(x=current[variable], line_dash='dash', line_color='gray')
+            st.plotly_chart(fig, use_container_width=True)
+
+def bulk_quote_page():
+    """当选择批量报价页面时，将呈现该函数的内容"""
+    st.markdown(
+        """
+        #使用说明
+        上传与insurance-chinese.csv格式相同的投保人清单（CSV或XLSX），一次性为所有投保人报价。
+        - **必需列**：年龄、性别、BMI、子女数量、是否吸烟、区域，其他列会原样保留在结果文件中。
+        - **分块处理**：文件按块读取、报价并写入结果文件，上百万行也不会占满内存。
+        """
+    )
+
+    uploaded_file = st.file_uploader("上传投保人清单", type=["csv", "xlsx"])
+    col_encoding, col_format = st.columns(2)
+    with col_encoding:
+        encoding = st.selectbox("CSV文件编码", options=["gbk", "utf-8"])
+    with col_format:
+        output_format = st.selectbox("结果文件格式", options=["csv", "parquet"])
+
+    if uploaded_file is not None and st.button("开始批量报价"):
+        try:
+            with perf_timing.phase('加载模型'):
+                rfr_model = insurance_model.get_batch_model()
+        except FileNotFoundError:
+            st.error(MISSING_MODEL_MESSAGE)
+            return
+
+        # 删除上一次批量报价留下的结果文件
+        previous = st.session_state.pop("bulk_result", None)
+        if previous is not None and os.path.exists(previous["path"]):
+            os.remove(previous["path"])
+
+        progress_bar = st.progress(0.0, text="正在报价...")
+        preview = st.empty()
+        start = time.perf_counter()
+
+        def on_progress(ratio, rows, chunk):
+            rate = rows / max(time.perf_counter() - start, 1e-9)
+            progress_bar.progress(ratio, text=f"已报价 {rows:,} 行，{rate:,.0f} 行/秒")
+            if rows == len(chunk):
+                # 第一个数据块写完就先展示，不必等整个文件处理完
+                preview.dataframe(chunk.head(10), hide_index=True)
+
+        try:
+            with perf_timing.phase('批量报价'):
+                result_path, total_rows = insurance_batch.quote_file(
+                    uploaded_file, rfr_model, uploaded_file.name,
+                    output_format=output_format,
+                    encoding=encoding,
+                    on_progress=on_progress,
+                )
+        except ValueError as e:
+            progress_bar.empty()
+            st.error(f"无法读取上传的文件：{e}")
+            return
+        seconds = time.perf_counter() - start
+        progress_bar.progress(1.0, text=f"报价完成，共 {total_rows:,} 行")
+        st.session_state["bulk_result"] = {
+            "path": result_path,
+            "rows": total_rows,
+            "format": output_format,
+            "rows_per_second": total_rows / max(seconds, 1e-9),
+            "seconds": seconds,
+        }
+
+    bulk_result = st.session_state.get("bulk_result")
+    if bulk_result is not None and os.path.exists(bulk_result["path"]):
+        st.success(f"已完成 {bulk_result['rows']:,} 位投保人的报价")
+        col_rate, col_seconds = st.columns(2)
+        col_rate.metric("吞吐量（行/秒）", f"{bulk_result['rows_per_second']:,.0f}")
+        col_seconds.metric("总耗时（秒）", f"{bulk_result['seconds']:.2f}")
+        result_path = bulk_result["path"]
+        # 传入函数而不是文件内容，点击下载时才从磁盘读取结果文件
+        st.download_button(
+            "下载报价结果",
+            data=lambda: batch_output.read_result(result_path),
+            file_name=f"医疗费用报价结果.{bulk_result['format']}",
+            mime=batch_output.MIME_TYPES[bulk_result["format"]],
+        )
+
         # 设置页面的标题、图标
 st.set_page_config(
     page_title="医疗费用预测",
     page_icon="🔍",
 )
+# 开始记录本次rerun的分阶段耗时
+perf_timing.start_rerun('ten')
+# 服务器进程第一次执行脚本时在后台预加载模型，并在后台生成报价表（模型文件更新后重新生成）
+insurance_model.warm_up()
+premium_grid.warm_up()
 
 # 在左侧添加侧边栏并设置单选按钮
-nav = st.sidebar.radio("导航", ["简介", "预测医疗费用"])
+nav = st.sidebar.radio("导航", ["简介", "预测医疗费用", "批量报价"])
 # 根据选择的结果，展示不同的页面
 if nav == "简介":
     introduce_page()
-else:
+elif nav == "预测医疗费用":
     predict_page()
+else:
+    bulk_quote_page()
+
+# 结束本次rerun的计时，写入JSONL，并在侧边栏显示计时面板（需勾选）
+perf_timing.finish_rerun()
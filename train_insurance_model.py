@@ -0,0 +1,129 @@
+# train_insurance_model.py
+# 用insurance-chinese.csv训练ten.py/webo.py/webw.py使用的医疗费用预测模型
+#
+# 用法：python train_insurance_model.py [--n-jobs -1] [--n-estimators 100]
+#
+# 写出：
+# - rfr_model.pkl（随机森林回归模型，特征名与ten.py构造的11列完全一致）
+# - rfr_model.forest/（同一模型的内存映射目录格式，见forest_engine.py）
+# - rfr_model.meta.json（特征schema、训练参数、留出集误差和预测耗时）
+import argparse
+import json
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+
+import dataset_cache
+from forest_engine import FlatForest, save_flat_forest
+from insurance_features import FEATURE_NAMES, TARGET_COLUMN, encode_insurance
+
+DATA_PATH = 'insurance-chinese.csv'
+
+# 单行预测计时次数、1万行批量预测计时次数
+SINGLE_ROW_REPEATS = 200
+BATCH_REPEATS = 10
+BATCH_ROWS = 10_000
+
+
+def load_dataset(path=DATA_PATH):
+    """读取GBK编码的保险数据，返回特征DataFrame和医疗费用"""
+    df = dataset_cache.load_dataset(path)
+    X = pd.DataFrame(encode_insurance(df), columns=FEATURE_NAMES)
+    return X, df[TARGET_COLUMN].to_numpy(dtype=np.float64)
+
+
+def predict_latency_ms(predict, X, repeats):
+    """返回predict(X)耗时的(p50, p99)毫秒"""
+    predict(X)  # 预热
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        timings[i] = time.perf_counter() - start
+    return round(float(np.percentile(timings, 50) * 1000), 3), round(float(np.percentile(timings, 99) * 1000), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练医疗费用预测模型")
+    parser.add_argument('--data', default=DATA_PATH, help="训练数据（GBK编码的CSV）")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="训练时并行的线程数，-1表示使用全部CPU核心")
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--min-samples-leaf', type=int, default=3)
+    parser.add_argument('--output', default='rfr_model.pkl', help="模型文件路径")
+    args = parser.parse_args()
+
+    X, y = load_dataset(args.data)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    print(f"训练集 {len(X_train)} 行，测试集 {len(X_test)} 行")
+
+    model = RandomForestRegressor(
+        n_estimators=args.n_estimators,
+        min_samples_leaf=args.min_samples_leaf,
+        random_state=42,
+        n_jobs=args.n_jobs,
+    )
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    # 线上每次只预测一行，多线程调度反而更慢；保存前改回单线程
+    model.set_params(n_jobs=None)
+
+    y_pred = model.predict(X_test)
+    metrics = {
+        'mae': round(float(mean_absolute_error(y_test, y_pred)), 2),
+        'rmse': round(float(np.sqrt(mean_squared_error(y_test, y_pred))), 2),
+        'r2': round(float(r2_score(y_test, y_pred)), 4),
+    }
+    print(f"留出集误差：MAE {metrics['mae']}，RMSE {metrics['rmse']}，R² {metrics['r2']}")
+
+    # 预测耗时：与ten.py一致的单行DataFrame，以及1万行批量
+    flat_model = FlatForest.from_model(model)
+    rng = np.random.default_rng(0)
+    single_row = X_test.iloc[[0]]
+    batch = X.iloc[rng.integers(0, len(X), BATCH_ROWS)].reset_index(drop=True)
+    timing = {
+        'sklearn_1_row_ms': predict_latency_ms(model.predict, single_row, SINGLE_ROW_REPEATS),
+        'flat_forest_1_row_ms': predict_latency_ms(flat_model.predict, single_row, SINGLE_ROW_REPEATS),
+        f'sklearn_{BATCH_ROWS}_rows_ms': predict_latency_ms(model.predict, batch, BATCH_REPEATS),
+    }
+    for name, (p50, p99) in timing.items():
+        print(f"{name}: p50 {p50} 毫秒，p99 {p99} 毫秒")
+
+    with open(args.output, 'wb') as f:
+        pickle.dump(model, f)
+    forest_path = args.output.rsplit('.', 1)[0] + '.forest'
+    save_flat_forest(flat_model, forest_path)
+
+    metadata = {
+        'feature_names': FEATURE_NAMES,
+        'target': TARGET_COLUMN,
+        'training_data': args.data,
+        'train_rows': len(X_train),
+        'test_rows': len(X_test),
+        'params': {
+            'n_estimators': args.n_estimators,
+            'min_samples_leaf': args.min_samples_leaf,
+            'random_state': 42,
+        },
+        'fit_seconds': round(fit_seconds, 3),
+        'holdout_metrics': metrics,
+        'predict_latency_ms': {name: {'p50': p50, 'p99': p99} for name, (p50, p99) in timing.items()},
+        'model_size_kb': round(len(pickle.dumps(model)) / 1024, 1),
+    }
+    meta_path = args.output.rsplit('.', 1)[0] + '.meta.json'
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+    print("生成的文件：")
+    print(f"- {args.output}（随机森林回归模型，{metadata['model_size_kb']} KB）")
+    print(f"- {forest_path}/（内存映射格式的同一模型）")
+    print(f"- {meta_path}（特征schema、误差指标和预测耗时）")
+
+
+if __name__ == '__main__':
+    main()
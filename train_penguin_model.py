@@ -1,49 +1,167 @@
-# generate_mock_model_files.py
+# train_penguin_model.py
+# 用（企鹅识别数据）penguins-chinese.csv训练qq.py使用的企鹅分类模型
+#
+# 用法：python train_penguin_model.py [--n-jobs -1] [--max-latency-ms 5]
+#
+# 并行搜索n_estimators/max_depth组合，对每个候选模型报告准确率、单行预测延迟和模型大小，
+# 然后写出：
+# - rfc_model.pkl（随机森林模型）
+# - rfc_model.forest/（同一模型的内存映射目录格式，见forest_engine.py）
+# - output_uniques.pkl（类别编码 → 中文物种名，qq.py用它显示结果和图片）
+# - rfc_model.meta.json（特征schema、类别映射、选中的参数以及所有候选模型的指标）
+import argparse
+import itertools
+import json
 import pickle
+import time
+
 import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+import dataset_cache
+from forest_engine import FlatForest, save_flat_forest
+from penguin_features import FEATURE_NAMES, SPECIES_COLUMN, complete_rows, encode_penguins
+
+DATA_PATH = '（企鹅识别数据）penguins-chinese.csv'
 
-# --------------------------
-# 1. 模拟训练一个适配原代码的模型
-# --------------------------
-# 模拟特征名（完全匹配原代码的format_data顺序）
-feature_names = [
-    'bill_length', 'bill_depth', 'flipper_length', 'body_mass',
-    'island_dream', 'island_torgerson', 'island_biscoe', 'sex_male', 'sex_female'
-]
-
-# 模拟训练数据（仅用于生成模型文件，无需真实数据）
-mock_X = np.random.rand(100, len(feature_names))  # 100条模拟特征数据
-mock_y = np.random.choice([0, 1, 2], size=100)    # 0=阿德利企鹅,1=巴布亚企鹅,2=帽带企鹅
-
-# 训练简单的随机森林模型（仅为生成文件，不追求准确率）
-rfc_model = RandomForestClassifier(random_state=42)
-rfc_model.fit(mock_X, mock_y)
-
-# 给模型添加feature_names_in_属性（匹配原代码的关键）
-rfc_model.feature_names_in_ = feature_names
-
-# --------------------------
-# 2. 保存模型文件（rfc_model.pkl）
-# --------------------------
-with open('rfc_model.pkl', 'wb') as f:
-    pickle.dump(rfc_model, f)
-
-# --------------------------
-# 3. 生成并保存类别映射文件（output_uniques.pkl）
-# --------------------------
-# 中文映射：0→阿德利企鹅，1→巴布亚企鹅，2→帽带企鹅（匹配原代码的图片名）
-output_uniques_map = {
+# 类别编码 → 中文物种名（与企鹅图片的文件名一致）
+OUTPUT_UNIQUES_MAP = {
     0: "阿德利企鹅",
     1: "巴布亚企鹅",
     2: "帽带企鹅"
 }
 
-with open('output_uniques.pkl', 'wb') as f:
-    pickle.dump(output_uniques_map, f)
+# 超参数搜索空间
+N_ESTIMATORS_GRID = [10, 25, 50, 100, 200]
+MAX_DEPTH_GRID = [3, 5, 8, None]
+
+# 单行预测延迟的测量次数
+LATENCY_REPEATS = 200
+
+
+def load_dataset(path=DATA_PATH):
+    """读取GBK编码的企鹅数据，返回特征矩阵X和类别编码y（丢弃测量值不完整的行）"""
+    df = dataset_cache.load_dataset(path)
+    X = encode_penguins(df, FEATURE_NAMES)
+    species_codes = {name: code for code, name in OUTPUT_UNIQUES_MAP.items()}
+    y = df[SPECIES_COLUMN].map(species_codes).to_numpy()
+    mask = complete_rows(X) & ~pd.isna(y)
+    X = pd.DataFrame(X[mask], columns=FEATURE_NAMES)
+    return X, y[mask].astype(np.int64)
+
+
+def fit_candidate(n_estimators, max_depth, X_train, y_train, X_test, y_test):
+    """训练一个候选模型并计算测试集准确率
+
+    每个候选模型本身单线程训练，并行度放在候选模型之间，避免线程争用。
+    """
+    model = RandomForestClassifier(
+        n_estimators=n_estimators, max_depth=max_depth, random_state=42, n_jobs=1
+    )
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    accuracy = accuracy_score(y_test, model.predict(X_test))
+    return model, fit_seconds, accuracy
+
+
+def single_row_latency_ms(model, row, repeats=LATENCY_REPEATS):
+    """测量与qq.py相同方式（单行DataFrame）调用predict的延迟，返回(p50, p99)毫秒"""
+    model.predict(row)  # 预热
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        model.predict(row)
+        timings[i] = time.perf_counter() - start
+    return float(np.percentile(timings, 50) * 1000), float(np.percentile(timings, 99) * 1000)
+
+
+def select_model(results, accuracy_tolerance, max_latency_ms):
+    """选择模型：在延迟预算内、准确率不低于最优值减去容差的候选中，取单行延迟最低的"""
+    eligible = [r for r in results if max_latency_ms is None or r['latency_p50_ms'] <= max_latency_ms]
+    if not eligible:
+        raise SystemExit(f"没有候选模型满足延迟预算 {max_latency_ms} 毫秒")
+    best_accuracy = max(r['accuracy'] for r in eligible)
+    eligible = [r for r in eligible if r['accuracy'] >= best_accuracy - accuracy_tolerance]
+    return min(eligible, key=lambda r: (r['latency_p50_ms'], -r['accuracy']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练企鹅分类模型")
+    parser.add_argument('--data', default=DATA_PATH, help="训练数据（GBK编码的CSV）")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="并行训练的进程数，-1表示使用全部CPU核心")
+    parser.add_argument('--accuracy-tolerance', type=float, default=0.01,
+                        help="与最高准确率相差不超过该值的模型都视为同样准确，从中选延迟最低的")
+    parser.add_argument('--max-latency-ms', type=float, default=None, help="单行预测p50延迟上限（毫秒）")
+    parser.add_argument('--output', default='rfc_model.pkl', help="模型文件路径")
+    args = parser.parse_args()
+
+    X, y = load_dataset(args.data)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y
+    )
+    print(f"训练集 {len(X_train)} 行，测试集 {len(X_test)} 行")
+
+    grid = list(itertools.product(N_ESTIMATORS_GRID, MAX_DEPTH_GRID))
+    fitted = Parallel(n_jobs=args.n_jobs)(
+        delayed(fit_candidate)(n_estimators, max_depth, X_train, y_train, X_test, y_test)
+        for n_estimators, max_depth in grid
+    )
+
+    # 延迟在主进程中逐个测量，避免并行训练时的CPU争用影响计时
+    row = X_test.iloc[[0]]
+    results = []
+    for (n_estimators, max_depth), (model, fit_seconds, accuracy) in zip(grid, fitted):
+        p50, p99 = single_row_latency_ms(model, row)
+        results.append({
+            'n_estimators': n_estimators,
+            'max_depth': max_depth,
+            'accuracy': round(accuracy, 4),
+            'latency_p50_ms': round(p50, 3),
+            'latency_p99_ms': round(p99, 3),
+            'model_size_kb': round(len(pickle.dumps(model)) / 1024, 1),
+            'fit_seconds': round(fit_seconds, 3),
+            'model': model,
+        })
+
+    candidates = [{k: v for k, v in r.items() if k != 'model'} for r in results]
+    report = pd.DataFrame(candidates).astype({'max_depth': 'Int64'})
+    print(report.to_string(index=False))
+
+    chosen = select_model(results, args.accuracy_tolerance, args.max_latency_ms)
+    print(f"\n选中模型：n_estimators={chosen['n_estimators']}, max_depth={chosen['max_depth']}，"
+          f"准确率 {chosen['accuracy']:.4f}，单行预测p50 {chosen['latency_p50_ms']:.3f} 毫秒")
+
+    with open(args.output, 'wb') as f:
+        pickle.dump(chosen['model'], f)
+    forest_path = args.output.rsplit('.', 1)[0] + '.forest'
+    save_flat_forest(FlatForest.from_model(chosen['model']), forest_path)
+    with open('output_uniques.pkl', 'wb') as f:
+        pickle.dump(OUTPUT_UNIQUES_MAP, f)
+
+    metadata = {
+        'feature_names': FEATURE_NAMES,
+        'classes': {str(code): name for code, name in OUTPUT_UNIQUES_MAP.items()},
+        'training_data': args.data,
+        'train_rows': len(X_train),
+        'test_rows': len(X_test),
+        'selected': {k: v for k, v in chosen.items() if k != 'model'},
+        'candidates': candidates,
+    }
+    meta_path = args.output.rsplit('.', 1)[0] + '.meta.json'
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+    print("生成的文件：")
+    print(f"- {args.output}（随机森林模型）")
+    print(f"- {forest_path}/（内存映射格式的同一模型）")
+    print("- output_uniques.pkl（中文企鹅物种映射）")
+    print(f"- {meta_path}（特征schema、类别映射和候选模型指标）")
+
 
-print("✅ 模拟模型文件生成完成！")
-print("生成的文件：")
-print("- rfc_model.pkl（适配原代码的随机森林模型）")
-print("- output_uniques.pkl（中文企鹅物种映射）")
+if __name__ == '__main__':
+    main()
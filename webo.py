@@ -1,8 +1,9 @@
 #第9章/streamlit_predict_v2.py
 import streamlit as st
-import pickle
 import pandas as pd
 
+import insurance_model
+
 def introduce_page():
     """当选择简介页面时，将呈现该函数的内容"""
     st.write("#欢迎使用！")
@@ -79,10 +80,13 @@ def predict_page():
                    smoke_no, smoke_yes,
                    region_northeast, region_southeast, region_northwest, region_southwest]
 
-    #使用pickle的load方法从磁盘文件反序列化加载一个之前保存的随机森林回归模型
-    with open('rfr_model.pkl', 'rb') as f:
-        rfr_model = pickle.load(f)
     if submitted:
+        #只在提交表单时获取随机森林回归模型，模型在进程内只加载一次，由所有会话共享
+        try:
+            rfr_model = insurance_model.get_insurance_model()
+        except FileNotFoundError:
+            st.error("缺少模型文件（rfr_model.pkl），请先运行train_insurance_model.py训练模型！")
+            return
         format_data_df = pd.DataFrame(data=[format_data], columns=rfr_model.feature_names_in_)
 
         #使用模型对格式化后的数据format_data进行预测，返回预测的医疗费用
@@ -94,6 +98,8 @@ st.set_page_config(
     page_title="医疗费用预测",
     page_icon="🔍",
 )
+# 服务器进程第一次执行脚本时在后台预加载模型
+insurance_model.warm_up()
 
 # 在左侧添加侧边栏并设置单选按钮
 nav = st.sidebar.radio("导航", ["简介", "预测医疗费用"])